@@ -0,0 +1,214 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, TextIO, Tuple, Union
+
+
+class AsyncLog(logging.Handler):
+    """
+    Logging handler which only puts records into a queue; a background thread formats them and writes them
+    in batches to log file, terminal and (optionally) JSON Lines file, so threads which log messages do not wait
+    for terminal or disk. Queue is bounded; records which do not fit into it are dropped, and the number of dropped
+    records is written to log file and terminal.
+    Log file and JSON Lines file receive all records. Terminal is rate-limited: after repeat_limit messages logged
+    from the same place in code within repeat_interval seconds, further ones are only counted and reported as one
+    message when the interval ends. Summary of logged, not shown and dropped messages is written when handler
+    is closed.
+    """
+    batch_size: int = 1000
+    queue_size: int = 100000
+    repeat_limit: int = 10
+    repeat_interval: float = 1.0
+    summary_sources: int = 5  # Places in code with the most messages not shown, listed in summary
+
+    @dataclass
+    class Source:
+        """
+        Messages logged from one place in code.
+        """
+        window_start: float
+        shown: int = 0
+        not_shown: int = 0  # In current window
+        total_not_shown: int = 0
+        last_record: Optional[logging.LogRecord] = None  # The last record not shown
+
+    def __init__(self, log_file_path: str, stream: TextIO, json_log_file_path: Optional[str] = None):
+        super().__init__()
+        self.log_file: TextIO = open(log_file_path, 'a')
+        self.stream: TextIO = stream
+        self.json_log_file: Optional[TextIO] = None if json_log_file_path is None else open(json_log_file_path, 'a')
+        self.records: 'queue.Queue[Union[logging.LogRecord, threading.Event, None]]' = \
+            queue.Queue(AsyncLog.queue_size)
+        self.dropped_records: int = 0
+        self.reported_dropped_records: int = 0
+        self.level_counts: Counter = Counter()
+        self.sources: Dict[Tuple[str, int], AsyncLog.Source] = {}
+        self.is_closed: bool = False
+        self.writer: threading.Thread = threading.Thread(target=self.write_records, name='AsyncLog', daemon=True)
+        self.writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.is_closed:
+            return
+        if record.args:  # Arguments could change before record is formatted
+            record.msg = record.getMessage()
+            record.args = None
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1  # Handler lock is held
+
+    def flush(self) -> None:
+        """
+        Waits until all records logged so far are written, e.g. before user is asked a question.
+        """
+        if not self.is_closed and self.writer.is_alive():
+            written: threading.Event = threading.Event()
+            self.records.put(written)
+            written.wait()
+
+    def close(self) -> None:
+        """
+        Writes remaining records and summary, and closes files.
+        """
+        if not self.is_closed:
+            self.is_closed = True
+            self.records.put(None)
+            self.writer.join()
+            self.write_summary()
+            self.log_file.close()
+            if self.json_log_file is not None:
+                self.json_log_file.close()
+        super().close()
+
+    def write_records(self) -> None:
+        while True:
+            try:
+                batch: List[Union[logging.LogRecord, threading.Event, None]] = \
+                    [self.records.get(timeout=AsyncLog.repeat_interval)]
+            except queue.Empty:
+                dropped_lines: List[str] = self.report_dropped()
+                not_shown_lines: List[str] = self.report_not_shown(time.monotonic(), only_ended=True)
+                self.write_lines(dropped_lines, not_shown_lines + dropped_lines, [])
+                continue
+            while len(batch) < AsyncLog.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+
+            now: float = time.monotonic()
+            lines: List[str] = []
+            shown_lines: List[str] = []
+            json_lines: List[str] = []
+            for item in batch:
+                if isinstance(item, logging.LogRecord):
+                    self.level_counts[item.levelname] += 1
+                    if self.json_log_file is not None:
+                        json_lines.append(AsyncLog.to_json(item))
+                    line: str = self.format(item)
+                    lines.append(line)
+                    if self.is_shown(item, now, shown_lines):
+                        shown_lines.append(line)
+            if any(not isinstance(item, logging.LogRecord) for item in batch):
+                shown_lines.extend(self.report_not_shown(now, only_ended=False))
+            dropped_lines = self.report_dropped()
+            self.write_lines(lines + dropped_lines, shown_lines + dropped_lines, json_lines)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in batch:
+                return
+
+    def is_shown(self, record: logging.LogRecord, now: float, lines: List[str]) -> bool:
+        """
+        Checks whether record fits into the limit of its place in code. Report of messages not shown
+        in the previous interval is added to lines when the next one starts.
+        """
+        source: Optional[AsyncLog.Source] = self.sources.get((record.pathname, record.lineno))
+        if source is None:
+            source = self.sources[(record.pathname, record.lineno)] = AsyncLog.Source(window_start=now)
+        elif now - source.window_start >= AsyncLog.repeat_interval:
+            lines.extend(self.report_source(source))
+            source.window_start = now
+            source.shown = 0
+        if source.shown < AsyncLog.repeat_limit:
+            source.shown += 1
+            return True
+        source.not_shown += 1
+        source.total_not_shown += 1
+        source.last_record = record
+        return False
+
+    def report_dropped(self) -> List[str]:
+        dropped_records: int = self.dropped_records
+        if dropped_records == self.reported_dropped_records:
+            return []
+        line: str = f'{dropped_records - self.reported_dropped_records} messages were dropped, because they were ' \
+                    f'logged faster than they could be written'
+        self.reported_dropped_records = dropped_records
+        return [line]
+
+    def report_not_shown(self, now: float, only_ended: bool) -> List[str]:
+        lines: List[str] = []
+        for source in self.sources.values():
+            if not only_ended or now - source.window_start >= AsyncLog.repeat_interval:
+                lines.extend(self.report_source(source))
+        return lines
+
+    def report_source(self, source: Source) -> List[str]:
+        if source.not_shown == 0:
+            return []
+        record: logging.LogRecord = logging.makeLogRecord(
+            dict(source.last_record.__dict__, exc_info=None, exc_text=None,
+                 msg=f'{source.not_shown} similar messages were not shown in terminal, the last one: '
+                     f'{source.last_record.getMessage()}'))
+        source.not_shown = 0
+        return [self.format(record)]
+
+    def write_lines(self, lines: List[str], shown_lines: List[str], json_lines: List[str]) -> None:
+        """
+        Writes lines to log file, shown lines to terminal and JSON lines to JSON Lines file.
+        """
+        try:
+            if lines:
+                self.log_file.write(''.join(line + '\n' for line in lines))
+                self.log_file.flush()
+            if shown_lines:
+                self.stream.write(''.join(line + '\n' for line in shown_lines))
+                self.stream.flush()
+            if json_lines:
+                self.json_log_file.write(''.join(line + '\n' for line in json_lines))
+                self.json_log_file.flush()
+        except (OSError, ValueError):
+            pass  # Logging must not stop the program; there is nowhere to report the error
+
+    @staticmethod
+    def to_json(record: logging.LogRecord) -> str:
+        fields: Dict[str, object] = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                                     'message': record.getMessage(), 'module': record.module, 'line': record.lineno,
+                                     'thread': record.threadName}
+        if record.exc_info is not None:
+            fields['exception'] = logging.Formatter().formatException(record.exc_info)
+        return json.dumps(fields, ensure_ascii=False)
+
+    def write_summary(self) -> None:
+        total_not_shown: int = sum(source.total_not_shown for source in self.sources.values())
+        levels: str = ', '.join(f'{level}: {count}' for level, count in sorted(self.level_counts.items()))
+        lines: List[str] = [f'Log summary: {sum(self.level_counts.values())} messages'
+                            + (f' ({levels})' if levels else '')
+                            + f', {total_not_shown} not shown in terminal, {self.dropped_records} dropped']
+        sources: List[AsyncLog.Source] = sorted((source for source in self.sources.values() if source.total_not_shown),
+                                                key=lambda source: source.total_not_shown, reverse=True)
+        for source in sources[:AsyncLog.summary_sources]:
+            lines.append(f'  {source.total_not_shown} not shown, e.g. {source.last_record.getMessage()}')
+        json_lines: List[str] = []
+        if self.json_log_file is not None:
+            json_lines.append(json.dumps({'summary': {'levels': dict(self.level_counts), 'not_shown': total_not_shown,
+                                                      'dropped': self.dropped_records}}))
+        lines = self.report_dropped() + lines
+        self.write_lines(lines, lines, json_lines)
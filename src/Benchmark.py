@@ -0,0 +1,241 @@
+import argparse
+import builtins
+import functools
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, fields
+from typing import Any, Callable, Dict, List, Optional
+from TreeGenerator import TreeGenerator
+
+
+class Benchmark:
+    """
+    Measures performance of FileManager actions on synthetic directory trees.
+    Every action is run in a separate process on a freshly generated tree, with all questions answered
+    by a rules file. Reported metrics are wall and CPU time, files per second, bytes read (from /proc/self/io),
+    number of calls of file system functions of os module and peak resident set size.
+    """
+    actions: Dict[str, List[str]] = {
+        'move': ['-a', 'm'],
+        'empty': ['-a', 'e'],
+        'temp': ['-a', 't'],
+        'duplicates': ['-a', 'd'],
+        'permissions': ['-a', 'p'],
+        'names': ['-a', 'c'],
+        'run': ['-a', 'a'],
+        'run_fused': ['-a', 'a', '-f']
+    }
+    global_answers: Dict[str, bool] = {'move': True, 'keep_latest': True, 'remove_empty': True, 'remove_temp': True,
+                                       'remove_dupl': True, 'sort_by_ctime': True, 'unify_perm': True,
+                                       'change_name': True, 'override_file': True}
+    counted_functions: List[str] = ['stat', 'lstat', 'fstat', 'scandir', 'listdir', 'open', 'read', 'readv', 'pread',
+                                    'write', 'pwrite', 'close', 'remove', 'unlink', 'rename', 'replace', 'chmod',
+                                    'chown', 'utime', 'fsync', 'mkdir', 'rmdir', 'copy_file_range', 'sendfile']
+    child_flag: str = '--child'
+
+    def __init__(self):
+        args = self.get_args()
+        parameters: TreeGenerator.Parameters = TreeGenerator.Parameters(
+            **{field.name: getattr(args, field.name) for field in fields(TreeGenerator.Parameters)})
+        report: Dict[str, Any] = {
+            'parameters': asdict(parameters),
+            'python': sys.version.split()[0],
+            'benchmarks': {action: self.run_benchmark(action, parameters, os.path.abspath(args.config[0]),
+                                                      args.repeat)
+                           for action in args.actions}
+        }
+
+        is_regression: bool = False
+        if args.baseline is not None:
+            report['comparison'] = self.compare_with_baseline(report, args.baseline[0], args.max_regression)
+            is_regression = any(result['regression'] for result in report['comparison'].values())
+        if args.save_baseline is not None:
+            with open(args.save_baseline[0], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        output: str = json.dumps(report, indent=2)
+        if args.output is None:
+            print(output)
+        else:
+            with open(args.output[0], 'w') as f:
+                f.write(output)
+        if is_regression:
+            exit(1)
+
+    def get_args(self) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(
+            description='Benchmark of FileManager actions on synthetic directory trees')
+        defaults: TreeGenerator.Parameters = TreeGenerator.Parameters()
+        for field in fields(TreeGenerator.Parameters):
+            parser.add_argument(f'--{field.name.replace("_", "-")}', dest=field.name, type=field.type,
+                                default=getattr(defaults, field.name),
+                                help=f'Tree generator parameter (default {getattr(defaults, field.name)})')
+        parser.add_argument('-c', '--config', nargs=1, type=str,
+                            default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')],
+                            help='Path to configuration file (*.json) used by FileManager')
+        parser.add_argument('--actions', nargs='+', type=str, choices=[*Benchmark.actions.keys()],
+                            default=[*Benchmark.actions.keys()], help='Benchmarks to run')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of runs of each benchmark; the run with median wall time is reported')
+        parser.add_argument('-o', '--output', nargs=1, type=str, required=False,
+                            help='Path to file in which report is written (printed by default)')
+        parser.add_argument('--save-baseline', nargs=1, type=str, required=False,
+                            help='Path to file in which report is saved as baseline')
+        parser.add_argument('--baseline', nargs=1, type=str, required=False,
+                            help='Path to baseline report to compare with. Exit code is 1 when a benchmark regressed')
+        parser.add_argument('--max-regression', type=float, default=0.1,
+                            help='Allowed relative decrease of files per second compared to baseline')
+        return parser.parse_args()
+
+    def run_benchmark(self, action: str, parameters: TreeGenerator.Parameters, config_file_path: str,
+                      repeat: int) -> Dict[str, Any]:
+        results: List[Dict[str, Any]] = [self.run_once(action, parameters, config_file_path)
+                                         for _ in range(max(repeat, 1))]
+        results.sort(key=lambda result: result['wall_time'])
+        result: Dict[str, Any] = results[len(results) // 2]
+        result['wall_times'] = [run_result['wall_time'] for run_result in results]
+        result['wall_time_stdev'] = statistics.pstdev(result['wall_times'])
+        return result
+
+    def run_once(self, action: str, parameters: TreeGenerator.Parameters, config_file_path: str) -> Dict[str, Any]:
+        """
+        Generates tree in temporary directory and runs FileManager on it in a child process.
+        """
+        with tempfile.TemporaryDirectory(prefix='file_manager_benchmark_') as root:
+            generator: TreeGenerator = TreeGenerator(parameters)
+            generator.generate(root)
+            rules_file_path: str = os.path.join(root, 'rules.json')
+            with open(rules_file_path, 'w') as f:
+                json.dump({'global': Benchmark.global_answers}, f)
+            stats_file_path: str = os.path.join(root, 'stats.json')
+
+            command: List[str] = [sys.executable, os.path.abspath(__file__), Benchmark.child_flag, stats_file_path,
+                                  '-t', os.path.join(root, 'target'), '-c', config_file_path, '-r', rules_file_path,
+                                  *Benchmark.actions[action]]
+            if parameters.sources > 0:
+                command += ['-s', *[os.path.join(root, f'source{index}') for index in range(parameters.sources)]]
+            process: subprocess.CompletedProcess = subprocess.run(command, cwd=root, stdin=subprocess.DEVNULL,
+                                                                  stdout=subprocess.DEVNULL,
+                                                                  stderr=subprocess.PIPE, text=True)
+            if process.returncode != 0 or not os.path.isfile(stats_file_path):
+                raise RuntimeError(f'Benchmark {action} failed with exit code {process.returncode}\n'
+                                   f'{process.stderr}')
+            with open(stats_file_path, 'r') as f:
+                result: Dict[str, Any] = json.load(f)
+        result['files'] = parameters.files
+        result['bytes'] = generator.total_bytes
+        result['files_per_second'] = parameters.files / result['wall_time'] if result['wall_time'] else None
+        return result
+
+    @staticmethod
+    def compare_with_baseline(report: Dict[str, Any], baseline_file_path: str,
+                              max_regression: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Compares files per second of every benchmark with baseline. Benchmarks are comparable only
+        when trees were generated with the same parameters.
+        """
+        with open(baseline_file_path, 'r') as f:
+            baseline: Dict[str, Any] = json.load(f)
+        if baseline.get('parameters') != report['parameters']:
+            print('Baseline was generated with different tree parameters. Results might not be comparable',
+                  file=sys.stderr)
+        comparison: Dict[str, Dict[str, Any]] = {}
+        for action, result in report['benchmarks'].items():
+            baseline_result: Optional[Dict[str, Any]] = baseline.get('benchmarks', {}).get(action)
+            if baseline_result is None or not baseline_result.get('files_per_second') or \
+                    not result['files_per_second']:
+                continue
+            ratio: float = result['files_per_second'] / baseline_result['files_per_second']
+            comparison[action] = {'baseline_files_per_second': baseline_result['files_per_second'],
+                                  'files_per_second': result['files_per_second'],
+                                  'ratio': ratio,
+                                  'regression': ratio < 1 - max_regression}
+        return comparison
+
+    @staticmethod
+    def count_calls(module: Any, function_names: List[str], calls: Dict[str, int], prefix: str = '') -> None:
+        """
+        Replaces functions of module with wrappers counting their calls. Wrappers of os functions are added
+        to os.supports_* sets next to the functions, so code checking support of dir_fd and similar arguments
+        behaves as without counting.
+        """
+
+        def wrap(name: str, function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                calls[name] += 1
+                return function(*args, **kwargs)
+            return wrapper
+
+        support_sets: List[set] = [os.supports_dir_fd, os.supports_fd, os.supports_follow_symlinks,
+                                   os.supports_effective_ids]
+        for function_name in function_names:
+            if hasattr(module, function_name):
+                calls[prefix + function_name] = 0
+                function: Callable = getattr(module, function_name)
+                wrapper: Callable = wrap(prefix + function_name, function)
+                for support_set in support_sets:
+                    if function in support_set:
+                        support_set.add(wrapper)
+                setattr(module, function_name, wrapper)
+
+    @staticmethod
+    def run_child(stats_file_path: str, file_manager_args: List[str]) -> None:
+        """
+        Runs FileManager with given arguments in current process and writes its measurements to stats file.
+        Calls made from worker threads are counted as well; counters are not synchronized, so they are approximate.
+        """
+        io_before: Dict[str, int] = Benchmark.read_proc_io()
+        calls: Dict[str, int] = {}
+        Benchmark.count_calls(os, Benchmark.counted_functions, calls, prefix='os.')
+        Benchmark.count_calls(builtins, ['open'], calls)
+
+        sys.argv = ['FileManager.py', *file_manager_args]
+        from FileManager import main
+        start_wall_time: float = time.perf_counter()
+        start_cpu_time: float = time.process_time()
+        main()
+        wall_time: float = time.perf_counter() - start_wall_time
+        cpu_time: float = time.process_time() - start_cpu_time
+        counted_calls: Dict[str, int] = {name: count for name, count in calls.items() if count}
+
+        io_after: Dict[str, int] = Benchmark.read_proc_io()
+        stats: Dict[str, Any] = {
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'read_chars': io_after.get('rchar', 0) - io_before.get('rchar', 0),  # Including page cache hits
+            'read_bytes': io_after.get('read_bytes', 0) - io_before.get('read_bytes', 0),  # From storage
+            'written_bytes': io_after.get('write_bytes', 0) - io_before.get('write_bytes', 0),
+            'calls': counted_calls,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        }
+        with open(stats_file_path, 'w') as f:
+            json.dump(stats, f)
+
+    @staticmethod
+    def read_proc_io() -> Dict[str, int]:
+        """
+        Returns I/O counters of current process or empty dict if /proc/self/io is not available.
+        """
+        try:
+            with open('/proc/self/io', 'r') as f:
+                return {key: int(value) for key, value in (line.split(': ') for line in f if ': ' in line)}
+        except OSError:
+            return {}
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == Benchmark.child_flag:
+        Benchmark.run_child(sys.argv[2], sys.argv[3:])
+    else:
+        Benchmark()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import fnmatch
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Pattern
+
+
+class DecisionRules:
+    """
+    Answers questions about single files without asking user, based on rules loaded from JSON file.
+    Rules of each decision are checked in the order they are written and the answer of the first matching rule
+    is used. A rule matches a file when all of its conditions are met: file name glob, file path glob,
+    directory containing the file (at any depth), file size range and file age (time since modification) range.
+    Rules file can also contain answers to global questions asked at the beginning of each action.
+    """
+    move: str = 'move'
+    keep_latest: str = 'keep_latest'
+    remove_empty: str = 'remove_empty'
+    remove_temp: str = 'remove_temp'
+    remove_dupl: str = 'remove_dupl'
+    sort_by_ctime: str = 'sort_by_ctime'  # Global only
+    unify_perm: str = 'unify_perm'
+    change_name: str = 'change_name'
+    override_file: str = 'override_file'
+
+    decisions: List[str] = [move, keep_latest, remove_empty, remove_temp, remove_dupl, sort_by_ctime, unify_perm,
+                            change_name, override_file]
+    conditions: List[str] = ['name', 'path', 'directory', 'min_size', 'max_size', 'min_age_days', 'max_age_days']
+    seconds_per_day: int = 24 * 60 * 60
+
+    @dataclass
+    class Rule:
+        answer: bool
+        name: Optional[Pattern] = None
+        path: Optional[Pattern] = None
+        directory: Optional[str] = None
+        min_size: Optional[int] = None
+        max_size: Optional[int] = None
+        min_age: Optional[float] = None  # In seconds, derived from min_age_days
+        max_age: Optional[float] = None  # In seconds, derived from max_age_days
+
+        def requires_status(self) -> bool:
+            return self.min_size is not None or self.max_size is not None or \
+                self.min_age is not None or self.max_age is not None
+
+        def matches_path(self, file_path: str) -> bool:
+            if self.name is not None and self.name.match(os.path.basename(file_path)) is None:
+                return False
+            if self.path is not None and self.path.match(file_path) is None:
+                return False
+            return self.directory is None or os.path.abspath(file_path).startswith(self.directory + os.sep)
+
+        def matches_status(self, file_status: os.stat_result) -> bool:
+            """
+            Checks size and age of file; age is measured at the time of the check, so it advances in long runs.
+            """
+            if self.min_size is not None and file_status.st_size < self.min_size:
+                return False
+            if self.max_size is not None and file_status.st_size > self.max_size:
+                return False
+            if self.min_age is None and self.max_age is None:
+                return True
+            age: float = time.time() - file_status.st_mtime
+            if self.min_age is not None and age < self.min_age:
+                return False
+            return self.max_age is None or age <= self.max_age
+
+    def __init__(self, rules_file_path: str):
+        """
+        Loads and compiles rules. Raises ValueError when rules file is not valid.
+        """
+        with open(rules_file_path, 'r') as f:
+            data: Any = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError('Rules file must contain a JSON object')
+
+        self.global_answers: Dict[str, bool] = data.get('global', {})
+        if not isinstance(self.global_answers, dict):
+            raise ValueError('"global" must be an object mapping decisions to true or false')
+        for decision, answer in self.global_answers.items():
+            DecisionRules.validate_decision(decision)
+            if not isinstance(answer, bool):
+                raise ValueError(f'Global answer for {decision} must be true or false')
+
+        self.rules: Dict[str, List[DecisionRules.Rule]] = {decision: [] for decision in DecisionRules.decisions}
+        rules: Any = data.get('rules', [])
+        if not isinstance(rules, list):
+            raise ValueError('"rules" must be a list')
+        for index, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise ValueError(f'Rule {index} must be an object')
+            DecisionRules.validate_decision(rule.get('decision'))
+            if not isinstance(rule.get('answer'), bool):
+                raise ValueError(f'Rule {index} must have "answer" set to true or false')
+            unknown_keys: List[str] = sorted(set(rule) - {'decision', 'answer', *DecisionRules.conditions})
+            if unknown_keys:
+                raise ValueError(f'Rule {index} has unknown conditions {unknown_keys}')
+            self.rules[rule['decision']].append(DecisionRules.compile_rule(rule, rule['answer'], f'rule {index}'))
+
+    @staticmethod
+    def compile_rule(conditions: Dict[str, Any], answer: bool, description: str) -> Rule:
+        """
+        Compiles conditions of a rule (keys of DecisionRules.conditions). Raises ValueError when they are not valid.
+        """
+        for key in ['name', 'path', 'directory']:
+            if key in conditions and not isinstance(conditions[key], str):
+                raise ValueError(f'{key} of {description} must be a string')
+        for key in ['min_size', 'max_size', 'min_age_days', 'max_age_days']:
+            value: Any = conditions.get(key, 0)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ValueError(f'{key} of {description} must be a number')
+
+        return DecisionRules.Rule(
+            answer=answer,
+            name=re.compile(fnmatch.translate(conditions['name'])) if 'name' in conditions else None,
+            path=re.compile(fnmatch.translate(conditions['path'])) if 'path' in conditions else None,
+            directory=os.path.abspath(conditions['directory']) if 'directory' in conditions else None,
+            min_size=conditions.get('min_size'),
+            max_size=conditions.get('max_size'),
+            min_age=conditions['min_age_days'] * DecisionRules.seconds_per_day
+            if 'min_age_days' in conditions else None,
+            max_age=conditions['max_age_days'] * DecisionRules.seconds_per_day
+            if 'max_age_days' in conditions else None)
+
+    @staticmethod
+    def validate_decision(decision: Any) -> None:
+        if decision not in DecisionRules.decisions:
+            raise ValueError(f'Unknown decision {decision}. Decision must be one of {DecisionRules.decisions}')
+
+    def get_global_answer(self, decision: str) -> Optional[bool]:
+        return self.global_answers.get(decision)
+
+    def decide(self, decision: str, file_path: str, file_status: Optional[os.stat_result] = None,
+               get_status: Callable[[str], os.stat_result] = os.stat) -> Optional[bool]:
+        """
+        Returns answer of the first rule of given decision matching the file or None if no rule matches.
+        File status is read (with get_status) only if it was not given and a rule has size or age conditions.
+        """
+        for rule in self.rules[decision]:
+            if not rule.matches_path(file_path):
+                continue
+            if rule.requires_status():
+                if file_status is None:
+                    try:
+                        file_status = get_status(file_path)
+                    except OSError:
+                        continue  # File planned by journal does not exist yet
+                if not rule.matches_status(file_status):
+                    continue
+            return rule.answer
+        return None
@@ -0,0 +1,89 @@
+import os
+import stat
+from typing import Dict, Optional, Tuple
+
+
+class DirectoryHandles:
+    """
+    Performs stat calls and changes of files relative to open file descriptors of their directories
+    (openat-style), so path of a directory is resolved once instead of once per operation on each of its files,
+    and operation cannot reach a file in another directory when a directory on the path is renamed or replaced
+    after it was opened. Directories are opened with O_PATH where available, so only search permission is needed.
+    The most recently used directories are kept open, up to max_open_dirs; on systems without dir_fd support
+    full paths are used.
+    """
+    max_open_dirs: int = 64
+    dir_open_flags: int = getattr(os, 'O_PATH', os.O_RDONLY) | getattr(os, 'O_DIRECTORY', 0)
+    is_supported: bool = {os.stat, os.unlink, os.chmod, os.rename} <= os.supports_dir_fd  # Decided on import
+
+    def __init__(self):
+        self.dir_fds: Dict[str, int] = {}  # In order of use, the least recently used first
+        self.last_dir: Optional[Tuple[str, int]] = None  # Files of one directory are usually processed together
+
+    def open_dir(self, directory: str) -> int:
+        if self.last_dir is not None and self.last_dir[0] == directory:
+            return self.last_dir[1]
+        dir_fd: int = self.dir_fds.pop(directory, -1)
+        if dir_fd == -1:
+            dir_fd = os.open(directory or os.curdir, DirectoryHandles.dir_open_flags)
+            if len(self.dir_fds) >= DirectoryHandles.max_open_dirs:
+                os.close(self.dir_fds.pop(next(iter(self.dir_fds))))
+        self.dir_fds[directory] = dir_fd
+        self.last_dir = (directory, dir_fd)
+        return dir_fd
+
+    def split(self, file_path: str) -> Tuple[int, str]:
+        """
+        Returns descriptor of directory of file and name of file.
+        """
+        directory, file_name = os.path.split(file_path)
+        return self.open_dir(directory), file_name
+
+    def stat(self, file_path: str, follow_symlinks: bool = True) -> os.stat_result:
+        if not DirectoryHandles.is_supported:
+            return os.stat(file_path, follow_symlinks=follow_symlinks)
+        dir_fd, file_name = self.split(file_path)
+        return os.stat(file_name, dir_fd=dir_fd, follow_symlinks=follow_symlinks)
+
+    def is_file(self, file_path: str) -> bool:
+        try:
+            return stat.S_ISREG(self.stat(file_path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def remove(self, file_path: str) -> None:
+        if not DirectoryHandles.is_supported:
+            os.remove(file_path)
+            return
+        dir_fd, file_name = self.split(file_path)
+        os.unlink(file_name, dir_fd=dir_fd)
+
+    def chmod(self, file_path: str, mode: int) -> None:
+        """
+        Changes mode of file; symbolic link is followed, since mode of a link cannot be changed on Linux.
+        """
+        if not DirectoryHandles.is_supported:
+            os.chmod(file_path, mode)
+            return
+        dir_fd, file_name = self.split(file_path)
+        os.chmod(file_name, mode, dir_fd=dir_fd)
+
+    def replace(self, old_file_path: str, new_file_path: str) -> None:
+        """
+        Renames file, atomically replacing existing file of the new name.
+        """
+        if not DirectoryHandles.is_supported:
+            os.replace(old_file_path, new_file_path)
+            return
+        old_dir_fd, old_file_name = self.split(old_file_path)
+        new_dir_fd, new_file_name = self.split(new_file_path)
+        os.replace(old_file_name, new_file_name, src_dir_fd=old_dir_fd, dst_dir_fd=new_dir_fd)
+
+    def close(self) -> None:
+        """
+        Closes all directories; they are opened again when they are used.
+        """
+        for dir_fd in self.dir_fds.values():
+            os.close(dir_fd)
+        self.dir_fds.clear()
+        self.last_dir = None
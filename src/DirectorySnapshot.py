@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import List, Optional, Set, Tuple
+from DirectoryWalker import DirectoryWalker
+
+
+class DirectorySnapshot(DirectoryWalker):
+    """
+    Directory walker keeping listings of directories (names, types and stat information of their elements)
+    in a file between runs. Directory whose device, inode and modification time are the same as when it was listed
+    is not listed again and its files are yielded with saved stat information, so walking an unchanged tree
+    takes one stat call per directory.
+    Changes which do not modify directories (writing to a file, changing its permissions) are noticed only when
+    they are made by FileManager, which forgets listings of directories of files it changes, or when FileManager
+    takes stat information of a file again before removing or changing it. Files which saved information does not
+    mark for removal or change (e.g. a file which has become empty since it was listed) are not checked again.
+    Listings of directories modified shortly before they were listed are not saved, because their next modification
+    could leave the same modification time.
+    """
+    schema_version: int = 1
+    commit_interval: int = 1000
+    racy_interval_ns: int = 2 * 10 ** 9
+
+    file_kind: str = 'f'
+    dir_kind: str = 'd'
+    other_kind: str = 'o'
+
+    # Element of listing: name, kind, whether it is a symbolic link and stat information of file
+    # (mode, inode, device, links, uid, gid, size, access, modification and change time in nanoseconds)
+    ListingElement = Tuple[str, str, bool, Optional[List[int]]]
+
+    def __init__(self, snapshot_file_path: str, logger: logging.Logger, follow_symlinks: bool = True,
+                 one_file_system: bool = False, rebuild: bool = False):
+        super().__init__(logger, follow_symlinks=follow_symlinks, one_file_system=one_file_system)
+        self.connection: sqlite3.Connection = sqlite3.connect(snapshot_file_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.uncommitted_changes: int = 0
+        self.listed_dirs: int = 0
+        self.reused_dirs: int = 0
+
+        # Types of elements depend on whether symbolic links are followed
+        settings: str = f'{DirectorySnapshot.schema_version}:{follow_symlinks}'
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', ('settings',)).fetchone()
+        if rebuild or row is None or row[0] != settings:
+            self.connection.execute('DROP TABLE IF EXISTS dirs')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS dirs ('
+                                'path TEXT PRIMARY KEY, '
+                                'dev INTEGER NOT NULL, '
+                                'ino INTEGER NOT NULL, '
+                                'mtime_ns INTEGER NOT NULL, '
+                                'listing TEXT NOT NULL) WITHOUT ROWID')
+        self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('settings', settings))
+        self.connection.commit()
+
+    def list_dir(self, directory: str, root_device: int,
+                 visited_dirs: Set[Tuple[int, int]]) -> Tuple[List[DirectoryWalker.Entry], List[str]]:
+        """
+        Lists directory using saved listing if directory has not changed since it was saved.
+        """
+        dir_path: str = os.path.abspath(directory)
+        try:
+            dir_status: os.stat_result = os.stat(directory)
+        except OSError as e:
+            self.logger.error(f'Could not list directory {directory}. {e}')
+            return [], []
+        row = self.connection.execute('SELECT dev, ino, mtime_ns, listing FROM dirs WHERE path = ?',
+                                      (dir_path,)).fetchone()
+        if row is not None and tuple(row[:3]) == (dir_status.st_dev, dir_status.st_ino, dir_status.st_mtime_ns):
+            listing: List[DirectorySnapshot.ListingElement] = json.loads(row[3])
+            self.reused_dirs += 1
+        else:
+            listed_time_ns: int = time.time_ns()
+            listing, errors = self.read_dir(directory)
+            if listing is None:
+                return [], []
+            self.listed_dirs += 1
+            if row is not None:
+                self.forget_removed_subdirs(dir_path, json.loads(row[3]), listing)
+            if errors or dir_status.st_mtime_ns > listed_time_ns - DirectorySnapshot.racy_interval_ns:
+                self.forget_dir(dir_path)
+            else:
+                self.execute('INSERT OR REPLACE INTO dirs (path, dev, ino, mtime_ns, listing) VALUES (?, ?, ?, ?, ?)',
+                             (dir_path, dir_status.st_dev, dir_status.st_ino, dir_status.st_mtime_ns,
+                              json.dumps(listing, separators=(',', ':'))))
+
+        files: List[DirectoryWalker.Entry] = []
+        subdirs: List[str] = []
+        for name, kind, is_link, status in listing:
+            path: str = os.path.join(directory, name)
+            if kind == DirectorySnapshot.dir_kind:
+                try:
+                    if self.should_walk_dir(DirectoryWalker.Entry(path=path, name=name, is_link=is_link,
+                                                                  is_directory=True), root_device, visited_dirs):
+                        subdirs.append(path)
+                except OSError as e:
+                    self.logger.error(f'Could not access {path}. {e}')
+            elif kind == DirectorySnapshot.file_kind:
+                files.append(DirectoryWalker.Entry(path=path, name=name, is_link=is_link,
+                                                   status=None if status is None
+                                                   else DirectorySnapshot.get_status(status)))
+            else:
+                self.logger.info(f'Encountered unsupported directory element {path}. '
+                                 f'Program supports only directories and files.')
+        return files, subdirs
+
+    def read_dir(self, directory: str) -> Tuple[Optional[List[ListingElement]], int]:
+        """
+        Lists directory with stat information of its files. Returns listing (or None if directory cannot be listed)
+        and number of elements which could not be accessed and are missing from listing.
+        Stat information of symbolic links is not saved, because their targets can change without changing directory.
+        """
+        try:
+            with os.scandir(directory) as dir_iterator:
+                dir_entries: List[os.DirEntry] = list(dir_iterator)
+        except OSError as e:
+            self.logger.error(f'Could not list directory {directory}. {e}')
+            return None, 0
+
+        listing: List[DirectorySnapshot.ListingElement] = []
+        errors: int = 0
+        for entry in dir_entries:
+            try:
+                if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                    listing.append((entry.name, DirectorySnapshot.dir_kind, entry.is_symlink(), None))
+                elif entry.is_file(follow_symlinks=self.follow_symlinks):
+                    status: Optional[List[int]] = None
+                    if not entry.is_symlink():
+                        file_status: os.stat_result = entry.stat()
+                        status = [file_status.st_mode, file_status.st_ino, file_status.st_dev, file_status.st_nlink,
+                                  file_status.st_uid, file_status.st_gid, file_status.st_size,
+                                  file_status.st_atime_ns, file_status.st_mtime_ns, file_status.st_ctime_ns]
+                    listing.append((entry.name, DirectorySnapshot.file_kind, entry.is_symlink(), status))
+                else:
+                    listing.append((entry.name, DirectorySnapshot.other_kind, entry.is_symlink(), None))
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+                errors += 1
+        return listing, errors
+
+    @staticmethod
+    def get_status(status: List[int]) -> os.stat_result:
+        """
+        Creates stat information from saved values. Times are available in seconds (integer and float) and nanoseconds.
+        """
+        times_ns: List[int] = status[7:]
+        return os.stat_result((*status[:7], *(time_ns // 10 ** 9 for time_ns in times_ns),
+                               *(time_ns / 10 ** 9 for time_ns in times_ns), *times_ns))
+
+    def forget_removed_subdirs(self, dir_path: str, old_listing: List[ListingElement],
+                               listing: List[ListingElement]) -> None:
+        """
+        Removes saved listings of subdirectories (and their subdirectories) which are not in directory anymore.
+        """
+        subdirs: Set[str] = {name for name, kind, _, _ in listing if kind == DirectorySnapshot.dir_kind}
+        for name, kind, _, _ in old_listing:
+            if kind == DirectorySnapshot.dir_kind and name not in subdirs:
+                subdir_path: str = os.path.join(dir_path, name)
+                self.execute('DELETE FROM dirs WHERE path = ? OR (path > ? AND path < ?)',
+                             (subdir_path, subdir_path + os.sep, subdir_path + chr(ord(os.sep) + 1)))
+
+    def forget_dir(self, directory: str) -> None:
+        """
+        Removes saved listing of directory, so it is listed again.
+        """
+        self.execute('DELETE FROM dirs WHERE path = ?', (os.path.abspath(directory),))
+
+    def execute(self, sql: str, parameters: tuple) -> None:
+        self.connection.execute(sql, parameters)
+        self.uncommitted_changes += 1
+        if self.uncommitted_changes >= DirectorySnapshot.commit_interval:
+            self.connection.commit()
+            self.uncommitted_changes = 0
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,125 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Set, Tuple
+
+
+class DirectoryWalker:
+    """
+    Iterative walker of directory trees based on os.scandir.
+    Yields os.DirEntry objects of files, so their type and stat information is cached and can be reused by callers.
+    Every directory is listed completely before its files are yielded, so files can be removed or renamed
+    while walking.
+    """
+
+    @dataclass
+    class Entry:
+        """
+        Replacement of os.DirEntry of element listed earlier (e.g. by another process or by previous run).
+        Stat information is taken when element is listed; if it is not known, it is taken on first use.
+        """
+        path: str
+        name: str
+        status: Optional[os.stat_result] = None
+        error: Optional[OSError] = None
+        is_link: bool = False
+        is_directory: bool = False
+
+        def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+            if self.error is not None:
+                raise self.error
+            if not follow_symlinks and self.is_link:
+                return os.stat(self.path, follow_symlinks=False)
+            if self.status is None:
+                self.status = os.stat(self.path)
+            return self.status
+
+        def is_symlink(self) -> bool:
+            return self.is_link
+
+        def is_file(self, follow_symlinks: bool = True) -> bool:
+            return not self.is_directory
+
+        def is_dir(self, follow_symlinks: bool = True) -> bool:
+            return self.is_directory
+
+    def __init__(self, logger: logging.Logger, follow_symlinks: bool = True, one_file_system: bool = False):
+        self.logger: logging.Logger = logger
+        self.follow_symlinks: bool = follow_symlinks
+        self.one_file_system: bool = one_file_system
+
+    def walk(self, directory: str, root_device: Optional[int] = None,
+             visited_dirs: Optional[Set[Tuple[int, int]]] = None) -> Iterator[os.DirEntry]:
+        """
+        Yields files from given directory and its subdirectories.
+        Symbolic links are followed only if follow_symlinks is set; directories reached more than once
+        (e.g. through a symbolic link cycle) are walked only once.
+        If one_file_system is set, directories on other devices than given directory are not walked.
+        Subtree of a bigger tree can be walked by passing device of the tree root and directories already visited.
+        """
+        try:
+            root_status: os.stat_result = os.stat(directory)
+        except OSError as e:
+            self.logger.error(f'Could not access {directory}. {e}')
+            return
+        if root_device is None:
+            root_device = root_status.st_dev
+        if visited_dirs is None:
+            visited_dirs = set()
+        visited_dirs.add((root_status.st_dev, root_status.st_ino))
+
+        dirs_to_walk: List[str] = [directory]
+        while dirs_to_walk:
+            files, subdirs = self.list_dir(dirs_to_walk.pop(), root_device, visited_dirs)
+            yield from files
+            dirs_to_walk.extend(reversed(subdirs))  # Subdirectories are walked in the order they were listed
+
+    def list_dir(self, directory: str, root_device: int,
+                 visited_dirs: Set[Tuple[int, int]]) -> Tuple[List[os.DirEntry], List[str]]:
+        """
+        Lists directory completely. Returns its files and subdirectories which should be walked.
+        """
+        try:
+            with os.scandir(directory) as dir_iterator:
+                dir_entries: List[os.DirEntry] = list(dir_iterator)
+        except OSError as e:
+            self.logger.error(f'Could not list directory {directory}. {e}')
+            return [], []
+
+        files: List[os.DirEntry] = []
+        subdirs: List[str] = []
+        for entry in dir_entries:
+            try:
+                if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                    if self.should_walk_dir(entry, root_device, visited_dirs):
+                        subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=self.follow_symlinks):
+                    files.append(entry)
+                else:
+                    self.logger.info(f'Encountered unsupported directory element {entry.path}. '
+                                     f'Program supports only directories and files.')
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+        return files, subdirs
+
+    def should_walk_dir(self, entry: os.DirEntry, root_device: int, visited_dirs: Set[Tuple[int, int]]) -> bool:
+        if not self.one_file_system and not self.follow_symlinks:
+            return True  # Without symbolic links directory cannot be reached twice
+        dir_status: os.stat_result = entry.stat(follow_symlinks=self.follow_symlinks)
+        if self.one_file_system and dir_status.st_dev != root_device:
+            self.logger.info(f'Skipping directory {entry.path} located on another file system')
+            return False
+        dir_key: Tuple[int, int] = (dir_status.st_dev, dir_status.st_ino)
+        if dir_key in visited_dirs:
+            self.logger.info(f'Skipping directory {entry.path} which has already been walked')
+            return False
+        visited_dirs.add(dir_key)
+        return True
+
+    @staticmethod
+    def get_dir_path(entry: os.DirEntry) -> str:
+        return os.path.dirname(entry.path)
+
+    @staticmethod
+    def get_real_path(entry: os.DirEntry) -> str:
+        return os.path.realpath(entry.path) if entry.is_symlink() else entry.path
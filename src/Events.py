@@ -0,0 +1,48 @@
+import logging
+from dataclasses import dataclass
+from typing import Deque, Union
+
+
+class Events:
+    """
+    Results of operations performed by FileManager, yielded by its actions as they happen.
+    Events are reported only for operations which were applied; operations recorded in journal are reported
+    when journal is executed.
+    """
+
+    @dataclass
+    class Moved:
+        source_path: str
+        destination_path: str
+
+    @dataclass
+    class Removed:
+        path: str
+
+    @dataclass
+    class Chmodded:
+        path: str
+        mode: int
+
+    @dataclass
+    class Renamed:
+        old_path: str
+        new_path: str
+
+    @dataclass
+    class Error:
+        message: str
+
+    Event = Union[Moved, Removed, Chmodded, Renamed, Error]
+
+    class ErrorCollector(logging.Handler):
+        """
+        Logging handler turning logged errors into error events.
+        """
+
+        def __init__(self, events: Deque['Events.Event']):
+            super().__init__(logging.ERROR)
+            self.events: Deque[Events.Event] = events
+
+        def emit(self, record: logging.LogRecord) -> None:
+            self.events.append(Events.Error(record.getMessage()))
@@ -0,0 +1,97 @@
+import json
+import os
+from typing import Iterator, List, Optional
+
+
+class ExecutionJournal:
+    """
+    Journal of file operations (moves, removals, permission changes and renames) decided while scanning directories.
+    Operations are applied in batches and the number of applied operations is saved after every batch,
+    so an interrupted execution can be resumed without scanning directories and hashing files again.
+    """
+    version: int = 1
+
+    move: str = 'move'  # [move, source path, source device, destination path]
+    remove: str = 'remove'  # [remove, file path]
+    chmod: str = 'chmod'  # [chmod, file path, mode]
+    rename: str = 'rename'  # [rename, old file path, new file path]
+
+    def __init__(self, journal_path: Optional[str]):
+        self.journal_path: Optional[str] = journal_path
+        self.checkpoint_path: Optional[str] = None if journal_path is None else journal_path + '.checkpoint'
+        self.operations: List[list] = []
+
+    def add(self, *operation) -> None:
+        self.operations.append(list(operation))
+
+    def has_unfinished_operations(self) -> bool:
+        """
+        Returns True if not all operations of journal saved by previous run have been applied, and loads them
+        to be executed. Completed journal is not loaded, so its operations are not applied again.
+        """
+        if self.journal_path is None or not os.path.isfile(self.journal_path):
+            return False
+        with open(self.journal_path, 'r') as f:
+            header: dict = json.loads(f.readline())
+            if header.get('version') != ExecutionJournal.version:
+                return False
+            operations: List[list] = [json.loads(line) for line in f]
+        if self.read_checkpoint() >= len(operations):
+            return False
+        self.operations = operations
+        return True
+
+    def save(self) -> None:
+        """
+        Atomically writes journal to disk and resets checkpoint.
+        """
+        temp_path: str = self.journal_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(json.dumps({'version': ExecutionJournal.version, 'operations': len(self.operations)}) + '\n')
+            for operation in self.operations:
+                f.write(json.dumps(operation) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        self.write_checkpoint(0)
+
+    def read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, applied_operations: int) -> None:
+        temp_path: str = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(str(applied_operations))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    def execute(self, batch_size: int) -> Iterator[List[list]]:
+        """
+        Yields operations starting from the last checkpoint in batches of given size, to be applied by the caller.
+        Checkpoint is written when the next batch is requested, so a batch whose application was interrupted
+        is applied again by the next run.
+        """
+        for batch_start in range(self.read_checkpoint(), len(self.operations), batch_size):
+            batch: List[list] = self.operations[batch_start:batch_start + batch_size]
+            yield batch
+            self.write_checkpoint(batch_start + len(batch))
+        self.operations = []  # Applied operations are not saved again
+
+    def print(self) -> None:
+        for operation in self.operations:
+            print(ExecutionJournal.format_operation(operation))
+
+    @staticmethod
+    def format_operation(operation: list) -> str:
+        if operation[0] == ExecutionJournal.move:
+            return f'move {operation[1]} -> {operation[3]}'
+        if operation[0] == ExecutionJournal.chmod:
+            return f'chmod {oct(operation[2])} {operation[1]}'
+        if operation[0] == ExecutionJournal.rename:
+            return f'rename {operation[1]} -> {operation[2]}'
+        return f'{operation[0]} {operation[1]}'
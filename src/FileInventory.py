@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import os
+import struct
+import tempfile
+from array import array
+from operator import itemgetter
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class FileInventory:
+    """
+    Compact inventory of files collected for duplicates removal.
+    Directory paths are interned and files are kept as columns of integers (size, device, inode, directory id)
+    and encoded file names concatenated in one buffer, instead of full paths in lists of a dictionary.
+    When estimated memory used by the inventory exceeds memory budget, files are sorted by size and written
+    to a temporary file (run); runs are merged when files are read back grouped by size, so memory used
+    by duplicates removal does not grow with number of files. When there are max_runs runs, they are merged
+    into one before the next one is written, so the number of open temporary files is limited.
+    """
+    record: struct.Struct = struct.Struct('<QQQIH')  # size, device, inode, directory id, file name length
+    entry_overhead: int = 48  # Memory used by one file kept in memory, without its name
+    batch_files: int = 10000  # Number of files in groups of the same size passed to duplicates removal at once
+    max_runs: int = 64
+
+    def __init__(self, memory_budget: int):
+        self.memory_budget: int = memory_budget
+        self.dirs: List[str] = []
+        self.dir_ids: Dict[str, int] = {}
+        self.sizes: array = array('Q')
+        self.devices: array = array('Q')
+        self.inodes: array = array('Q')
+        self.dir_indexes: array = array('L')
+        self.names: bytearray = bytearray()
+        self.name_ends: array = array('Q')
+        self.memory_used: int = 0
+        self.runs: List[BinaryIO] = []
+
+    def add(self, file_path: str, file_status: os.stat_result) -> None:
+        directory, file_name = os.path.split(file_path)
+        dir_id: Optional[int] = self.dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(directory)
+            self.dir_ids[directory] = dir_id
+        self.sizes.append(file_status.st_size)
+        self.devices.append(file_status.st_dev)
+        self.inodes.append(file_status.st_ino)
+        self.dir_indexes.append(dir_id)
+        self.names += os.fsencode(file_name)
+        self.name_ends.append(len(self.names))
+        self.memory_used += FileInventory.entry_overhead + len(file_name)
+        if self.memory_used > self.memory_budget:
+            self.spill()
+
+    def spill(self) -> None:
+        """
+        Writes files kept in memory, sorted by size, to a new run in a temporary file.
+        """
+        if len(self.runs) >= FileInventory.max_runs:
+            self.merge_runs()
+        self.runs.append(FileInventory.write_run(self.iterate_memory()))
+        self.sizes, self.devices, self.inodes, self.dir_indexes = array('Q'), array('Q'), array('Q'), array('L')
+        self.names, self.name_ends = bytearray(), array('Q')
+        self.memory_used = 0
+
+    def merge_runs(self) -> None:
+        """
+        Replaces all runs with one run of their files sorted by size.
+        """
+        merged_run: BinaryIO = FileInventory.write_run(
+            heapq.merge(*[FileInventory.iterate_run(run) for run in self.runs], key=itemgetter(0)))
+        for run in self.runs:
+            run.close()
+        self.runs = [merged_run]
+
+    @staticmethod
+    def write_run(entries: Iterable[Tuple[int, int, int, int, str]]) -> BinaryIO:
+        run: BinaryIO = tempfile.TemporaryFile(prefix='file_manager_inventory_')
+        for size, device, inode, dir_id, file_name in entries:
+            encoded_name: bytes = os.fsencode(file_name)
+            run.write(FileInventory.record.pack(size, device, inode, dir_id, len(encoded_name)))
+            run.write(encoded_name)
+        run.flush()
+        return run
+
+    def get_encoded_name(self, index: int) -> bytes:
+        return bytes(self.names[self.name_ends[index - 1] if index else 0:self.name_ends[index]])
+
+    def iterate_memory(self) -> Iterator[Tuple[int, int, int, int, str]]:
+        for index in sorted(range(len(self.sizes)), key=self.sizes.__getitem__):
+            yield self.sizes[index], self.devices[index], self.inodes[index], self.dir_indexes[index], \
+                os.fsdecode(self.get_encoded_name(index))
+
+    @staticmethod
+    def iterate_run(run: BinaryIO) -> Iterator[Tuple[int, int, int, int, str]]:
+        run.seek(0)
+        while True:
+            header: bytes = run.read(FileInventory.record.size)
+            if not header:
+                return
+            size, device, inode, dir_id, name_length = FileInventory.record.unpack(header)
+            yield size, device, inode, dir_id, os.fsdecode(run.read(name_length))
+
+    def iterate_sorted(self) -> Iterator[Tuple[int, int, int, int, str]]:
+        """
+        Yields (size, device, inode, directory id, file name) of all files sorted by size.
+        """
+        sources: List[Iterator[Tuple[int, int, int, int, str]]] = [FileInventory.iterate_run(run) for run in self.runs]
+        sources.append(self.iterate_memory())
+        return heapq.merge(*sources, key=itemgetter(0))
+
+    def iterate_size_groups(self) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Yields sizes shared by more than one file with paths of these files.
+        The same file reached through a link is listed only once.
+        """
+        for size, entries in itertools.groupby(self.iterate_sorted(), key=itemgetter(0)):
+            group: List[Tuple[int, int, int, int, str]] = list(entries)
+            if len(group) < 2:
+                continue  # Otherwise this file size is unique
+            seen_keys: Set[Tuple[int, int]] = set()
+            file_paths: List[str] = []
+            for _, device, inode, dir_id, file_name in group:
+                if (device, inode) not in seen_keys:
+                    seen_keys.add((device, inode))
+                    file_paths.append(os.path.join(self.dirs[dir_id], file_name))
+            if len(file_paths) > 1:
+                yield size, file_paths
+
+    def iterate_size_group_batches(self) -> Iterator[Dict[int, List[str]]]:
+        """
+        Yields groups of files of the same size in batches of about batch_files files.
+        """
+        batch: Dict[int, List[str]] = {}
+        batch_files: int = 0
+        for size, file_paths in self.iterate_size_groups():
+            batch[size] = file_paths
+            batch_files += len(file_paths)
+            if batch_files >= FileInventory.batch_files:
+                yield batch
+                batch, batch_files = {}, 0
+        if batch:
+            yield batch
+
+    def iterate_keys(self) -> Iterator[Tuple[int, int]]:
+        """
+        Yields (device, inode) of all files.
+        """
+        for _, device, inode, _, _ in self.iterate_sorted():
+            yield device, inode
+
+    def close(self) -> None:
+        for run in self.runs:
+            run.close()
+        self.runs = []
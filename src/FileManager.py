@@ -1,31 +1,90 @@
 import argparse
+import itertools
 import logging
 import os
 import json
 import sys
-import shutil
 import hashlib
+import stat
+import sqlite3
 from dataclasses import dataclass
-from collections import defaultdict
-from typing import List, Dict, Type, Callable, BinaryIO, DefaultDict, Tuple
+from collections import defaultdict, deque
+from typing import List, Dict, Type, Callable, DefaultDict, Deque, Tuple, Set, Optional, Any, Iterator, Iterable, \
+    Generator
 from UserInputHandler import UserInputHandler
+from HashCache import HashCache
+from HashingEngine import HashingEngine
+from DirectoryWalker import DirectoryWalker
+from DirectorySnapshot import DirectorySnapshot
+from DirectoryHandles import DirectoryHandles
+from MoveEngine import MoveEngine
+from ExecutionJournal import ExecutionJournal
+from FileSystemWatcher import FileSystemWatcher
+from DecisionRules import DecisionRules
+from ReviewQueue import ReviewQueue
+from Metrics import Metrics
+from FileInventory import FileInventory
+from ShardedScanner import ShardedScanner
+from Events import Events
+from Throttle import Throttle
+from WorkerPriority import WorkerPriority
+from FileMatchers import FileMatchers
+from AsyncLog import AsyncLog
 
 
 class FileManager:
-    logger: logging.Logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-    file_handler: logging.FileHandler = logging.FileHandler('file_manager.log')
-    stream_handler: logging.StreamHandler = logging.StreamHandler(sys.stdout)
-    log_formatter: logging.Formatter = logging.Formatter('%(asctime)s: %(name)s: %(levelname)s: %(message)s')
-    file_handler.setFormatter(log_formatter)
-    stream_handler.setFormatter(log_formatter)
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    """
+    Engine performing actions on target directory. It is built from explicit configuration (the same keys as
+    in config.json) and options, and its actions are generators yielding events (see Events) of operations as they are
+    applied. Invalid configuration or options raise FileManager.Error. Engine should be closed after use,
+    e.g. by using it as a context manager.
+    """
+    action_move_files_from_sources_to_target: str = 'm'
+    action_remove_empty_files_from_target: str = 'e'
+    action_remove_temp_files_from_target: str = 't'
+    action_remove_duplicates_from_target: str = 'd'
+    action_unify_file_permissions: str = 'p'
+    action_change_bad_characters_in_file_names: str = 'c'
+    action_run_all: str = 'a'
+    actions: List[str] = [action_move_files_from_sources_to_target, action_remove_empty_files_from_target,
+                          action_remove_temp_files_from_target, action_remove_duplicates_from_target,
+                          action_unify_file_permissions, action_change_bad_characters_in_file_names, action_run_all]
+
+    class Error(Exception):
+        pass
+
+    @dataclass
+    class Options:
+        fused: bool = False
+        hash_cache: Optional[str] = None  # Path to hash cache file
+        rebuild_hash_cache: bool = False
+        journal: Optional[str] = None  # Path to journal file
+        dry_run: bool = False
+        rules: Optional[str] = None  # Path to rules file
+        review: Optional[str] = None  # Path to review file
+        metrics: Optional[str] = None  # Path to metrics file (JSON)
+        metrics_prometheus: Optional[str] = None  # Path to metrics file (Prometheus text format)
+        profile_phase: Optional[str] = None
+        profile_path: Optional[str] = None
+        profiler: str = 'cprofile'
+        watch: bool = False
+        ingest_dedup: bool = False
+        snapshot: Optional[str] = None  # Path to snapshot file
+        rebuild_snapshot: bool = False
 
     @dataclass
     class Config:
         name: str
         type: Type
+        default: Any = None
+
+    @dataclass
+    class TargetFile:
+        mtime: float
+        size: int
+        inode: int
+        device: int
+        source_path: Optional[str] = None  # Set when file from source directory is going to be moved to target
 
     default_file_permissions: Config = Config(name='default_file_permissions', type=str)
     unusual_file_permissions: Config = Config(name='unusual_file_permissions', type=list)
@@ -36,41 +95,175 @@ class FileManager:
     configuration_list: List[Config] = [default_file_permissions, unusual_file_permissions, unwanted_chars,
                                         substitute_char, tmp_file_extensions]
 
-    def __init__(self):
-        action_move_files_from_sources_to_target: str = 'm'
-        action_remove_empty_files_from_target: str = 'e'
-        action_remove_temp_files_from_target: str = 't'
-        action_remove_duplicates_from_target: str = 'd'
-        action_unify_file_permissions: str = 'p'
-        action_change_bad_characters_in_file_names: str = 'c'
-        action_run_all: str = 'a'
-        self.actions_dict: Dict[str, Callable] = {
-            action_move_files_from_sources_to_target: self.move_files_from_sources_to_target,
-            action_remove_empty_files_from_target: self.remove_empty_files_from_target,
-            action_remove_temp_files_from_target: self.remove_temp_files_from_target,
-            action_remove_duplicates_from_target: self.remove_duplicates_from_target,
-            action_unify_file_permissions: self.unify_files_permissions,
-            action_change_bad_characters_in_file_names: self.replace_bad_chars_in_file_names,
-            action_run_all: self.run
-        }
+    hash_algorithm: Config = Config(name='hash_algorithm', type=str, default='sha1')
+    hash_buffer_size: Config = Config(name='hash_buffer_size', type=int, default=1024 * 1024)
+    hash_workers: Config = Config(name='hash_workers', type=int, default=4)
+    hash_mmap_threshold: Config = Config(name='hash_mmap_threshold', type=int, default=64 * 1024 * 1024)
+    hash_max_in_flight_bytes: Config = Config(name='hash_max_in_flight_bytes', type=int, default=256 * 1024 * 1024)
+    dedup_sample_blocks: Config = Config(name='dedup_sample_blocks', type=int, default=4)
+    dedup_sample_block_size: Config = Config(name='dedup_sample_block_size', type=int, default=64 * 1024)
+    dedup_byte_compare_max_group: Config = Config(name='dedup_byte_compare_max_group', type=int, default=2)
+    dedup_memory_budget: Config = Config(name='dedup_memory_budget', type=int, default=256 * 1024 * 1024)
+
+    follow_symlinks: Config = Config(name='follow_symlinks', type=bool, default=True)
+    one_file_system: Config = Config(name='one_file_system', type=bool, default=False)
+    shard_processes: Config = Config(name='shard_processes', type=int, default=0)
+    shard_workers_per_device: Config = Config(name='shard_workers_per_device', type=int, default=2)
+
+    move_workers: Config = Config(name='move_workers', type=int, default=4)
+    move_verification: Config = Config(name='move_verification', type=str, default='size')
+
+    journal_batch_size: Config = Config(name='journal_batch_size', type=int, default=1000)
+
+    watch_poll_interval: Config = Config(name='watch_poll_interval', type=int, default=2)
+
+    io_read_bytes_per_second: Config = Config(name='io_read_bytes_per_second', type=int, default=0)
+    io_metadata_ops_per_second: Config = Config(name='io_metadata_ops_per_second', type=int, default=0)
+    worker_nice: Config = Config(name='worker_nice', type=int, default=0)
+    worker_io_class: Config = Config(name='worker_io_class', type=str, default='')
+    worker_io_level: Config = Config(name='worker_io_level', type=int, default=7)
+
+    phases: List[str] = ['move', 'empty', 'temp', 'dedup', 'permissions', 'rename', 'fused', 'journal', 'watch']
+
+    engine_ids: Iterator[int] = itertools.count(1)
 
-        args = self.get_args()
-        self.target_dir: str = args.target[0]
-        self.src_dirs: List[str] = args.source
-        self.config_file_path: str = args.config[0]
-        self.action: str = args.action[0]
+    # File left after removing empty and temporary files in fused traversal: path, path with symbolic link dereferenced
+    # and stat information (only if permissions are going to be changed)
+    RemainingFile = Tuple[str, str, Optional[os.stat_result]]
 
-        if self.src_dirs is None and self.action in [action_move_files_from_sources_to_target, action_run_all]:
-            print('This action requires to pass source directories as arguments')
-            exit(1)
+    optional_configuration_list: List[Config] = [hash_algorithm, hash_buffer_size, hash_workers, hash_mmap_threshold,
+                                                 hash_max_in_flight_bytes, dedup_sample_blocks, dedup_sample_block_size,
+                                                 dedup_byte_compare_max_group, dedup_memory_budget, follow_symlinks,
+                                                 one_file_system, shard_processes, shard_workers_per_device,
+                                                 move_workers, move_verification, journal_batch_size,
+                                                 watch_poll_interval, io_read_bytes_per_second,
+                                                 io_metadata_ops_per_second, worker_nice, worker_io_class,
+                                                 worker_io_level]
 
-        self.configurations = self.load_configurations()
+    def __init__(self, target_dir: str, configurations: Dict[str, Any], source_dirs: Optional[List[str]] = None,
+                 options: Optional['FileManager.Options'] = None, logger: Optional[logging.Logger] = None):
+        # Messages are logged to a child logger of every engine, so errors of one engine are not collected by another;
+        # they are propagated to handlers of the given logger
+        self.logger: logging.Logger = (logger if logger is not None else logging.getLogger(__name__)) \
+            .getChild(f'engine{next(FileManager.engine_ids)}')
+        self.options: FileManager.Options = options if options is not None else FileManager.Options()
+        self.actions_dict: Dict[str, Callable[[], Iterator[Events.Event]]] = {
+            FileManager.action_move_files_from_sources_to_target: self.move_files_from_sources_to_target,
+            FileManager.action_remove_empty_files_from_target: self.remove_empty_files_from_target,
+            FileManager.action_remove_temp_files_from_target: self.remove_temp_files_from_target,
+            FileManager.action_remove_duplicates_from_target: self.remove_duplicates_from_target,
+            FileManager.action_unify_file_permissions: self.unify_files_permissions,
+            FileManager.action_change_bad_characters_in_file_names: self.replace_bad_chars_in_file_names,
+            FileManager.action_run_all: self.run
+        }
+
+        self.target_dir: str = target_dir
+        self.src_dirs: Optional[List[str]] = source_dirs
+        self.is_fused: bool = self.options.fused
+        self.is_watch: bool = self.options.watch
+        self.is_ingest_dedup: bool = self.options.ingest_dedup
+
+        self.configurations: Dict[str, Any] = dict(configurations)
         self.validate_configuration()
+        try:
+            self.matchers: FileMatchers = FileMatchers(
+                tmp_file_patterns=self.configurations[FileManager.tmp_file_extensions.name],
+                unwanted_chars=self.configurations[FileManager.unwanted_chars.name],
+                substitute_char=self.configurations[FileManager.substitute_char.name],
+                unusual_file_permissions=self.configurations[FileManager.unusual_file_permissions.name],
+                default_file_permissions=self.configurations[FileManager.default_file_permissions.name])
+        except ValueError as e:
+            raise FileManager.Error(f'Invalid configuration. {e}') from e
 
         self.validate_existence_of_dirs()
+        if self.options.journal is not None and not self.options.dry_run:
+            # Journal is written after scanning, so it is checked before scanning begins
+            journal_dir: str = os.path.dirname(os.path.abspath(self.options.journal))
+            if not os.path.isdir(journal_dir) or not os.access(journal_dir, os.W_OK | os.X_OK):
+                raise FileManager.Error(f'Journal file {self.options.journal} cannot be written')
+
+        if self.options.profile_phase is not None and self.options.profile_phase not in FileManager.phases:
+            raise FileManager.Error(f'Profiled phase must be one of {FileManager.phases}')
+        self.rules: Optional[DecisionRules] = None
+        self.review: Optional[ReviewQueue] = None
+        try:
+            if self.options.rules is not None:
+                self.rules = DecisionRules(self.options.rules)
+            if self.options.review is not None:
+                self.review = ReviewQueue(self.options.review)
+        except (OSError, ValueError) as e:
+            raise FileManager.Error(f'Could not load rules or review file. {e}') from e
+
+        self.metrics: Metrics = Metrics(profile_phase=self.options.profile_phase,
+                                        profile_file_path=self.options.profile_path,
+                                        profiler=self.options.profiler)
+
+        # Throttles are shared by all workers; rate 0 means unlimited
+        self.read_throttle: Optional[Throttle] = None
+        if self.configurations[FileManager.io_read_bytes_per_second.name] > 0:
+            self.read_throttle = Throttle(self.configurations[FileManager.io_read_bytes_per_second.name])
+        self.metadata_throttle: Optional[Throttle] = None
+        if self.configurations[FileManager.io_metadata_ops_per_second.name] > 0:
+            self.metadata_throttle = Throttle(self.configurations[FileManager.io_metadata_ops_per_second.name])
+        worker_priority: WorkerPriority = WorkerPriority(nice=self.configurations[FileManager.worker_nice.name],
+                                                         io_class=self.configurations[FileManager.worker_io_class.name],
+                                                         io_level=self.configurations[FileManager.worker_io_level.name])
+        if worker_priority.io_class != WorkerPriority.no_io_class and WorkerPriority.get_ioprio_set_syscall() is None:
+            self.logger.warning(f'I/O priority of workers is not supported on this system. '
+                                f'{FileManager.worker_io_class.name} is ignored')
+        self.worker_initializer: Optional[Callable[[], None]] = \
+            worker_priority.apply if worker_priority.is_set() else None
+
+        # Directories of processed files are kept open for the time of an action (or a batch of watched changes)
+        self.dir_handles: DirectoryHandles = DirectoryHandles()
+        self.walker: DirectoryWalker = DirectoryWalker(
+            self.logger,
+            follow_symlinks=self.configurations[FileManager.follow_symlinks.name],
+            one_file_system=self.configurations[FileManager.one_file_system.name])
+        self.scanner: Optional[ShardedScanner] = None
+        if self.configurations[FileManager.shard_processes.name] > 0:
+            self.scanner = ShardedScanner(
+                self.logger,
+                processes=self.configurations[FileManager.shard_processes.name],
+                workers_per_device=self.configurations[FileManager.shard_workers_per_device.name],
+                follow_symlinks=self.configurations[FileManager.follow_symlinks.name],
+                one_file_system=self.configurations[FileManager.one_file_system.name],
+                worker_initializer=self.worker_initializer)
+        self.snapshot: Optional[DirectorySnapshot] = None
+        try:
+            if self.options.snapshot is not None:
+                self.snapshot = DirectorySnapshot(
+                    self.options.snapshot, self.logger,
+                    follow_symlinks=self.configurations[FileManager.follow_symlinks.name],
+                    one_file_system=self.configurations[FileManager.one_file_system.name],
+                    rebuild=self.options.rebuild_snapshot)
+        except (OSError, sqlite3.Error) as e:
+            raise FileManager.Error(f'Could not open snapshot file. {e}') from e
+        self.hashing_engine: HashingEngine = HashingEngine(
+            hash_algorithm=self.configurations[FileManager.hash_algorithm.name],
+            buffer_size=self.configurations[FileManager.hash_buffer_size.name],
+            workers=self.configurations[FileManager.hash_workers.name],
+            mmap_threshold=self.configurations[FileManager.hash_mmap_threshold.name],
+            max_in_flight_bytes=self.configurations[FileManager.hash_max_in_flight_bytes.name],
+            sample_blocks=self.configurations[FileManager.dedup_sample_blocks.name],
+            sample_block_size=self.configurations[FileManager.dedup_sample_block_size.name],
+            read_throttle=self.read_throttle,
+            worker_initializer=self.worker_initializer)
+        self.hash_cache: Optional[HashCache] = None
+        try:
+            if self.options.hash_cache is not None:
+                self.hash_cache = HashCache(self.options.hash_cache,
+                                            hash_algorithm=self.configurations[FileManager.hash_algorithm.name],
+                                            sample_settings=self.hashing_engine.get_sample_settings(),
+                                            rebuild=self.options.rebuild_hash_cache)
+        except (OSError, sqlite3.Error) as e:
+            if self.snapshot is not None:
+                self.snapshot.close()
+            raise FileManager.Error(f'Could not open hash cache file. {e}') from e
 
         self.is_global_move: bool = True
         self.keep_latest_file: bool = True
+        self.is_global_remove_existing: bool = True
 
         self.is_global_remove_empty: bool = True
         self.is_global_remove_temp: bool = True
@@ -83,9 +276,124 @@ class FileManager:
         self.is_global_file_names_change: bool = True
         self.is_global_override_files: bool = True
 
-        self.actions_dict[self.action]()  # Run method based on action chosen by user
+        # When journal is used, operations are recorded during scanning and applied afterwards
+        self.journal: Optional[ExecutionJournal] = None
+        if self.options.journal is not None or self.options.dry_run:
+            self.journal = ExecutionJournal(None if self.options.dry_run else self.options.journal)
+        self.planned_paths: Dict[str, bool] = {}  # Whether file will exist after applying recorded operations
+        self.planned_moves: Dict[str, str] = {}  # Source paths of recorded moves mapped to destination paths
+
+        # Files of target directory indexed by their sizes in watch mode
+        self.watched_files_by_size: DefaultDict[int, Set[str]] = defaultdict(set)
+        self.watched_file_sizes: Dict[str, int] = {}
+        self.is_target_indexed: bool = False
+
+        # Errors are logged as before and reported as events of the action being performed; handlers are added
+        # last, so they are not left on the logger when engine cannot be created
+        self.events: Deque[Events.Event] = deque()
+        self.log_handlers: List[logging.Handler] = [Metrics.ErrorCounter(self.metrics),
+                                                    Events.ErrorCollector(self.events)]
+        for handler in self.log_handlers:
+            self.logger.addHandler(handler)
+
+    def __enter__(self) -> 'FileManager':
+        return self
 
-    def get_args(self) -> argparse.Namespace:
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def perform(self, action: str) -> Iterator[Events.Event]:
+        """
+        Performs given action (one of FileManager.actions), yielding events of operations as they are applied.
+        When journal is used, operations are applied (and reported) after the whole action is recorded, and
+        unfinished journal of previous run is executed instead of the action. In dry run nothing is applied.
+        In watch mode iteration does not end until it is interrupted.
+        """
+        if action not in self.actions_dict:
+            raise FileManager.Error(f'Action must be one of {FileManager.actions}')
+        if self.src_dirs is None and action in [FileManager.action_move_files_from_sources_to_target,
+                                                FileManager.action_run_all]:
+            raise FileManager.Error('This action requires source directories')
+        if self.is_watch and (action != FileManager.action_run_all or self.journal is not None):
+            raise FileManager.Error('Watch mode can be used only with action "a" and without journal')
+        if self.is_ingest_dedup and action not in [FileManager.action_move_files_from_sources_to_target,
+                                                   FileManager.action_run_all]:
+            raise FileManager.Error('Duplicates can be skipped on ingest only with actions "m" and "a"')
+
+        self.reset_recorded_state()
+        if self.journal is not None and self.journal.has_unfinished_operations():
+            self.logger.info(f'Resuming execution of journal {self.options.journal}')
+            yield from self.execute_journal()
+            return
+        # Watcher is started before the first run, so files arriving during the run are not missed
+        watcher: Optional[FileSystemWatcher] = None
+        if self.is_watch:
+            watcher = FileSystemWatcher.create([*self.src_dirs, self.target_dir], self.logger,
+                                               self.configurations[FileManager.watch_poll_interval.name])
+        try:
+            yield from self.actions_dict[action]()
+            if self.journal is not None and not self.options.dry_run:
+                self.journal.save()
+                yield from self.execute_journal()
+            if watcher is not None:
+                yield from self.watch(watcher)
+            yield from self.pop_events()
+        finally:
+            self.dir_handles.close()
+            if watcher is not None:
+                watcher.close()
+
+    def reset_recorded_state(self) -> None:
+        """
+        Forgets operations recorded and files indexed by previous action, so engine can perform actions repeatedly.
+        """
+        if self.journal is not None:
+            self.journal.operations = []
+        self.planned_paths.clear()
+        self.planned_moves.clear()
+        self.watched_files_by_size.clear()
+        self.watched_file_sizes.clear()
+        self.is_target_indexed = False
+        self.events.clear()
+
+    def pop_events(self) -> Iterator[Events.Event]:
+        """
+        Yields events of operations applied (and errors logged) since the previous call.
+        """
+        while self.events:
+            yield self.events.popleft()
+
+    def close(self) -> None:
+        """
+        Saves review file, hash cache and snapshot, writes metrics and releases worker threads and processes.
+        """
+        if self.review is not None:
+            pending_questions: int = self.review.save()
+            if pending_questions:
+                self.logger.info(f'{pending_questions} questions were written to review file {self.options.review}. '
+                                 f'Answer them and run FileManager again with the same review file')
+
+        self.hashing_engine.close()
+        self.dir_handles.close()
+        if self.scanner is not None:
+            self.scanner.close()
+        if self.snapshot is not None:
+            self.logger.info(f'Listed {self.snapshot.listed_dirs} directories, '
+                             f'reused snapshot of {self.snapshot.reused_dirs} directories')
+            self.snapshot.close()
+        if self.hash_cache is not None:
+            self.hash_cache.close()
+        if self.read_throttle is not None:
+            self.logger.info(f'Waited {self.read_throttle.waited_time:.1f} s in total for reading files')
+        if self.metadata_throttle is not None:
+            self.logger.info(f'Waited {self.metadata_throttle.waited_time:.1f} s in total for metadata operations')
+
+        self.write_metrics()
+        for handler in self.log_handlers:
+            self.logger.removeHandler(handler)
+
+    @staticmethod
+    def get_args() -> argparse.Namespace:
         parser = argparse.ArgumentParser(
             description='FileManager is a script that helps you in ordering and managing your files')
         parser.add_argument('-t', '--target', nargs=1, type=str, required=True, help='Target directory')
@@ -93,334 +401,1199 @@ class FileManager:
                             help='Source directories')
         parser.add_argument('-c', '--config', nargs=1, type=str, required=True,
                             help='Path to configuration file (*.json)')
-        parser.add_argument('-a', '--action', nargs=1, type=str, required=True, choices=[*self.actions_dict.keys()],
+        parser.add_argument('-a', '--action', nargs=1, type=str, required=True, choices=FileManager.actions,
                             help='Action to be performed on target directory')
+        parser.add_argument('-f', '--fused', action='store_true',
+                            help='Perform all target directory actions in a single traversal (only with action "a")')
+        parser.add_argument('--hash-cache', nargs=1, type=str, required=False,
+                            help='Path to file in which hashes of files are kept between runs')
+        parser.add_argument('--rebuild-hash-cache', action='store_true',
+                            help='Discard all hashes kept in hash cache file')
+        parser.add_argument('--snapshot', nargs=1, type=str, required=False,
+                            help='Path to file in which listings of directories are kept between runs. '
+                                 'Directories which have not changed since the previous run are not listed again')
+        parser.add_argument('--rebuild-snapshot', action='store_true',
+                            help='Discard all listings kept in snapshot file')
+        parser.add_argument('-j', '--journal', nargs=1, type=str, required=False,
+                            help='Path to journal file. Operations are recorded in the journal before they are applied, '
+                                 'and interrupted execution of the journal is resumed by the next run')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print operations which would be performed without applying them')
+        parser.add_argument('-r', '--rules', nargs=1, type=str, required=False,
+                            help='Path to rules file (*.json) answering questions without asking user')
+        parser.add_argument('--review', nargs=1, type=str, required=False,
+                            help='Path to review file. Questions not answered by rules are written to this file '
+                                 'instead of being asked, and answers edited in it are applied by the next run')
+        parser.add_argument('--log-json', nargs=1, type=str, required=False,
+                            help='Path to file in which all logged messages are written as JSON Lines, '
+                                 'including repeated ones not shown in terminal')
+        parser.add_argument('--metrics', nargs=1, type=str, required=False,
+                            help='Path to file in which counters and timers of all phases are written (JSON)')
+        parser.add_argument('--metrics-prometheus', nargs=1, type=str, required=False,
+                            help='Path to file in which counters and timers of all phases are written '
+                                 '(Prometheus text format)')
+        parser.add_argument('--profile', nargs=2, type=str, required=False, metavar=('PHASE', 'PATH'),
+                            help=f'Profile given phase ({", ".join(FileManager.phases)}) and write profile '
+                                 f'to given file')
+        parser.add_argument('--profiler', type=str, choices=Metrics.profilers, default='cprofile',
+                            help='Profiler used by --profile option (default cprofile)')
+        parser.add_argument('--ingest-dedup', action='store_true',
+                            help='Do not move files from source directories whose content already exists '
+                                 'in target directory; such files are removed from source directories instead')
+        parser.add_argument('-w', '--watch', action='store_true',
+                            help='After performing action "a", keep running and perform it only on files '
+                                 'which are created or changed in source and target directories')
         return parser.parse_args()
 
-    def load_configurations(self) -> Dict:
+    @staticmethod
+    def load_configurations(config_file_path: str) -> Dict[str, Any]:
         try:
-            with open(self.config_file_path, 'r') as f:
-                data = json.load(f)
-            return data
-        except FileNotFoundError as e:
-            FileManager.logger.error(e)
-            exit(1)
+            with open(config_file_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise FileManager.Error(f'Could not load configuration file. {e}') from e
 
     def validate_configuration(self) -> None:
         for config in FileManager.configuration_list:
             if config.name not in self.configurations:
-                FileManager.logger.error(f'{config.name} is not present in configuration file')
-                exit(1)
+                raise FileManager.Error(f'{config.name} is not present in configuration file')
+            elif type(self.configurations[config.name]) != config.type:
+                raise FileManager.Error(f'{config.name} configuration must be of type {config.type}. '
+                                        f'Got type {type(self.configurations[config.name])} instead')
+        for config in FileManager.optional_configuration_list:
+            if config.name not in self.configurations:
+                self.configurations[config.name] = config.default
             elif type(self.configurations[config.name]) != config.type:
-                FileManager.logger.error(f'{config.name} configuration must be of type {config.type}. '
-                                         f'Got type {type(self.configurations[config.name])} instead')
-                exit(1)
+                raise FileManager.Error(f'{config.name} configuration must be of type {config.type}. '
+                                        f'Got type {type(self.configurations[config.name])} instead')
+        if self.configurations[FileManager.hash_algorithm.name] not in hashlib.algorithms_available:
+            raise FileManager.Error(f'{FileManager.hash_algorithm.name} must be one of '
+                                    f'{sorted(hashlib.algorithms_available)}')
+        try:  # Variable-length algorithms (e.g. shake_128) require length of digest
+            hashlib.new(self.configurations[FileManager.hash_algorithm.name]).digest()
+        except (TypeError, ValueError):
+            raise FileManager.Error(f'{FileManager.hash_algorithm.name} must be an algorithm '
+                                    f'with fixed length of digest') from None
+        for config in [FileManager.hash_buffer_size, FileManager.hash_workers, FileManager.hash_max_in_flight_bytes,
+                       FileManager.dedup_sample_block_size, FileManager.move_workers, FileManager.journal_batch_size]:
+            if self.configurations[config.name] < 1:
+                raise FileManager.Error(f'{config.name} must be at least 1')
+        for config in [FileManager.hash_mmap_threshold, FileManager.dedup_sample_blocks,
+                       FileManager.dedup_byte_compare_max_group, FileManager.dedup_memory_budget]:
+            if self.configurations[config.name] < 0:
+                raise FileManager.Error(f'{config.name} must not be negative')
+        if self.configurations[FileManager.move_verification.name] not in MoveEngine.verification_methods:
+            raise FileManager.Error(f'{FileManager.move_verification.name} must be one of '
+                                    f'{MoveEngine.verification_methods}')
+        if self.configurations[FileManager.shard_processes.name] < 0:
+            raise FileManager.Error(f'{FileManager.shard_processes.name} must not be negative')
+        if self.configurations[FileManager.shard_workers_per_device.name] < 1:
+            raise FileManager.Error(f'{FileManager.shard_workers_per_device.name} must be at least 1')
+        if self.configurations[FileManager.watch_poll_interval.name] < 1:
+            raise FileManager.Error(f'{FileManager.watch_poll_interval.name} must be at least 1 second')
+        for config in [FileManager.io_read_bytes_per_second, FileManager.io_metadata_ops_per_second,
+                       FileManager.worker_nice]:
+            if self.configurations[config.name] < 0:
+                raise FileManager.Error(f'{config.name} must not be negative')
+        if self.configurations[FileManager.worker_io_class.name] not in WorkerPriority.io_classes:
+            raise FileManager.Error(f'{FileManager.worker_io_class.name} must be one of {WorkerPriority.io_classes}')
+        if not 0 <= self.configurations[FileManager.worker_io_level.name] < WorkerPriority.io_levels:
+            raise FileManager.Error(f'{FileManager.worker_io_level.name} must be between 0 and '
+                                    f'{WorkerPriority.io_levels - 1}')
 
     def validate_existence_of_dirs(self) -> None:
         if not os.path.isdir(self.target_dir):
-            FileManager.logger.error(f'Target directory {self.target_dir} does not exist')
-            exit(1)
+            raise FileManager.Error(f'Target directory {self.target_dir} does not exist')
         if self.src_dirs is not None:
             for d in self.src_dirs:
                 if not os.path.isdir(d):
-                    FileManager.logger.error(f'Source directory {d} does not exist')
-                    exit(1)
-
-    def move_files_from_sources_to_target(self) -> None:
-        self.is_global_move, self.keep_latest_file = UserInputHandler.ask_if_move_files_globally()
-        for src_dir in self.src_dirs:
-            self.move_files_from_directory_tree_to_target(src_dir)
-
-    def move_files_from_directory_tree_to_target(self, directory: str) -> None:
-        """
-        Moves files from source directory to target directory.
-        If directory has subdirectories, it calls itself recursively.
-        """
-        directory_elements: List[str] = os.listdir(directory)
-        for dir_element in directory_elements:
-            element_path: str = os.path.join(directory, dir_element)
-            if os.path.isdir(element_path):
-                self.move_files_from_directory_tree_to_target(element_path)
-            elif os.path.isfile(element_path):
-                self.move_file_to_target(element_path)
-            else:
-                FileManager.logger.info(f'Encountered unsupported directory element {element_path}. '
-                                        f'Program supports only directories and files.')
+                    raise FileManager.Error(f'Source directory {d} does not exist')
 
-    def move_file_to_target(self, file_path: str) -> None:
-        if self.is_global_move or UserInputHandler.ask_if_move_file(file_path, self.target_dir):
-            try:
-                shutil.move(file_path, self.target_dir)
-            except shutil.Error:  # File path conflict
-                file_name: str = os.path.basename(file_path)
-                target_file_path: str = os.path.join(self.target_dir, file_name)
-                if self.is_global_move:
-                    if self.keep_latest_file:
-                        if os.path.getmtime(file_path) > os.path.getmtime(target_file_path):
-                            os.remove(target_file_path)
-                            shutil.move(file_path, target_file_path)
-                    else:
-                        if os.path.getmtime(file_path) < os.path.getmtime(target_file_path):
-                            os.remove(target_file_path)
-                            shutil.move(file_path, target_file_path)
-                else:
-                    if UserInputHandler.ask_if_keep_latest_file(target_file_path):
-                        if os.path.getmtime(file_path) > os.path.getmtime(target_file_path):
-                            os.remove(target_file_path)
-                            shutil.move(file_path, target_file_path)
-                    else:
-                        if os.path.getmtime(file_path) < os.path.getmtime(target_file_path):
-                            os.remove(target_file_path)
-                            shutil.move(file_path, target_file_path)
-
-    def remove_empty_files_from_target(self) -> None:
-        self.is_global_remove_empty = UserInputHandler.ask_if_remove_empty_files_from_target_globally(self.target_dir)
-        self.remove_empty_files_from_directory_tree(self.target_dir)
-
-    def remove_empty_files_from_directory_tree(self, directory: str) -> None:
-        """
-        Removes empty files from given directory.
-        If directory has subdirectories, it calls itself recursively.
-        """
-        directory_elements: List[str] = os.listdir(directory)
-        for dir_element in directory_elements:
-            element_path: str = os.path.join(directory, dir_element)
-            if os.path.isdir(element_path):
-                self.remove_empty_files_from_directory_tree(element_path)
-            elif os.path.isfile(element_path):
-                self.remove_empty_files_from_directory(element_path)
-            else:
-                FileManager.logger.info(f'Encountered unsupported directory element {element_path}. '
-                                        f'Program supports only directories and files.')
+    def move_files_from_sources_to_target(self) -> Iterator[Events.Event]:
+        self.is_global_move = self.decide_globally(DecisionRules.move, UserInputHandler.ask_if_perform_action_globally)
+        if self.is_global_move:
+            self.keep_latest_file = self.decide_globally(DecisionRules.keep_latest,
+                                                         UserInputHandler.ask_if_keep_latest_file_globally)
+        if self.is_ingest_dedup:
+            self.is_global_remove_existing = self.decide_globally(
+                DecisionRules.remove_dupl,
+                lambda: UserInputHandler.ask_if_remove_source_files_existing_in_target_globally(self.target_dir))
+        with self.metrics.phase('move'):
+            target_index: Dict[str, Optional[FileManager.TargetFile]] = self.build_target_index()
+            yield from self.move_files_from_directory_trees_to_target(self.src_dirs, target_index)
+            yield from self.move_winning_files_to_target(target_index)
 
-    def remove_empty_files_from_directory(self, file_path: str) -> None:
-        if os.path.getsize(file_path) == 0:
-            if self.is_global_remove_empty or UserInputHandler.ask_if_remove_empty_file(file_path):
+    def build_target_index(self) -> Dict[str, Optional[TargetFile]]:
+        """
+        Creates index of names in top level of target directory.
+        Names of elements which are not files (and cannot be replaced by moved files) are mapped to None.
+        """
+        target_index: Dict[str, Optional[FileManager.TargetFile]] = {}
+        with os.scandir(self.target_dir) as dir_iterator:
+            for entry in dir_iterator:
+                self.metrics.increment(Metrics.entries_scanned)
                 try:
-                    os.remove(file_path)
-                except Exception as e:
-                    FileManager.logger.error(f'Could not remove {file_path}. '
-                                             f'ERROR: {e}')
+                    if entry.is_file():
+                        file_status: os.stat_result = self.get_entry_status(entry)
+                        target_index[entry.name] = FileManager.TargetFile(mtime=file_status.st_mtime,
+                                                                          size=file_status.st_size,
+                                                                          inode=file_status.st_ino,
+                                                                          device=file_status.st_dev)
+                        continue
+                except OSError as e:
+                    self.logger.error(f'Could not access {entry.path}. {e}')
+                target_index[entry.name] = None
+        return target_index
 
-    def remove_temp_files_from_target(self) -> None:
-        self.is_global_remove_temp = UserInputHandler.ask_if_remove_temp_files_from_target_globally(self.target_dir)
-        self.remove_temp_files_from_directory_tree(self.target_dir)
+    def move_files_from_directory_trees_to_target(self, directories: List[str],
+                                                  target_index: Dict[str, Optional[TargetFile]]) \
+            -> Iterator[Events.Event]:
+        """
+        Decides which files from source directories and their subdirectories will be moved to target directory.
+        In case of file name collision (with file in target directory or with other source file)
+        only the latest or the oldest file wins. Winning files are marked in target index.
+        """
+        for entry in self.walk(*directories):
+            try:
+                file_status: os.stat_result = self.get_entry_status(entry)
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+                yield from self.pop_events()
+                continue
+            if self.is_global_move or \
+                    self.decide(DecisionRules.move, entry.path, file_status,
+                                lambda: UserInputHandler.ask_if_move_file(entry.path, self.target_dir)):
+                self.move_file_to_target(entry.path, file_status, target_index)
+            yield from self.pop_events()
 
-    def remove_temp_files_from_directory_tree(self, directory: str) -> None:
+    def move_file_to_target(self, file_path: str, file_status: os.stat_result,
+                            target_index: Dict[str, Optional[TargetFile]]) -> None:
+        file_name: str = os.path.basename(file_path)
+        source_file: FileManager.TargetFile = FileManager.TargetFile(mtime=file_status.st_mtime,
+                                                                     size=file_status.st_size,
+                                                                     inode=file_status.st_ino,
+                                                                     device=file_status.st_dev,
+                                                                     source_path=file_path)
+        if file_name not in target_index:
+            target_index[file_name] = source_file
+            return
+
+        target_file: Optional[FileManager.TargetFile] = target_index[file_name]
+        target_file_path: str = os.path.join(self.target_dir, file_name)
+        if target_file is None:
+            self.logger.error(f'Could not move {file_path}. {target_file_path} is not a file')
+            return
+        if target_file.source_path is None and \
+                (target_file.device, target_file.inode) == (file_status.st_dev, file_status.st_ino):
+            return  # File is already in target directory
+
+        keep_latest_file: Optional[bool] = self.keep_latest_file if self.is_global_move \
+            else self.decide(DecisionRules.keep_latest, file_path, file_status,
+                             lambda: UserInputHandler.ask_if_keep_latest_file(target_file_path))
+        if keep_latest_file is None:
+            return  # Collision is left for review
+        if keep_latest_file:
+            if source_file.mtime > target_file.mtime:
+                target_index[file_name] = source_file
+        else:
+            if source_file.mtime < target_file.mtime:
+                target_index[file_name] = source_file
+
+    def move_winning_files_to_target(self, target_index: Dict[str, Optional[TargetFile]]) \
+            -> Generator[Events.Event, None, List[str]]:
         """
-        Removes temporary files from given directory.
-        If directory has subdirectories, it calls itself recursively.
+        Moves files marked in target index to target directory, replacing files of the same names.
+        Returns destination paths of the moves.
         """
-        directory_elements: List[str] = os.listdir(directory)
-        for dir_element in directory_elements:
-            element_path: str = os.path.join(directory, dir_element)
-            if os.path.isdir(element_path):
-                self.remove_temp_files_from_directory_tree(element_path)
-            elif os.path.isfile(element_path):
-                self.remove_temp_files_from_directory(element_path)
-            else:
-                FileManager.logger.info(f'Encountered unsupported directory element {element_path}. '
-                                        f'Program supports only directories and files.')
+        if self.is_ingest_dedup:
+            yield from self.skip_files_existing_in_target(target_index)
+        moves: List[Tuple[str, int, str]] = [(target_file.source_path, target_file.device,
+                                              os.path.join(self.target_dir, file_name))
+                                             for file_name, target_file in target_index.items()
+                                             if target_file is not None and target_file.source_path is not None]
+        if self.journal is None:
+            yield from self.apply_moves(moves)
+            return [destination_path for _, _, destination_path in moves]
+        for source_path, source_device, destination_path in moves:
+            self.journal.add(ExecutionJournal.move, source_path, source_device, destination_path)
+            self.planned_moves[source_path] = destination_path
+            self.planned_paths[os.path.abspath(destination_path)] = True
+        return [destination_path for _, _, destination_path in moves]
+
+    def skip_files_existing_in_target(self, target_index: Dict[str, Optional[TargetFile]]) -> Iterator[Events.Event]:
+        """
+        Unmarks files marked in target index whose content already exists in target directory tree, so they are not
+        transferred. Such files are removed from source directories, and target index is restored for their names.
+        Files are compared only with files of target directory of the same sizes, in the same stages
+        as by duplicates removal; files replaced by moves are not taken into account.
+        """
+        source_files: Dict[str, Tuple[str, FileManager.TargetFile]] = {
+            target_file.source_path: (file_name, target_file) for file_name, target_file in target_index.items()
+            if target_file is not None and target_file.source_path is not None
+            and target_file.size > 0  # Empty files are handled by empty files removal
+        }
+        if not source_files:
+            return
+        replaced_files: Set[str] = {os.path.normpath(os.path.join(self.target_dir, file_name))
+                                    for file_name, _ in source_files.values()}
+        source_keys: Set[Tuple[int, int]] = {(source_file.device, source_file.inode)
+                                             for _, source_file in source_files.values()}
+        files_by_size: DefaultDict[int, List[str]] = self.get_target_files_by_size(
+            {source_file.size for _, source_file in source_files.values()}, replaced_files, source_keys)
+        if not files_by_size:
+            return
+        for source_path, (_, source_file) in source_files.items():
+            if source_file.size in files_by_size:
+                files_by_size[source_file.size].append(source_path)
 
-    def remove_temp_files_from_directory(self, file_path: str) -> None:
-        for extension in self.configurations[FileManager.tmp_file_extensions.name]:
-            if file_path.endswith(extension):
-                if self.is_global_remove_temp or UserInputHandler.ask_if_remove_temp_file(file_path):
+        for files in self.group_files_by_content(files_by_size,
+                                                 lambda group: not source_files.keys().isdisjoint(group)
+                                                 and not source_files.keys() >= set(group)):
+            target_file_path: str = next(file_path for file_path in files if file_path not in source_files)
+            for file_path in files:
+                if file_path not in source_files:
+                    continue
+                self.metrics.increment('files_existing_in_target')
+                self.logger.info(f'Not moving {file_path}. '
+                                 f'Its content already exists in target directory as {target_file_path}')
+                self.restore_target_index_entry(source_files[file_path][0], target_index)
+                if self.is_global_remove_existing or \
+                        self.decide(DecisionRules.remove_dupl, file_path, None,
+                                    lambda: UserInputHandler.ask_if_remove_source_file_existing_in_target(
+                                        file_path, target_file_path)):
                     try:
-                        os.remove(file_path)
+                        self.remove_file(file_path)
                     except Exception as e:
-                        FileManager.logger.error(f'Could not remove {file_path}. '
-                                                 f'ERROR: {e}')
+                        self.logger.error(f'Could not remove {file_path}. ERROR: {e}')
+                yield from self.pop_events()
 
-    def remove_duplicates_from_target(self) -> None:
-        self.is_global_remove_dupl = UserInputHandler.ask_if_remove_dupl_files_from_target_globally(self.target_dir)
-        self.is_sort_by_ctime = UserInputHandler.ask_if_sort_dupl_files_by_ctime()
-        self.remove_dupl_files_from_directory_tree(self.target_dir)
-
-    def remove_dupl_files_from_directory_tree(self, directory: str) -> None:
+    def get_target_files_by_size(self, sizes: Set[int], excluded_files: Set[str],
+                                 excluded_keys: Set[Tuple[int, int]]) -> DefaultDict[int, List[str]]:
         """
-        Removes duplicated files from directory tree by creating hashes from files and its sizes.
+        Returns files of given sizes from target directory tree grouped by their sizes. In watch mode files are taken
+        from index of target directory instead of scanning it. Files which are the same as excluded files
+        (e.g. reached through a link to source directory) are skipped.
         """
+        files_by_size: DefaultDict[int, List[str]] = defaultdict(list)
+        if self.is_target_indexed:
+            candidates: Iterable[Tuple[str, Optional[os.DirEntry]]] = \
+                ((file_path, None) for size in sizes for file_path in self.watched_files_by_size.get(size, ()))
+        else:
+            candidates = ((entry.path, entry) for entry in self.walk(self.target_dir))
+        for file_path, entry in candidates:
+            if os.path.normpath(file_path) in excluded_files:
+                continue
+            try:
+                file_status: os.stat_result = self.get_file_status(file_path) if entry is None \
+                    else self.get_entry_status(entry)
+            except OSError as e:
+                self.logger.error(f'Could not access {file_path}. {e}')
+                continue
+            if file_status.st_size in sizes and (file_status.st_dev, file_status.st_ino) not in excluded_keys:
+                files_by_size[file_status.st_size].append(file_path)
+        return files_by_size
 
-        def get_hash(file_full_path: str, first_chunk_only: bool = False, hash_algo: Callable = hashlib.sha1):
-            """Generates hash from file"""
+    def restore_target_index_entry(self, file_name: str, target_index: Dict[str, Optional[TargetFile]]) -> None:
+        """
+        Replaces file marked in target index to be moved with file of the same name in target directory.
+        """
+        target_file_path: str = os.path.join(self.target_dir, file_name)
+        try:
+            file_status: os.stat_result = self.get_file_status(target_file_path)
+        except FileNotFoundError:
+            del target_index[file_name]
+            return
+        except OSError as e:
+            self.logger.error(f'Could not access {target_file_path}. {e}')
+            target_index[file_name] = None
+            return
+        target_index[file_name] = FileManager.TargetFile(mtime=file_status.st_mtime, size=file_status.st_size,
+                                                         inode=file_status.st_ino, device=file_status.st_dev)
 
-            def chunk_reader(file_obj: BinaryIO, chunk_size: int = 1024):
-                """Generator that reads a file in chunks of bytes"""
-                while True:
-                    chunk = file_obj.read(chunk_size)
-                    if not chunk:
-                        return
-                    yield chunk
+    def remove_empty_files_from_target(self) -> Iterator[Events.Event]:
+        self.ask_if_remove_empty_files_globally()
+        with self.metrics.phase('empty'):
+            yield from self.remove_empty_files_from_directory_tree(self.target_dir)
 
-            hash_obj = hash_algo()
-            with open(file_full_path, 'rb') as file:
-                if first_chunk_only:
-                    hash_obj.update(file.read(1024))
-                else:
-                    for file_chunk in chunk_reader(file):
-                        hash_obj.update(file_chunk)
-            return hash_obj.digest()
+    def remove_empty_files_from_directory_tree(self, directory: str) -> Iterator[Events.Event]:
+        """
+        Removes empty files from given directory and its subdirectories.
+        """
+        for entry in self.walk(directory):
+            try:
+                file_size: int = self.get_entry_status(entry).st_size
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+                yield from self.pop_events()
+                continue
+            self.remove_empty_files_from_directory(entry.path, file_size)
+            yield from self.pop_events()
 
-        def sort_files_by_modification_date(file_full_path: str):
-            return os.path.getmtime(file_full_path)
+    def remove_empty_files_from_directory(self, file_path: str, file_size: Optional[int] = None) -> bool:
+        """
+        Removes file if it is empty. Returns True if file was removed.
+        """
+        if file_size is None:
+            file_size = self.get_file_status(file_path).st_size
+        elif file_size == 0 and self.snapshot is not None:
+            try:
+                file_size = self.get_current_status(file_path).st_size
+            except OSError as e:
+                self.logger.error(f'Could not access {file_path}. {e}')
+                return False
+        if file_size == 0:
+            if self.is_global_remove_empty or \
+                    self.decide(DecisionRules.remove_empty, file_path, None,
+                                lambda: UserInputHandler.ask_if_remove_empty_file(file_path)):
+                try:
+                    self.remove_file(file_path)
+                    return True
+                except Exception as e:
+                    self.logger.error(f'Could not remove {file_path}. '
+                                      f'ERROR: {e}')
+        return False
 
-        def sort_files_by_creation_date(file_full_path: str):
-            return os.path.getctime(file_full_path)
+    def remove_temp_files_from_target(self) -> Iterator[Events.Event]:
+        self.ask_if_remove_temp_files_globally()
+        with self.metrics.phase('temp'):
+            yield from self.remove_temp_files_from_directory_tree(self.target_dir)
 
-        files_by_size: DefaultDict[int, list] = defaultdict(list)
-        files_by_small_hash: DefaultDict[Tuple, list] = defaultdict(list)
-        files_by_full_hash: DefaultDict = defaultdict(list)
+    def remove_temp_files_from_directory_tree(self, directory: str) -> Iterator[Events.Event]:
+        """
+        Removes temporary files from given directory and its subdirectories.
+        """
+        for entry in self.walk(directory):
+            self.remove_temp_files_from_directory(entry.path, lambda: self.get_entry_status(entry))
+            yield from self.pop_events()
 
-        for dir_path, _, file_names in os.walk(directory):
-            for file_name in file_names:
-                file_path: str = os.path.join(dir_path, file_name)
+    def remove_temp_files_from_directory(self, file_path: str,
+                                         get_status: Optional[Callable[[], os.stat_result]] = None) -> bool:
+        """
+        Removes file if it is a temporary file. Returns True if file was removed.
+        Stat information is taken (with get_status if given) only for temporary file patterns with size or age.
+        """
+        if self.matchers.is_tmp_file(file_path,
+                                     lambda: self.get_current_status(file_path,
+                                                                     None if get_status is None else get_status())):
+            if self.is_global_remove_temp or \
+                    self.decide(DecisionRules.remove_temp, file_path, None,
+                                lambda: UserInputHandler.ask_if_remove_temp_file(file_path)):
                 try:
-                    full_path: str = os.path.realpath(file_path)  # Dereferencing symlink
-                    file_size: int = os.path.getsize(full_path)
-                except OSError as e:
-                    FileManager.logger.error(f'Could not access {file_path}. {e}')
-                    continue
-                files_by_size[file_size].append(full_path)
+                    self.remove_file(file_path)
+                    return True
+                except Exception as e:
+                    self.logger.error(f'Could not remove {file_path}. '
+                                      f'ERROR: {e}')
+        return False
 
-        # For all files with the same file size, get their hash on the first 1024 bytes
-        for file_size, files in files_by_size.items():
-            if len(files) < 2:
-                continue  # This file size is unique
+    def remove_duplicates_from_target(self) -> Iterator[Events.Event]:
+        self.ask_if_remove_dupl_files_globally()
+        with self.metrics.phase('dedup'):
+            yield from self.remove_dupl_files_from_directory_tree(self.target_dir)
 
-            for file_path in files:
+    def remove_dupl_files_from_directory_tree(self, directory: str) -> Iterator[Events.Event]:
+        """
+        Removes duplicated files from directory tree by creating hashes from files and its sizes.
+        """
+        inventory: FileInventory = FileInventory(self.configurations[FileManager.dedup_memory_budget.name])
+        try:
+            for entry in self.walk(directory):
                 try:
-                    small_hash = get_hash(file_path, first_chunk_only=True)
+                    full_path: str = DirectoryWalker.get_real_path(entry)  # Dereferencing symlink
+                    file_status: os.stat_result = self.get_entry_status(entry)
                 except OSError as e:
-                    FileManager.logger.error(f'Could not access {file_path}. '
-                                             f'File permissions might have changed during program execution. {e}')
+                    self.logger.error(f'Could not access {entry.path}. {e}')
+                    yield from self.pop_events()
                     continue
-                files_by_small_hash[(file_size, small_hash)].append(file_path)
+                inventory.add(full_path, file_status)
 
-        #  For all files with the same hash on the first 1024 bytes, get their hash on the full file
-        for files in files_by_small_hash.values():
-            if len(files) < 2:
-                continue  # Small hash is unique
+            yield from self.remove_dupl_files_from_inventory(inventory)
+            self.prune_hash_cache(inventory.iterate_keys())
+        finally:
+            inventory.close()
+
+    def remove_dupl_files_from_inventory(self, inventory: FileInventory) -> Generator[Events.Event, None, Set[str]]:
+        """
+        Removes duplicated files from inventory, processing files of the same size in batches.
+        Returns paths of removed files.
+        """
+        removed_files: Set[str] = set()
+        for files_by_size in inventory.iterate_size_group_batches():
+            removed_files.update((yield from self.remove_dupl_files(files_by_size)))
+        return removed_files
 
+    def remove_dupl_files(self, files_by_size: Dict[int, List[str]]) -> Generator[Events.Event, None, Set[str]]:
+        """
+        Removes duplicated files from files grouped by their sizes. Returns paths of removed files.
+        """
+
+        removed_files: Set[str] = set()
+        file_sizes: Dict[str, int] = {file_path: file_size for file_size, files in files_by_size.items()
+                                      for file_path in files}
+
+        # Go over duplicates and leave the oldest one
+        for files in self.group_files_by_content(files_by_size):
+            file_statuses: Dict[str, os.stat_result] = {}
             for file_path in files:
                 try:
-                    full_hash = get_hash(file_path, first_chunk_only=False)
+                    file_statuses[file_path] = self.get_file_status(file_path)
                 except OSError as e:
-                    FileManager.logger.error(f'Could not access {file_path}. '
-                                             f'File permissions might have changed during program execution. {e}')
-                    continue
-                files_by_full_hash[full_hash].append(file_path)
-
-        # Go over duplicates and leave the oldest one
-        for files in files_by_full_hash.values():
+                    self.logger.error(f'Could not access {file_path}. {e}')
+            # Content of file whose size has changed since it was listed (e.g. in snapshot) was not compared in full;
+            # saved listing of its directory is stale, so it is forgotten
+            changed_files: Set[str] = {file_path for file_path, file_status in file_statuses.items()
+                                       if file_status.st_size != file_sizes[file_path]}
+            if self.snapshot is not None:
+                for file_path in changed_files:
+                    self.snapshot.forget_dir(os.path.dirname(file_path))
+            files = [file_path for file_path in files if file_path in file_statuses and file_path not in changed_files]
+            if len(files) < 2:
+                yield from self.pop_events()
+                continue
             # Sort duplicates
             if self.is_sort_by_ctime:
-                files.sort(key=sort_files_by_creation_date)
+                files.sort(key=lambda file_path: file_statuses[file_path].st_ctime)
             else:
-                files.sort(key=sort_files_by_modification_date)
+                files.sort(key=lambda file_path: file_statuses[file_path].st_mtime)
 
             for file_path in files[1:]:  # Removing duplicated files; the oldest file is left
-                if self.is_global_remove_dupl or UserInputHandler.ask_if_remove_dupl_file(file_path):
+                if self.is_global_remove_dupl or \
+                        self.decide(DecisionRules.remove_dupl, file_path, None,
+                                    lambda: UserInputHandler.ask_if_remove_dupl_file(file_path)):
                     try:
-                        os.remove(file_path)
+                        self.remove_file(file_path)
+                        removed_files.add(file_path)
                     except Exception as e:
-                        FileManager.logger.error(f'Could not remove {file_path}\n'
-                                                 f'ERROR: {e}')
-
-    def unify_files_permissions(self) -> None:
-        self.is_global_file_permissions_unification = \
-            UserInputHandler.ask_if_unify_files_perm_globally(self.target_dir,
-                                                              self.configurations[
-                                                                  FileManager.default_file_permissions.name],
-                                                              self.configurations[
-                                                                  FileManager.unusual_file_permissions.name])
-        self.unify_files_permissions_in_directory_tree(self.target_dir)
-
-    def unify_files_permissions_in_directory_tree(self, directory: str) -> None:
-        directory_elements: List[str] = os.listdir(directory)
-        for dir_element in directory_elements:
-            element_path: str = os.path.join(directory, dir_element)
-            if os.path.isdir(element_path):
-                self.unify_files_permissions_in_directory_tree(element_path)
-            elif os.path.isfile(element_path):
-                self.unify_file_permissions(element_path)
+                        self.logger.error(f'Could not remove {file_path}\n'
+                                          f'ERROR: {e}')
+                yield from self.pop_events()
+        return removed_files
+
+    def group_files_by_content(self, files_by_size: Dict[int, List[str]],
+                               is_candidate_group: Callable[[List[str]], bool] = lambda files: len(files) > 1) \
+            -> List[List[str]]:
+        """
+        Groups files of the same sizes by their content, reading as little of them as possible: files are compared
+        by hash of their first 1024 bytes, then by hash of sampled blocks, and then byte by byte or by hash
+        of the full file. Only groups accepted by is_candidate_group are passed to the next stage and returned.
+        """
+        files_by_small_hash: DefaultDict[Tuple, list] = defaultdict(list)
+        files_by_sample_hash: DefaultDict[Tuple, list] = defaultdict(list)
+        files_by_full_hash: DefaultDict = defaultdict(list)
+
+        # For all files with the same file size, get their hash on the first 1024 bytes
+        small_hash_candidates: List[Tuple[str, int, Tuple]] = [(file_path, file_size, (file_size,))
+                                                               for file_size, files in files_by_size.items()
+                                                               if is_candidate_group(files)
+                                                               for file_path in files]
+        for file_path, group_key, small_hash in self.get_hashes(small_hash_candidates, HashingEngine.small_hash):
+            files_by_small_hash[(*group_key, small_hash)].append(file_path)
+
+        # For all files with the same hash on the first 1024 bytes, get their hash on sampled blocks of the file
+        sample_hash_candidates: List[Tuple[str, int, Tuple]] = []
+        for group_key, files in files_by_small_hash.items():
+            file_size: int = group_key[0]
+            if not is_candidate_group(files):
+                continue  # Small hash is unique
+            if file_size <= HashingEngine.small_hash_size:
+                files_by_full_hash[group_key] = files  # Small hash covers the whole file
+            elif self.hashing_engine.is_sampling_useful(file_size):
+                sample_hash_candidates.extend((file_path, file_size, group_key) for file_path in files)
+            else:
+                files_by_sample_hash[group_key] = files
+        for file_path, group_key, sample_hash in self.get_hashes(sample_hash_candidates, HashingEngine.sample_hash):
+            files_by_sample_hash[(*group_key, sample_hash)].append(file_path)
+
+        # For all files with the same sampled blocks, compare small groups byte by byte and get hash on the full file
+        # for the rest; byte comparison is not used with hash cache, because cached full hashes do not require reading
+        full_hash_candidates: List[Tuple[str, int, Tuple]] = []
+        for group_key, files in files_by_sample_hash.items():
+            file_size: int = group_key[0]
+            if not is_candidate_group(files):
+                continue  # Sample hash is unique
+            if self.hash_cache is None and \
+                    len(files) <= self.configurations[FileManager.dedup_byte_compare_max_group.name]:
+                self.metrics.increment('files_byte_compared', len(files))
+                identical_files, errors = self.hashing_engine.group_identical_files(files)
+                for file_path, error in errors:
+                    self.logger.error(f'Could not access {file_path}. '
+                                      f'File permissions might have changed during program execution. '
+                                      f'{error}')
+                for group_index, group in enumerate(identical_files):
+                    files_by_full_hash[(*group_key, group_index)] = group
             else:
-                FileManager.logger.info(f'Encountered unsupported directory element {element_path}. '
-                                        f'Program supports only directories and files.')
-
-    def unify_file_permissions(self, file_path: str) -> None:
-        file_status = os.stat(file_path)
-        file_permissions: oct = oct(file_status.st_mode & 0o777)
-        for unusual_perm in self.configurations[FileManager.unusual_file_permissions.name]:
-            if oct(int(unusual_perm, 8)) == file_permissions:
-                if self.is_global_file_permissions_unification or \
-                        UserInputHandler.ask_if_unify_file_perm(file_path, file_permissions,
-                                                                self.configurations[
-                                                                    FileManager.default_file_permissions.name]):
-                    os.chmod(file_path, int(self.configurations[FileManager.default_file_permissions.name], 8))
-                    break
-
-    def replace_bad_chars_in_file_names(self) -> None:
-        self.is_global_file_names_change = \
-            UserInputHandler.ask_if_change_file_names_globally(self.target_dir,
-                                                               self.configurations[FileManager.unwanted_chars.name],
-                                                               self.configurations[FileManager.substitute_char.name])
-        self.is_global_override_files = UserInputHandler.ask_if_change_file_names_override_globally()
-        self.replace_bad_chars_in_file_names_in_directory_tree(self.target_dir)
-
-    def replace_bad_chars_in_file_names_in_directory_tree(self, directory: str) -> None:
-        bad_chars: List[str] = self.configurations[FileManager.unwanted_chars.name]
-        sub_char: str = self.configurations[FileManager.substitute_char.name]
-        for dir_path, _, file_names in os.walk(directory):
-            for file_name in file_names:
-                if any(char in file_name for char in bad_chars):
-                    if self.is_global_file_names_change or \
-                            UserInputHandler.ask_if_change_file_name(os.path.join(dir_path, file_name)):
-                        old_file_path: str = os.path.join(dir_path, file_name)
-                        new_file_name: str = ''.join(char if char not in bad_chars else sub_char for char in file_name)
-                        new_file_path: str = os.path.join(dir_path, new_file_name)
-                        if os.path.isfile(new_file_path):  # Such file already exists
-                            if self.is_global_override_files or \
-                                    UserInputHandler.ask_if_override_file_name(old_file_path, new_file_path):
-                                try:
-                                    os.remove(new_file_path)  # First remove file to be overwritten
-                                except Exception as e:
-                                    FileManager.logger.error(f'Could not remove file to be overwritten. ERROR: {e}')
-                                    continue
-                            else:
-                                continue  # Do not change file name
-                        try:
-                            os.rename(old_file_path, new_file_path)
-                        except Exception as e:
-                            FileManager.logger.error(f'Could not rename file: {old_file_path}. ERROR: {e}')
-                            continue
-
-    def run(self) -> None:
+                full_hash_candidates.extend((file_path, file_size, ()) for file_path in files)
+        for file_path, _, full_hash in self.get_hashes(full_hash_candidates, HashingEngine.full_hash):
+            files_by_full_hash[full_hash].append(file_path)
+
+        return [files for files in files_by_full_hash.values() if is_candidate_group(files)]
+
+    def get_hashes(self, files: List[Tuple[str, int, Tuple]], stage: str) -> Iterator[Tuple[str, Tuple, bytes]]:
+        """
+        Yields (file path, group key, hash) for given (file path, file size, group key) in the same order.
+        Hashes are taken from hash cache when files have not changed since they were hashed.
+        """
+        self.metrics.increment(f'files_{stage}_hash', len(files))
+        hashes: List[Optional[bytes]] = [None] * len(files)
+        files_to_hash: List[Tuple[int, Optional[os.stat_result]]] = []
+        for index, (file_path, _, _) in enumerate(files):
+            if self.hash_cache is None:
+                files_to_hash.append((index, None))
+                continue
+            try:
+                file_status: os.stat_result = self.get_file_status(file_path)
+            except OSError as e:
+                self.logger.error(f'Could not access {file_path}. '
+                                  f'File permissions might have changed during program execution. {e}')
+                continue
+            hashes[index] = self.hash_cache.get(file_status, stage)
+            if hashes[index] is None:
+                files_to_hash.append((index, file_status))
+            else:
+                self.metrics.increment(Metrics.hash_cache_hits)
+
+        hashed_files = self.hashing_engine.hash_files((files[index][:2] for index, _ in files_to_hash), stage)
+        for (index, file_status), (file_path, digest, error) in zip(files_to_hash, hashed_files):
+            if error is not None:
+                self.logger.error(f'Could not access {file_path}. '
+                                  f'File permissions might have changed during program execution. '
+                                  f'{error}')
+                continue
+            hashes[index] = digest
+            self.metrics.increment(Metrics.bytes_hashed, self.hashing_engine.get_read_size(files[index][1], stage))
+            if self.hash_cache is not None:
+                self.hash_cache.put(file_status, stage, digest)
+
+        for (file_path, _, group_key), digest in zip(files, hashes):
+            if digest is not None:
+                yield file_path, group_key, digest
+
+    def prune_hash_cache(self, seen_keys: Iterable[Tuple[int, int]]) -> None:
+        if self.hash_cache is not None:
+            pruned_entries: int = self.hash_cache.prune(seen_keys)
+            self.logger.info(f'Removed {pruned_entries} stale entries from hash cache')
+
+    def unify_files_permissions(self) -> Iterator[Events.Event]:
+        self.ask_if_unify_files_permissions_globally()
+        with self.metrics.phase('permissions'):
+            yield from self.unify_files_permissions_in_directory_tree(self.target_dir)
+
+    def unify_files_permissions_in_directory_tree(self, directory: str) -> Iterator[Events.Event]:
+        for entry in self.walk(directory):
+            try:
+                file_status: os.stat_result = self.get_entry_status(entry)
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+                yield from self.pop_events()
+                continue
+            self.unify_file_permissions(entry.path, file_status)
+            yield from self.pop_events()
+
+    def unify_file_permissions(self, file_path: str, file_status: Optional[os.stat_result] = None) -> None:
+        if file_status is None:
+            file_status = self.get_file_status(file_path)
+        if self.matchers.is_unusual_mode(file_status.st_mode) and self.snapshot is not None:
+            try:
+                file_status = self.get_current_status(file_path, file_status)
+            except OSError as e:
+                self.logger.error(f'Could not access {file_path}. {e}')
+                return
+        if self.matchers.is_unusual_mode(file_status.st_mode):
+            if self.is_global_file_permissions_unification or \
+                    self.decide(DecisionRules.unify_perm, file_path, file_status,
+                                lambda: UserInputHandler.ask_if_unify_file_perm(
+                                    file_path, oct(file_status.st_mode & 0o777),
+                                    self.configurations[FileManager.default_file_permissions.name])):
+                self.change_file_mode(file_path, self.matchers.default_mode)
+
+    def replace_bad_chars_in_file_names(self) -> Iterator[Events.Event]:
+        self.ask_if_change_file_names_globally()
+        with self.metrics.phase('rename'):
+            yield from self.replace_bad_chars_in_file_names_in_directory_tree(self.target_dir)
+
+    def replace_bad_chars_in_file_names_in_directory_tree(self, directory: str) -> Iterator[Events.Event]:
+        for entry in self.walk(directory):
+            self.replace_bad_chars_in_file_name(DirectoryWalker.get_dir_path(entry), entry.name)
+            yield from self.pop_events()
+
+    def replace_bad_chars_in_file_name(self, dir_path: str, file_name: str) -> Optional[str]:
+        """
+        Replaces unwanted characters in file name. Returns new file path if file was renamed.
+        """
+        new_file_name: Optional[str] = self.matchers.get_new_file_name(file_name)
+        if new_file_name is not None:
+            old_file_path: str = os.path.join(dir_path, file_name)
+            if self.is_global_file_names_change or \
+                    self.decide(DecisionRules.change_name, old_file_path, None,
+                                lambda: UserInputHandler.ask_if_change_file_name(old_file_path)):
+                new_file_path: str = os.path.join(dir_path, new_file_name)
+                if self.is_file(new_file_path):  # Such file already exists
+                    if not (self.is_global_override_files or
+                            self.decide(DecisionRules.override_file, old_file_path, None,
+                                        lambda: UserInputHandler.ask_if_override_file_name(old_file_path,
+                                                                                           new_file_path))):
+                        return None  # Do not change file name
+                try:  # Existing file is atomically overwritten
+                    self.rename_file(old_file_path, new_file_path)
+                    return new_file_path
+                except Exception as e:
+                    self.logger.error(f'Could not rename file: {old_file_path}. ERROR: {e}')
+        return None
+
+    def run_fused(self) -> Iterator[Events.Event]:
+        """
+        Performs all target directory actions in a single traversal of the target directory tree.
+        Empty and temporary files are removed while walking, sizes of the remaining files are collected
+        for duplicates removal, and permissions and file names are changed afterwards on the files that are left,
+        so the result is the same as running the actions one after another. Until duplicates are removed,
+        only files whose permissions or names will be changed are kept besides the inventory.
+        """
+        self.ask_if_remove_empty_files_globally()
+        self.ask_if_remove_temp_files_globally()
+        self.ask_if_remove_dupl_files_globally()
+        self.ask_if_unify_files_permissions_globally()
+        self.ask_if_change_file_names_globally()
+
+        with self.metrics.phase('fused'):
+            inventory: FileInventory = FileInventory(self.configurations[FileManager.dedup_memory_budget.name])
+            remaining_files: List[FileManager.RemainingFile] = []
+            try:
+                yield from self.process_directory_tree_fused(self.target_dir, inventory, remaining_files)
+                yield from self.process_planned_moves_fused(inventory, remaining_files)
+
+                with self.metrics.phase('dedup'):
+                    removed_files: Set[str] = yield from self.remove_dupl_files_from_inventory(inventory)
+                    self.prune_hash_cache(inventory.iterate_keys())
+            finally:
+                inventory.close()
+
+            for file_path, full_path, file_status in remaining_files:
+                if full_path in removed_files:
+                    continue
+                if file_status is not None:
+                    self.unify_file_permissions(file_path, file_status)
+                self.replace_bad_chars_in_file_name(*os.path.split(file_path))
+                yield from self.pop_events()
+
+    def process_directory_tree_fused(self, directory: str, inventory: FileInventory,
+                                     remaining_files: List['FileManager.RemainingFile']) -> Iterator[Events.Event]:
+        """
+        Removes empty and temporary files from given directory and its subdirectories and collects the remaining files.
+        """
+        replaced_files: Set[str] = set(self.planned_moves.values())
+        for entry in self.walk(directory):
+            if entry.path in replaced_files:
+                continue  # File will be replaced by recorded move
+            try:
+                file_status: os.stat_result = self.get_entry_status(entry)
+                full_path: str = DirectoryWalker.get_real_path(entry)  # Dereferencing symlink
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+                yield from self.pop_events()
+                continue
+            self.process_file_fused(entry.path, full_path, file_status, inventory, remaining_files)
+            yield from self.pop_events()
+
+    def process_planned_moves_fused(self, inventory: FileInventory,
+                                    remaining_files: List['FileManager.RemainingFile']) -> Iterator[Events.Event]:
+        """
+        Collects files which will be moved to target directory by recorded moves.
+        Their content is read from source paths, and operations on them are recorded for destination paths.
+        """
+        for source_path, destination_path in self.planned_moves.items():
+            try:
+                file_status: os.stat_result = self.get_file_status(source_path)
+            except OSError as e:
+                self.logger.error(f'Could not access {source_path}. {e}')
+                yield from self.pop_events()
+                continue
+            self.process_file_fused(destination_path, source_path, file_status, inventory, remaining_files)
+            yield from self.pop_events()
+
+    def process_file_fused(self, file_path: str, full_path: str, file_status: os.stat_result,
+                           inventory: FileInventory, remaining_files: List['FileManager.RemainingFile']) -> None:
+        if self.remove_empty_files_from_directory(file_path, file_status.st_size):
+            return
+        if self.remove_temp_files_from_directory(file_path, lambda: file_status):
+            return
+        inventory.add(full_path, file_status)  # The same file reached through a link is listed once by inventory
+        # Stat information is kept only for files with unusual permissions, which are going to be changed
+        is_unusual_mode: bool = self.matchers.is_unusual_mode(file_status.st_mode)
+        if is_unusual_mode or self.matchers.get_new_file_name(os.path.basename(file_path)) is not None:
+            remaining_files.append((file_path, full_path, file_status if is_unusual_mode else None))
+
+    def ask_if_remove_empty_files_globally(self) -> None:
+        self.is_global_remove_empty = self.decide_globally(
+            DecisionRules.remove_empty,
+            lambda: UserInputHandler.ask_if_remove_empty_files_from_target_globally(self.target_dir))
+
+    def ask_if_remove_temp_files_globally(self) -> None:
+        self.is_global_remove_temp = self.decide_globally(
+            DecisionRules.remove_temp,
+            lambda: UserInputHandler.ask_if_remove_temp_files_from_target_globally(self.target_dir))
+
+    def ask_if_remove_dupl_files_globally(self) -> None:
+        self.is_global_remove_dupl = self.decide_globally(
+            DecisionRules.remove_dupl,
+            lambda: UserInputHandler.ask_if_remove_dupl_files_from_target_globally(self.target_dir))
+        self.is_sort_by_ctime = self.decide_globally(DecisionRules.sort_by_ctime,
+                                                     UserInputHandler.ask_if_sort_dupl_files_by_ctime)
+
+    def ask_if_unify_files_permissions_globally(self) -> None:
+        self.is_global_file_permissions_unification = self.decide_globally(
+            DecisionRules.unify_perm,
+            lambda: UserInputHandler.ask_if_unify_files_perm_globally(
+                self.target_dir,
+                self.configurations[FileManager.default_file_permissions.name],
+                self.configurations[FileManager.unusual_file_permissions.name]))
+
+    def ask_if_change_file_names_globally(self) -> None:
+        self.is_global_file_names_change = self.decide_globally(
+            DecisionRules.change_name,
+            lambda: UserInputHandler.ask_if_change_file_names_globally(
+                self.target_dir,
+                self.configurations[FileManager.unwanted_chars.name],
+                self.configurations[FileManager.substitute_char.name]))
+        self.is_global_override_files = self.decide_globally(
+            DecisionRules.override_file, UserInputHandler.ask_if_change_file_names_override_globally)
+
+    def decide_globally(self, decision: str, ask: Callable[[], bool]) -> bool:
+        """
+        Answers global question using rules file or by asking user if rules do not answer it.
+        """
+        answer: Optional[bool] = None if self.rules is None else self.rules.get_global_answer(decision)
+        if answer is None:
+            self.flush_log()
+            return ask()
+        return answer
+
+    def decide(self, decision: str, file_path: str, file_status: Optional[os.stat_result],
+               ask: Callable[[], bool]) -> Optional[bool]:
+        """
+        Answers question about single file using rules, answers from review file or by asking user, in this order.
+        Returns None if question was queued for review.
+        """
+        if self.rules is not None:
+            answer: Optional[bool] = self.rules.decide(decision, file_path, file_status, self.get_file_status)
+            if answer is not None:
+                return answer
+        if self.review is not None:
+            return self.review.get_answer(decision, file_path)
+        self.flush_log()
+        return ask()
+
+    def flush_log(self) -> None:
+        """
+        Writes messages waiting in asynchronous log handlers (of engine logger and loggers it propagates to),
+        so they are shown before user is asked a question.
+        """
+        logger: Optional[logging.Logger] = self.logger
+        while logger is not None:
+            for handler in logger.handlers:
+                handler.flush()
+            logger = logger.parent if logger.propagate else None
+
+    def write_metrics(self) -> None:
         try:
-            print(f'Moving files from source directories {" ,".join(self.src_dirs)} '
-                  f'to target directory {self.target_dir}')
-            self.move_files_from_sources_to_target()
-            print(f'Removing empty files from target directory {self.target_dir} and its subdirectories')
-            self.remove_empty_files_from_target()
-            print(f'Removing temporary files from target directory {self.target_dir} and its subdirectories')
-            self.remove_temp_files_from_target()
-            print(f'Removing duplicated files from target directory {self.target_dir} and its subdirectories')
-            self.remove_duplicates_from_target()
-            print(f'Unifying files permissions in target directory {self.target_dir} and its subdirectories')
-            self.unify_files_permissions()
-            print(f'Changing bad characters ({self.configurations[FileManager.unwanted_chars.name]}) '
-                  f'to substitute character {self.configurations[FileManager.substitute_char.name]} in all files of '
-                  f'{self.target_dir} and its subdirectories')
-            self.replace_bad_chars_in_file_names()
-        except KeyboardInterrupt:
-            print('Program closed')
-            exit(0)
+            if self.options.metrics is not None:
+                self.metrics.write_json(self.options.metrics)
+            if self.options.metrics_prometheus is not None:
+                self.metrics.write_prometheus(self.options.metrics_prometheus)
+        except OSError as e:
+            self.logger.error(f'Could not write metrics. {e}')
+
+    def walk(self, *directories: str) -> Iterator[os.DirEntry]:
+        """
+        Yields files from given directories and their subdirectories. When snapshot is used or shard_processes is set,
+        yielded entries only mimic os.DirEntry; snapshot takes precedence over scanning in worker processes.
+        """
+        if self.snapshot is not None:
+            entries: Iterable[os.DirEntry] = (entry for directory in directories
+                                              for entry in self.snapshot.walk(directory))
+        elif self.scanner is not None:
+            entries = self.scanner.scan(directories)
+        else:
+            entries = (entry for directory in directories for entry in self.walker.walk(directory))
+        for entry in entries:
+            self.metrics.increment(Metrics.entries_scanned)
+            yield entry
+
+    def get_entry_status(self, entry: os.DirEntry) -> os.stat_result:
+        if isinstance(entry, DirectoryWalker.Entry):
+            if entry.status is None and entry.error is None:  # Stat information is usually known already
+                self.metrics.increment(Metrics.stat_calls)
+                self.throttle_metadata()
+            return entry.stat()
+        self.metrics.increment(Metrics.stat_calls)
+        self.throttle_metadata()
+        return self.dir_handles.stat(entry.path)
+
+    def get_file_status(self, file_path: str, follow_symlinks: bool = True) -> os.stat_result:
+        self.metrics.increment(Metrics.stat_calls)
+        self.throttle_metadata()
+        return self.dir_handles.stat(file_path, follow_symlinks=follow_symlinks)
+
+    def get_current_status(self, file_path: str, file_status: Optional[os.stat_result] = None) -> os.stat_result:
+        """
+        Returns stat information of file which is going to be removed or changed. Information saved in snapshot
+        can be stale, because writing to a file or changing its mode does not modify its directory, so it is taken
+        again (except for files planned by journal, whose information is current), and listing of directory
+        of changed file is forgotten. Only files which saved information marks for removal or change are checked;
+        a file which became empty or got unusual permissions after it was listed is left until its directory
+        changes or snapshot is rebuilt, since checking every file would take the stat calls snapshot saves.
+        """
+        if file_status is not None and (self.snapshot is None or os.path.abspath(file_path) in self.planned_paths):
+            return file_status
+        current_status: os.stat_result = self.get_file_status(file_path)
+        if self.snapshot is not None and file_status is not None and \
+                (current_status.st_size, current_status.st_mode, current_status.st_mtime_ns,
+                 current_status.st_ctime_ns) != (file_status.st_size, file_status.st_mode, file_status.st_mtime_ns,
+                                                 file_status.st_ctime_ns):
+            self.snapshot.forget_dir(os.path.dirname(file_path))
+        return current_status
+
+    def throttle_metadata(self) -> None:
+        if self.metadata_throttle is not None:
+            self.metadata_throttle.acquire()
+
+    def remove_file(self, file_path: str) -> None:
+        if self.journal is None:
+            self.throttle_metadata()
+            self.dir_handles.remove(file_path)
+            self.metrics.increment(Metrics.files_removed)
+            self.forget_snapshot_dirs(file_path)
+            self.events.append(Events.Removed(file_path))
+            return
+        file_path = self.planned_moves.get(file_path, file_path)  # File read from source of recorded move
+        self.journal.add(ExecutionJournal.remove, file_path)
+        self.planned_paths[os.path.abspath(file_path)] = False
+
+    def change_file_mode(self, file_path: str, mode: int) -> None:
+        if self.journal is None:
+            self.throttle_metadata()
+            self.dir_handles.chmod(file_path, mode)
+            self.metrics.increment(Metrics.permissions_changed)
+            self.forget_snapshot_dirs(file_path)
+            self.events.append(Events.Chmodded(file_path, mode))
+            return
+        self.journal.add(ExecutionJournal.chmod, file_path, mode)
+
+    def rename_file(self, old_file_path: str, new_file_path: str) -> None:
+        if self.journal is None:
+            self.throttle_metadata()
+            self.dir_handles.replace(old_file_path, new_file_path)
+            self.metrics.increment(Metrics.files_renamed)
+            self.forget_snapshot_dirs(old_file_path, new_file_path)
+            self.events.append(Events.Renamed(old_file_path, new_file_path))
+            return
+        self.journal.add(ExecutionJournal.rename, old_file_path, new_file_path)
+        self.planned_paths[os.path.abspath(old_file_path)] = False
+        self.planned_paths[os.path.abspath(new_file_path)] = True
+
+    def forget_snapshot_dirs(self, *file_paths: str) -> None:
+        """
+        Makes snapshot list directories of changed files again, since not all changes of files modify directories.
+        """
+        if self.snapshot is not None:
+            for file_path in file_paths:
+                self.snapshot.forget_dir(os.path.dirname(file_path))
+
+    def is_file(self, file_path: str) -> bool:
+        """
+        Checks if file exists, taking into account operations recorded in journal.
+        """
+        if self.journal is not None and os.path.abspath(file_path) in self.planned_paths:
+            return self.planned_paths[os.path.abspath(file_path)]
+        return self.dir_handles.is_file(file_path)
+
+    def execute_journal(self) -> Iterator[Events.Event]:
+        with self.metrics.phase('journal'):
+            for operations in self.journal.execute(self.configurations[FileManager.journal_batch_size.name]):
+                yield from self.apply_operations(operations)
+
+    def apply_operations(self, operations: List[list]) -> Iterator[Events.Event]:
+        """
+        Applies batch of operations recorded in journal. Consecutive moves are performed by move engine.
+        Operations on files which do not exist anymore are skipped, since they might have been applied
+        by an interrupted run.
+        """
+        moves: List[Tuple[str, int, str]] = []
+        for index, operation in enumerate(operations):
+            if operation[0] == ExecutionJournal.move:
+                moves.append((operation[1], operation[2], operation[3]))
+                if index + 1 < len(operations) and operations[index + 1][0] == ExecutionJournal.move:
+                    continue
+                yield from self.apply_moves(moves)
+                moves = []
+                continue
+            try:
+                self.throttle_metadata()
+                if operation[0] == ExecutionJournal.remove:
+                    self.dir_handles.remove(operation[1])
+                    self.metrics.increment(Metrics.files_removed)
+                    self.forget_snapshot_dirs(operation[1])
+                    self.events.append(Events.Removed(operation[1]))
+                elif operation[0] == ExecutionJournal.chmod:
+                    self.dir_handles.chmod(operation[1], operation[2])
+                    self.metrics.increment(Metrics.permissions_changed)
+                    self.forget_snapshot_dirs(operation[1])
+                    self.events.append(Events.Chmodded(operation[1], operation[2]))
+                elif operation[0] == ExecutionJournal.rename:
+                    self.dir_handles.replace(operation[1], operation[2])
+                    self.metrics.increment(Metrics.files_renamed)
+                    self.forget_snapshot_dirs(operation[1], operation[2])
+                    self.events.append(Events.Renamed(operation[1], operation[2]))
+            except FileNotFoundError:
+                self.logger.info(f'Skipping {ExecutionJournal.format_operation(operation)}. '
+                                 f'File does not exist')
+            except Exception as e:
+                self.logger.error(f'Could not {ExecutionJournal.format_operation(operation)}. ERROR: {e}')
+            yield from self.pop_events()
+
+    def apply_moves(self, moves: List[Tuple[str, int, str]]) -> Iterator[Events.Event]:
+        move_engine: MoveEngine = MoveEngine(self.target_dir,
+                                             workers=self.configurations[FileManager.move_workers.name],
+                                             verification=self.configurations[FileManager.move_verification.name],
+                                             read_throttle=self.read_throttle,
+                                             metadata_throttle=self.metadata_throttle,
+                                             worker_initializer=self.worker_initializer)
+        for source_path, destination_path, error in move_engine.move_files(moves):
+            if error is None:
+                self.metrics.increment(Metrics.files_moved)
+                self.forget_snapshot_dirs(source_path, destination_path)
+                yield Events.Moved(source_path, destination_path)
+                continue
+            if isinstance(error, FileNotFoundError) and os.path.isfile(destination_path):
+                self.logger.info(f'Skipping move {source_path} -> {destination_path}. File does not exist')
+            else:
+                self.logger.error(f'Could not move {source_path}. ERROR: {error}')
+            yield from self.pop_events()
+
+    def watch(self, watcher: FileSystemWatcher) -> Iterator[Events.Event]:
+        """
+        Performs all actions only on files which are created or changed in source and target directories,
+        reusing answers given during the first run. New files in target directory are checked for duplicates
+        against index of target directory kept in memory, so target directory is not scanned again
+        (unless file system events were lost, and all files are processed again).
+        """
+        if self.hash_cache is None:  # Hashes of indexed files are kept for the time of watching
+            self.hash_cache = HashCache(':memory:',
+                                        hash_algorithm=self.configurations[FileManager.hash_algorithm.name],
+                                        sample_settings=self.hashing_engine.get_sample_settings())
+        target_index: Dict[str, Optional[FileManager.TargetFile]] = self.build_target_index()
+        for entry in self.walk(self.target_dir):
+            try:
+                if not entry.is_symlink():
+                    self.add_to_watched_index(os.path.normpath(entry.path), self.get_entry_status(entry).st_size)
+            except OSError as e:
+                self.logger.error(f'Could not access {entry.path}. {e}')
+        self.is_target_indexed = True
+        yield from self.pop_events()
+
+        self.logger.info(f'Watching directories {", ".join(self.src_dirs)} and {self.target_dir}')
+        while True:
+            changed_paths, removed_paths, removed_dirs, are_changes_lost = \
+                watcher.get_changes(self.configurations[FileManager.watch_poll_interval.name])
+            if are_changes_lost:  # All files are reported as changed, and they are indexed again when processed
+                self.watched_files_by_size.clear()
+                self.watched_file_sizes.clear()
+                target_index = self.build_target_index()
+            if changed_paths or removed_paths or removed_dirs:
+                with self.metrics.phase('watch'):
+                    yield from self.process_changes(changed_paths, removed_paths, removed_dirs, target_index)
+                self.dir_handles.close()  # Watched directories can be replaced between batches
+                self.write_metrics()  # Metrics of long running process are kept up to date
+
+    def process_changes(self, changed_paths: Set[str], removed_paths: Set[str], removed_dirs: Set[str],
+                        target_index: Dict[str, Optional[TargetFile]]) -> Iterator[Events.Event]:
+        target_dir: str = os.path.normpath(self.target_dir)
+        for path in removed_paths:
+            self.remove_from_watched_index(os.path.normpath(path), target_index)
+        for path in removed_dirs:
+            path = os.path.normpath(path)
+            if path.startswith(target_dir + os.sep):  # Index contains only files of target directory
+                self.remove_from_watched_index(path, target_index)
+                self.remove_directory_from_watched_index(path)
+
+        target_paths: Set[str] = set()
+        source_paths: List[str] = []
+        for path in changed_paths:
+            path = os.path.normpath(path)
+            if path.startswith(target_dir + os.sep):
+                target_paths.add(path)
+            else:
+                source_paths.append(path)
+
+        for path in sorted(source_paths):
+            try:
+                file_status: os.stat_result = self.get_file_status(path)
+            except OSError:
+                continue  # File was removed before it could be processed
+            if not stat.S_ISREG(file_status.st_mode):
+                continue
+            if self.is_global_move or \
+                    self.decide(DecisionRules.move, path, file_status,
+                                lambda: UserInputHandler.ask_if_move_file(path, self.target_dir)):
+                self.move_file_to_target(path, file_status, target_index)
+        target_paths.update((yield from self.move_winning_files_to_target(target_index)))
+
+        if target_paths:
+            self.logger.info(f'Processing {len(target_paths)} changed files in target directory')
+        for path in sorted(target_paths):
+            yield from self.process_watched_target_file(path, target_index)
+            yield from self.pop_events()
+
+    def process_watched_target_file(self, file_path: str, target_index: Dict[str, Optional[TargetFile]]) \
+            -> Iterator[Events.Event]:
+        """
+        Removes file if it is empty, temporary or a duplicate of indexed file, and unifies permissions and name
+        of the file otherwise. Both indexes are updated with the result.
+        """
+        self.remove_from_watched_index(file_path, target_index)
+        try:
+            file_status: os.stat_result = self.get_file_status(file_path, follow_symlinks=False)
+        except OSError:
+            return  # File was removed before it could be processed
+        if not stat.S_ISREG(file_status.st_mode):
+            if os.path.dirname(file_path) == os.path.normpath(self.target_dir):
+                target_index[os.path.basename(file_path)] = None
+            return
+        if self.remove_empty_files_from_directory(file_path, file_status.st_size):
+            return
+        if self.remove_temp_files_from_directory(file_path, lambda: file_status):
+            return
+
+        indexed_files: Set[str] = self.watched_files_by_size.get(file_status.st_size, set())
+        if indexed_files:
+            removed_files: Set[str] = yield from self.remove_dupl_files(
+                {file_status.st_size: [*indexed_files, file_path]})
+            for removed_file in removed_files:
+                self.remove_from_watched_index(removed_file, target_index)
+            if file_path in removed_files:
+                return
+
+        self.unify_file_permissions(file_path, file_status)
+        new_file_path: Optional[str] = self.replace_bad_chars_in_file_name(*os.path.split(file_path))
+        if new_file_path is not None:
+            self.remove_from_watched_index(new_file_path, target_index)  # Overridden file
+            file_path = new_file_path
+        self.add_to_watched_index(file_path, file_status.st_size)
+        if os.path.dirname(file_path) == os.path.normpath(self.target_dir):
+            target_index[os.path.basename(file_path)] = FileManager.TargetFile(mtime=file_status.st_mtime,
+                                                                               size=file_status.st_size,
+                                                                               inode=file_status.st_ino,
+                                                                               device=file_status.st_dev)
+
+    def add_to_watched_index(self, file_path: str, file_size: int) -> None:
+        self.watched_files_by_size[file_size].add(file_path)
+        self.watched_file_sizes[file_path] = file_size
+
+    def remove_from_watched_index(self, file_path: str, target_index: Dict[str, Optional[TargetFile]]) -> bool:
+        """
+        Removes file from indexes of target directory. Returns True if file was indexed.
+        """
+        if os.path.dirname(file_path) == os.path.normpath(self.target_dir):
+            target_index.pop(os.path.basename(file_path), None)
+        file_size: Optional[int] = self.watched_file_sizes.pop(file_path, None)
+        if file_size is None:
+            return False
+        self.watched_files_by_size[file_size].discard(file_path)
+        if not self.watched_files_by_size[file_size]:
+            del self.watched_files_by_size[file_size]
+        return True
+
+    def remove_directory_from_watched_index(self, directory: str) -> None:
+        for file_path in [file_path for file_path in self.watched_file_sizes
+                          if file_path.startswith(directory + os.sep)]:
+            file_size: int = self.watched_file_sizes.pop(file_path)
+            self.watched_files_by_size[file_size].discard(file_path)
+            if not self.watched_files_by_size[file_size]:
+                del self.watched_files_by_size[file_size]
+
+    def run(self) -> Iterator[Events.Event]:
+        try:
+            self.logger.info(f'Moving files from source directories {" ,".join(self.src_dirs)} '
+                             f'to target directory {self.target_dir}')
+            yield from self.move_files_from_sources_to_target()
+            if self.is_fused or self.journal is not None:  # Recorded operations require single traversal
+                self.logger.info(f'Processing target directory {self.target_dir} and its subdirectories '
+                                 f'in a single traversal')
+                yield from self.run_fused()
+                return
+            self.logger.info(f'Removing empty files from target directory {self.target_dir} and its subdirectories')
+            yield from self.remove_empty_files_from_target()
+            self.logger.info(f'Removing temporary files from target directory {self.target_dir} '
+                             f'and its subdirectories')
+            yield from self.remove_temp_files_from_target()
+            self.logger.info(f'Removing duplicated files from target directory {self.target_dir} '
+                             f'and its subdirectories')
+            yield from self.remove_duplicates_from_target()
+            self.logger.info(f'Unifying files permissions in target directory {self.target_dir} '
+                             f'and its subdirectories')
+            yield from self.unify_files_permissions()
+            self.logger.info(f'Changing bad characters ({self.configurations[FileManager.unwanted_chars.name]}) '
+                             f'to substitute character {self.configurations[FileManager.substitute_char.name]} '
+                             f'in all files of {self.target_dir} and its subdirectories')
+            yield from self.replace_bad_chars_in_file_names()
         except Exception as e:
-            FileManager.logger.error(e)
+            self.logger.error(e)
+            yield from self.pop_events()
 
 
 def main() -> None:
-    FileManager()
+    """
+    Command line interface of FileManager: configures logging, builds engine from arguments and configuration file
+    and performs chosen action, logging its errors.
+    """
+    args: argparse.Namespace = FileManager.get_args()
+    logger: logging.Logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    try:
+        log_handler: AsyncLog = AsyncLog('file_manager.log', sys.stdout,
+                                         json_log_file_path=None if args.log_json is None else args.log_json[0])
+    except OSError as e:
+        print(f'Could not open log file. {e}')
+        exit(1)
+    log_handler.setFormatter(logging.Formatter('%(asctime)s: %(name)s: %(levelname)s: %(message)s'))
+    logger.addHandler(log_handler)
+
+    options: FileManager.Options = FileManager.Options(
+        fused=args.fused,
+        hash_cache=None if args.hash_cache is None else args.hash_cache[0],
+        rebuild_hash_cache=args.rebuild_hash_cache,
+        journal=None if args.journal is None else args.journal[0],
+        dry_run=args.dry_run,
+        rules=None if args.rules is None else args.rules[0],
+        review=None if args.review is None else args.review[0],
+        metrics=None if args.metrics is None else args.metrics[0],
+        metrics_prometheus=None if args.metrics_prometheus is None else args.metrics_prometheus[0],
+        profile_phase=None if args.profile is None else args.profile[0],
+        profile_path=None if args.profile is None else args.profile[1],
+        profiler=args.profiler,
+        watch=args.watch,
+        ingest_dedup=args.ingest_dedup,
+        snapshot=None if args.snapshot is None else args.snapshot[0],
+        rebuild_snapshot=args.rebuild_snapshot)
+    try:
+        with FileManager(args.target[0], FileManager.load_configurations(args.config[0]), source_dirs=args.source,
+                         options=options, logger=logger) as engine:
+            for _ in engine.perform(args.action[0]):
+                pass  # Operations and errors are already logged
+            if options.dry_run:
+                log_handler.flush()
+                engine.journal.print()
+    except FileManager.Error as e:
+        logger.error(e)
+        exit(1)
+    except KeyboardInterrupt:
+        log_handler.flush()
+        if options.journal is not None:
+            print('Program closed. Execution of journal will be resumed by the next run')
+        else:
+            print('Program closed')
+        exit(0)
+    finally:
+        log_handler.close()  # Writes summary of logged messages
 
 
 if __name__ == '__main__':
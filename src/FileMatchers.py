@@ -0,0 +1,105 @@
+import fnmatch
+import os
+import re
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Pattern, Tuple
+from DecisionRules import DecisionRules
+
+
+class FileMatchers:
+    """
+    Rules of configuration file compiled once when it is loaded, so checking a file does not iterate over them:
+    - temporary files: plain patterns are suffixes of file path checked with a single str.endswith call, patterns
+      containing glob characters are joined into one regular expression matched against file name, and objects
+      are rules with conditions of rules file (name, path, directory, size and age), checked in the order they are
+      written and given stat information only if one of them needs it,
+    - unwanted characters: single characters are replaced with a str.translate table, and a regular expression
+      is used when some of them are longer,
+    - unusual permissions: set of modes (permission bits, optionally with setuid, setgid and sticky bits).
+    """
+    glob_chars: str = '*?['
+
+    def __init__(self, tmp_file_patterns: List[Any], unwanted_chars: List[str], substitute_char: str,
+                 unusual_file_permissions: List[str], default_file_permissions: str):
+        suffixes: List[str] = []
+        globs: List[str] = []
+        self.tmp_file_rules: List[DecisionRules.Rule] = []
+        for index, pattern in enumerate(tmp_file_patterns):
+            if isinstance(pattern, str) and any(char in pattern for char in FileMatchers.glob_chars):
+                globs.append(fnmatch.translate(pattern))
+            elif isinstance(pattern, str):
+                suffixes.append(pattern)
+            elif isinstance(pattern, dict):
+                unknown_keys: List[str] = sorted(set(pattern) - set(DecisionRules.conditions))
+                if unknown_keys:
+                    raise ValueError(f'Temporary file pattern {index} has unknown conditions {unknown_keys}')
+                self.tmp_file_rules.append(DecisionRules.compile_rule(pattern, True, f'temporary file pattern {index}'))
+            else:
+                raise ValueError(f'Temporary file pattern {index} must be a string or an object')
+        self.tmp_file_suffixes: Tuple[str, ...] = tuple(suffixes)
+        self.tmp_file_names: Optional[Pattern] = re.compile('|'.join(globs)) if globs else None
+
+        if not all(isinstance(char, str) and char for char in unwanted_chars):
+            raise ValueError('Unwanted characters must be non-empty strings')
+        self.translation: Optional[Dict[int, str]] = None
+        self.unwanted_strings: Optional[Pattern] = None
+        self.substitute_char: str = substitute_char
+        if all(len(char) == 1 for char in unwanted_chars):
+            self.translation = str.maketrans({char: substitute_char for char in unwanted_chars})
+        else:  # Longer strings are matched first
+            self.unwanted_strings = re.compile('|'.join(re.escape(string) for string in
+                                                        sorted(unwanted_chars, key=len, reverse=True)))
+
+        self.unusual_modes: FrozenSet[int] = frozenset(FileMatchers.parse_mode(permissions)
+                                                       for permissions in unusual_file_permissions)
+        self.default_mode: int = FileMatchers.parse_mode(default_file_permissions)
+
+    @staticmethod
+    def parse_mode(permissions: Any) -> int:
+        try:
+            mode: int = int(permissions, 8)
+        except (TypeError, ValueError):
+            raise ValueError(f'Permissions {permissions!r} are not an octal number') from None
+        if not 0 <= mode <= 0o7777:
+            raise ValueError(f'Permissions {permissions!r} must be between 0o0 and 0o7777')
+        return mode
+
+    def is_tmp_file(self, file_path: str, get_status: Callable[[], os.stat_result]) -> bool:
+        """
+        Checks whether file is temporary. Stat information is taken with get_status only when a matching rule
+        has size or age conditions; file which cannot be accessed does not match such rules.
+        """
+        if file_path.endswith(self.tmp_file_suffixes):
+            return True
+        if self.tmp_file_names is not None and self.tmp_file_names.match(os.path.basename(file_path)) is not None:
+            return True
+        file_status: Optional[os.stat_result] = None
+        for rule in self.tmp_file_rules:
+            if not rule.matches_path(file_path):
+                continue
+            if rule.requires_status():
+                if file_status is None:
+                    try:
+                        file_status = get_status()
+                    except OSError:
+                        return False
+                if not rule.matches_status(file_status):
+                    continue
+            return True
+        return False
+
+    def get_new_file_name(self, file_name: str) -> Optional[str]:
+        """
+        Returns file name with unwanted characters replaced, or None if it does not contain them.
+        """
+        if self.translation is not None:
+            new_file_name: str = file_name.translate(self.translation)
+        else:
+            new_file_name = self.unwanted_strings.sub(self.substitute_char, file_name)
+        return new_file_name if new_file_name != file_name else None
+
+    def is_unusual_mode(self, mode: int) -> bool:
+        """
+        Permission bits are compared with unusual modes, and so are setuid, setgid and sticky bits for modes
+        which have them.
+        """
+        return mode & 0o777 in self.unusual_modes or mode & 0o7777 in self.unusual_modes
@@ -0,0 +1,231 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import stat
+import struct
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class FileSystemWatcher(ABC):
+    """
+    Watches directory trees and reports paths of files and directories which were created, changed or removed.
+    Uses inotify on Linux and falls back to polling (periodic comparison of directory tree snapshots) elsewhere.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger: logging.Logger = logger
+
+    @staticmethod
+    def create(directories: List[str], logger: logging.Logger, poll_interval: float) -> 'FileSystemWatcher':
+        try:
+            return InotifyWatcher(directories, logger)
+        except OSError as e:
+            logger.info(f'inotify is not available ({e}). Directories will be polled every {poll_interval} seconds')
+            return PollingWatcher(directories, logger, poll_interval)
+
+    @abstractmethod
+    def get_changes(self, timeout: float) -> Tuple[Set[str], Set[str], Set[str], bool]:
+        """
+        Waits up to timeout seconds for changes. Returns paths of changed (or new) files, paths of removed files,
+        paths of removed directories and whether some changes were lost. Files of removed directory are not
+        necessarily reported as removed. When changes were lost, all files of watched directories are reported
+        as changed, and files which are not among them could have been removed.
+        """
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(FileSystemWatcher):
+    IN_ATTRIB: int = 0x00000004
+    IN_CLOSE_WRITE: int = 0x00000008
+    IN_MOVED_FROM: int = 0x00000040
+    IN_MOVED_TO: int = 0x00000080
+    IN_CREATE: int = 0x00000100
+    IN_DELETE: int = 0x00000200
+    IN_DELETE_SELF: int = 0x00000400
+    IN_Q_OVERFLOW: int = 0x00004000
+    IN_IGNORED: int = 0x00008000
+    IN_ONLYDIR: int = 0x01000000
+    IN_ISDIR: int = 0x40000000
+    IN_NONBLOCK: int = 0o4000
+    IN_CLOEXEC: int = 0o2000000
+
+    watch_mask: int = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+        IN_DELETE_SELF | IN_ONLYDIR
+    event_header: struct.Struct = struct.Struct('iIII')  # wd, mask, cookie, len
+    read_size: int = 64 * 1024
+
+    def __init__(self, directories: List[str], logger: logging.Logger):
+        super().__init__(logger)
+        library_name: Optional[str] = ctypes.util.find_library('c')
+        self.libc: ctypes.CDLL = ctypes.CDLL(library_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify_init1 is not supported')
+        self.fd: int = self.libc.inotify_init1(InotifyWatcher.IN_NONBLOCK | InotifyWatcher.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.directories: List[str] = directories
+        self.watched_dirs: Dict[int, str] = {}
+        self.are_changes_lost: bool = False
+        for directory in directories:
+            self.add_tree(directory, set())
+
+    def add_tree(self, directory: str, changed_paths: Set[str]) -> None:
+        """
+        Watches given directory and its subdirectories. Files already present in them are added to changed paths,
+        since they could have been created before the watches were added.
+        """
+        dirs_to_watch: List[str] = [directory]
+        while dirs_to_watch:
+            current_dir: str = dirs_to_watch.pop()
+            wd: int = self.libc.inotify_add_watch(self.fd, os.fsencode(current_dir), InotifyWatcher.watch_mask)
+            if wd < 0:
+                self.logger.error(f'Could not watch directory {current_dir}. {os.strerror(ctypes.get_errno())}')
+                continue
+            self.watched_dirs[wd] = current_dir
+            try:
+                with os.scandir(current_dir) as dir_iterator:
+                    for entry in dir_iterator:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs_to_watch.append(entry.path)
+                        else:
+                            changed_paths.add(entry.path)
+            except OSError as e:
+                self.logger.error(f'Could not list directory {current_dir}. {e}')
+
+    def remove_tree(self, directory: str) -> None:
+        """
+        Stops watching directory and its subdirectories. Directory moved within watched directories is watched again
+        under its new path.
+        """
+        for wd, watched_dir in list(self.watched_dirs.items()):
+            if watched_dir == directory or watched_dir.startswith(directory + os.sep):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watched_dirs[wd]
+
+    def rescan(self) -> Set[str]:
+        """
+        Watches all directories again, since directories created while events were lost are not watched, and returns
+        paths of all files in them. Watches of directories which no longer exist are removed.
+        """
+        previously_watched_dirs: Dict[int, str] = self.watched_dirs
+        self.watched_dirs = {}
+        changed_paths: Set[str] = set()
+        for directory in self.directories:
+            self.add_tree(directory, changed_paths)
+        for wd in previously_watched_dirs.keys() - self.watched_dirs.keys():
+            self.libc.inotify_rm_watch(self.fd, wd)  # Fails for watches already removed by kernel
+        return changed_paths
+
+    def get_changes(self, timeout: float) -> Tuple[Set[str], Set[str], Set[str], bool]:
+        changed_paths: Set[str] = set()
+        removed_paths: Set[str] = set()
+        removed_dirs: Set[str] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            try:
+                data: bytes = os.read(self.fd, InotifyWatcher.read_size)
+            except BlockingIOError:
+                break
+            offset: int = 0
+            while offset < len(data):
+                wd, mask, _, name_length = InotifyWatcher.event_header.unpack_from(data, offset)
+                offset += InotifyWatcher.event_header.size
+                name: str = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+                offset += name_length
+                self.handle_event(wd, mask, name, changed_paths, removed_paths, removed_dirs)
+            ready, _, _ = select.select([self.fd], [], [], 0)
+        if self.are_changes_lost:
+            self.are_changes_lost = False
+            return self.rescan(), set(), set(), True
+        return changed_paths - removed_paths, removed_paths, removed_dirs, False
+
+    def handle_event(self, wd: int, mask: int, name: str, changed_paths: Set[str], removed_paths: Set[str],
+                     removed_dirs: Set[str]) -> None:
+        if mask & InotifyWatcher.IN_Q_OVERFLOW:
+            self.logger.warning('Too many file system events. Some changes were lost, so watched directories '
+                                'will be scanned again')
+            self.are_changes_lost = True
+            return
+        directory: Optional[str] = self.watched_dirs.get(wd)
+        if directory is None:
+            return
+        if mask & (InotifyWatcher.IN_IGNORED | InotifyWatcher.IN_DELETE_SELF):
+            del self.watched_dirs[wd]
+            return
+        path: str = os.path.join(directory, name)
+        if mask & InotifyWatcher.IN_ISDIR:
+            if mask & (InotifyWatcher.IN_CREATE | InotifyWatcher.IN_MOVED_TO):
+                changed_paths.add(path)
+                removed_dirs.discard(path)
+                self.add_tree(path, changed_paths)
+            elif mask & (InotifyWatcher.IN_DELETE | InotifyWatcher.IN_MOVED_FROM):
+                removed_dirs.add(path)  # Files of moved directory are not reported separately
+                changed_paths.discard(path)
+                self.remove_tree(path)
+            return
+        if mask & (InotifyWatcher.IN_DELETE | InotifyWatcher.IN_MOVED_FROM):
+            removed_paths.add(path)
+            changed_paths.discard(path)
+        elif mask & (InotifyWatcher.IN_CLOSE_WRITE | InotifyWatcher.IN_MOVED_TO | InotifyWatcher.IN_ATTRIB):
+            changed_paths.add(path)
+            removed_paths.discard(path)
+        elif mask & InotifyWatcher.IN_CREATE:
+            try:
+                if not stat.S_ISREG(os.lstat(path).st_mode):  # Links and special files are not written to
+                    changed_paths.add(path)
+                    removed_paths.discard(path)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher(FileSystemWatcher):
+
+    def __init__(self, directories: List[str], logger: logging.Logger, poll_interval: float):
+        super().__init__(logger)
+        self.directories: List[str] = directories
+        self.poll_interval: float = poll_interval
+        self.snapshot: Dict[str, Tuple[int, int, int, int]] = self.take_snapshot()
+
+    def take_snapshot(self) -> Dict[str, Tuple[int, int, int, int]]:
+        snapshot: Dict[str, Tuple[int, int, int, int]] = {}
+        dirs_to_walk: List[str] = list(self.directories)
+        while dirs_to_walk:
+            current_dir: str = dirs_to_walk.pop()
+            try:
+                with os.scandir(current_dir) as dir_iterator:
+                    for entry in dir_iterator:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                dirs_to_walk.append(entry.path)
+                            entry_status: os.stat_result = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (entry_status.st_ino, entry_status.st_size,
+                                                entry_status.st_mtime_ns, entry_status.st_mode)
+            except OSError as e:
+                self.logger.error(f'Could not list directory {current_dir}. {e}')
+        return snapshot
+
+    def get_changes(self, timeout: float) -> Tuple[Set[str], Set[str], Set[str], bool]:
+        time.sleep(min(timeout, self.poll_interval))
+        snapshot: Dict[str, Tuple[int, int, int, int]] = self.take_snapshot()
+        changed_paths: Set[str] = {path for path, file_info in snapshot.items()
+                                   if self.snapshot.get(path) != file_info}
+        removed_paths: Set[str] = set()
+        removed_dirs: Set[str] = set()
+        for path in set(self.snapshot) - set(snapshot):
+            if stat.S_ISDIR(self.snapshot[path][3]):
+                removed_dirs.add(path)
+            else:
+                removed_paths.add(path)
+        self.snapshot = snapshot
+        return changed_paths, removed_paths, removed_dirs, False
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+from HashingEngine import HashingEngine
+
+
+class HashCache:
+    """
+    On-disk index of file hashes used by duplicated files removal.
+    Entries are keyed by device and inode and are valid only as long as file size, modification time,
+    change time and hash algorithm are the same as when the hash was computed.
+    Hashes of sampled blocks are additionally valid only for the same sampling settings.
+    """
+    schema_version: int = 2
+    commit_interval: int = 1000
+    columns: Dict[str, str] = {HashingEngine.small_hash: 'small_hash',
+                               HashingEngine.sample_hash: 'sample_hash',
+                               HashingEngine.full_hash: 'full_hash'}
+
+    def __init__(self, cache_file_path: str, hash_algorithm: str, sample_settings: str, rebuild: bool = False):
+        self.cache_file_path: str = cache_file_path
+        self.hash_algorithm: str = hash_algorithm
+        self.connection: sqlite3.Connection = sqlite3.connect(cache_file_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.uncommitted_changes: int = 0
+
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', ('schema_version',)).fetchone()
+        if rebuild or row is None or int(row[0]) != HashCache.schema_version:
+            self.connection.execute('DROP TABLE IF EXISTS hashes')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                                'dev INTEGER NOT NULL, '
+                                'ino INTEGER NOT NULL, '
+                                'size INTEGER NOT NULL, '
+                                'mtime_ns INTEGER NOT NULL, '
+                                'ctime_ns INTEGER NOT NULL, '
+                                'algorithm TEXT NOT NULL, '
+                                'small_hash BLOB, '
+                                'sample_hash BLOB, '
+                                'full_hash BLOB, '
+                                'PRIMARY KEY (dev, ino))')
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', ('sample_settings',)).fetchone()
+        if row is not None and row[0] != sample_settings:
+            self.connection.execute('UPDATE hashes SET sample_hash = NULL')
+        self.connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                    [('schema_version', str(HashCache.schema_version)),
+                                     ('sample_settings', sample_settings)])
+        self.connection.commit()
+
+    @staticmethod
+    def get_key(file_status: os.stat_result) -> Tuple[int, int]:
+        return file_status.st_dev, file_status.st_ino
+
+    def get(self, file_status: os.stat_result, stage: str) -> Optional[bytes]:
+        """
+        Returns cached hash of the file for given hashing stage or None if it is not cached
+        or the file has changed since it was hashed.
+        """
+        row = self.connection.execute(f'SELECT {HashCache.columns[stage]} FROM hashes '
+                                      f'WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND ctime_ns = ? '
+                                      f'AND algorithm = ?',
+                                      (file_status.st_dev, file_status.st_ino, file_status.st_size,
+                                       file_status.st_mtime_ns, file_status.st_ctime_ns,
+                                       self.hash_algorithm)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def put(self, file_status: os.stat_result, stage: str, digest: bytes) -> None:
+        """
+        Stores hash of the file for given hashing stage.
+        Hashes stored for previous version of the file are invalidated.
+        """
+        column: str = HashCache.columns[stage]
+        other_columns_update: str = ''.join(f'{other_column} = CASE WHEN size = excluded.size '
+                                            f'AND mtime_ns = excluded.mtime_ns AND ctime_ns = excluded.ctime_ns '
+                                            f'AND algorithm = excluded.algorithm THEN {other_column} ELSE NULL END, '
+                                            for other_column in HashCache.columns.values() if other_column != column)
+        self.connection.execute(f'INSERT INTO hashes (dev, ino, size, mtime_ns, ctime_ns, algorithm, {column}) '
+                                f'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                                f'ON CONFLICT (dev, ino) DO UPDATE SET '
+                                f'{other_columns_update}'
+                                f'{column} = excluded.{column}, '
+                                f'size = excluded.size, mtime_ns = excluded.mtime_ns, ctime_ns = excluded.ctime_ns, '
+                                f'algorithm = excluded.algorithm',
+                                (file_status.st_dev, file_status.st_ino, file_status.st_size,
+                                 file_status.st_mtime_ns, file_status.st_ctime_ns, self.hash_algorithm, digest))
+        self.uncommitted_changes += 1
+        if self.uncommitted_changes >= HashCache.commit_interval:
+            self.commit()
+
+    def prune(self, seen_keys: Iterable[Tuple[int, int]]) -> int:
+        """
+        Removes entries of files that were not seen during the last scan. Returns number of removed entries.
+        Seen keys are stored in a temporary table, so they do not have to be kept in memory.
+        """
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS seen_keys ('
+                                'dev INTEGER NOT NULL, ino INTEGER NOT NULL, PRIMARY KEY (dev, ino)) WITHOUT ROWID')
+        self.connection.execute('DELETE FROM seen_keys')
+        self.connection.executemany('INSERT OR IGNORE INTO seen_keys (dev, ino) VALUES (?, ?)', seen_keys)
+        cursor: sqlite3.Cursor = self.connection.execute('DELETE FROM hashes WHERE NOT EXISTS ('
+                                                         'SELECT 1 FROM seen_keys '
+                                                         'WHERE seen_keys.dev = hashes.dev '
+                                                         'AND seen_keys.ino = hashes.ino)')
+        self.connection.execute('DELETE FROM seen_keys')
+        self.commit()
+        return cursor.rowcount
+
+    def commit(self) -> None:
+        self.connection.commit()
+        self.uncommitted_changes = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
@@ -0,0 +1,185 @@
+import hashlib
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from Throttle import Throttle
+
+
+class HashingEngine:
+    """
+    Generates hashes of files using a pool of worker threads.
+    hashlib releases the GIL while hashing large buffers, so files are hashed in parallel.
+    The number of bytes submitted for hashing and not yet returned is limited by max_in_flight_bytes.
+    Files can be hashed in three stages: the first small_hash_size bytes, sampled blocks spread over the file,
+    and the full file.
+    Reads can be limited by a throttle of bytes per second shared by all workers; throttled files are not
+    memory-mapped, so they are read in buffers of buffer_size. Empty files cannot be memory-mapped either.
+    """
+    small_hash_size: int = 1024
+
+    small_hash: str = 'small'
+    sample_hash: str = 'sample'
+    full_hash: str = 'full'
+
+    def __init__(self, hash_algorithm: str, buffer_size: int, workers: int, mmap_threshold: int,
+                 max_in_flight_bytes: int, sample_blocks: int, sample_block_size: int,
+                 read_throttle: Optional[Throttle] = None, worker_initializer: Optional[Callable[[], None]] = None):
+        self.hash_algorithm: str = hash_algorithm
+        self.buffer_size: int = buffer_size
+        self.workers: int = workers
+        self.mmap_threshold: int = mmap_threshold
+        self.max_in_flight_bytes: int = max_in_flight_bytes
+        self.sample_blocks: int = sample_blocks
+        self.sample_block_size: int = sample_block_size
+        self.read_throttle: Optional[Throttle] = read_throttle
+        self.worker_initializer: Optional[Callable[[], None]] = worker_initializer
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def get_sample_settings(self) -> str:
+        return f'{self.sample_blocks}x{self.sample_block_size}'
+
+    def is_sampling_useful(self, file_size: int) -> bool:
+        """
+        Sampled blocks are hashed only if they cover a smaller part of the file than the full hash.
+        """
+        return self.sample_blocks > 0 and file_size > self.sample_blocks * self.sample_block_size
+
+    def get_sample_offsets(self, file_size: int) -> List[int]:
+        """
+        Returns offsets of blocks evenly spaced over the file, including the last block (tail) of the file.
+        """
+        if self.sample_blocks == 1:
+            return [file_size - self.sample_block_size]
+        last_offset: int = file_size - self.sample_block_size
+        return [last_offset * i // (self.sample_blocks - 1) for i in range(self.sample_blocks)]
+
+    def get_read_size(self, file_size: int, stage: str) -> int:
+        if stage == HashingEngine.small_hash:
+            return min(file_size, HashingEngine.small_hash_size)
+        if stage == HashingEngine.sample_hash:
+            return min(file_size, self.sample_blocks * self.sample_block_size)
+        return file_size
+
+    def hash_file(self, file_path: str, stage: str = full_hash) -> bytes:
+        """
+        Generates hash from file for given hashing stage.
+        """
+        hash_obj = hashlib.new(self.hash_algorithm)
+        with open(file_path, 'rb', buffering=0) as file:
+            if stage == HashingEngine.small_hash:
+                data: bytes = file.read(HashingEngine.small_hash_size)
+                self.throttle_read(len(data))
+                hash_obj.update(data)
+                return hash_obj.digest()
+
+            file_size: int = os.fstat(file.fileno()).st_size
+            if stage == HashingEngine.sample_hash:
+                for offset in self.get_sample_offsets(file_size):
+                    block: bytes = os.pread(file.fileno(), self.sample_block_size, offset)
+                    self.throttle_read(len(block))
+                    hash_obj.update(block)
+            elif file_size >= self.mmap_threshold and file_size > 0 and self.read_throttle is None:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    if hasattr(mapped_file, 'madvise'):
+                        mapped_file.madvise(mmap.MADV_SEQUENTIAL)
+                    hash_obj.update(mapped_file)
+            else:
+                buffer: bytearray = bytearray(min(self.buffer_size, max(file_size, 1)))
+                view: memoryview = memoryview(buffer)
+                while True:
+                    read_bytes: int = file.readinto(buffer)
+                    if not read_bytes:
+                        break
+                    self.throttle_read(read_bytes)
+                    hash_obj.update(view[:read_bytes])
+        return hash_obj.digest()
+
+    def throttle_read(self, size: int) -> None:
+        """
+        Waits after reading given number of bytes until the throttle allows reading more.
+        """
+        if self.read_throttle is not None:
+            self.read_throttle.acquire(size)
+
+    def hash_files(self, files: Iterable[Tuple[str, int]], stage: str = full_hash) \
+            -> Iterator[Tuple[str, Optional[bytes], Optional[OSError]]]:
+        """
+        Generates hashes of given (file path, file size) pairs in parallel.
+        Yields (file path, hash, error) tuples in the same order as files were given;
+        hash is None and error is set when file could not be read.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hashing',
+                                               initializer=self.worker_initializer)
+
+        pending: Deque[Tuple[str, int, Future]] = deque()
+        in_flight_bytes: int = 0
+        for file_path, file_size in files:
+            cost: int = self.get_read_size(file_size, stage)
+            # Wait for the oldest files when byte budget is exhausted; single file larger than budget is still hashed
+            while pending and in_flight_bytes + cost > self.max_in_flight_bytes:
+                in_flight_bytes -= pending[0][1]
+                yield HashingEngine.get_result(*pending.popleft())
+            pending.append((file_path, cost, self.executor.submit(self.hash_file, file_path, stage)))
+            in_flight_bytes += cost
+            while pending and pending[0][2].done():
+                in_flight_bytes -= pending[0][1]
+                yield HashingEngine.get_result(*pending.popleft())
+        while pending:
+            yield HashingEngine.get_result(*pending.popleft())
+
+    @staticmethod
+    def get_result(file_path: str, _: int, future: Future) -> Tuple[str, Optional[bytes], Optional[OSError]]:
+        try:
+            return file_path, future.result(), None
+        except OSError as e:
+            return file_path, None, e
+
+    def group_identical_files(self, file_paths: List[str]) -> Tuple[List[List[str]], List[Tuple[str, OSError]]]:
+        """
+        Compares content of files of the same size chunk by chunk, reading all of them at the same time.
+        Files stop being read as soon as their content differs from content of all other files.
+        Returns groups of identical files and errors of files which could not be read.
+        """
+        errors: List[Tuple[str, OSError]] = []
+        files: Dict[str, BinaryIO] = {}
+        for file_path in file_paths:
+            try:
+                files[file_path] = open(file_path, 'rb')  # Buffered reads return full chunks
+            except OSError as e:
+                errors.append((file_path, e))
+
+        identical_files: List[List[str]] = []
+        try:
+            groups: List[List[str]] = [list(files.keys())] if len(files) > 1 else []
+            while groups:
+                next_groups: List[List[str]] = []
+                for group in groups:
+                    files_by_chunk: Dict[bytes, List[str]] = {}
+                    for file_path in group:
+                        try:
+                            chunk: bytes = files[file_path].read(self.buffer_size)
+                        except OSError as e:
+                            errors.append((file_path, e))
+                            continue
+                        self.throttle_read(len(chunk))
+                        files_by_chunk.setdefault(chunk, []).append(file_path)
+                    for chunk, files_with_chunk in files_by_chunk.items():
+                        if len(files_with_chunk) < 2:
+                            continue  # Content of this file is unique
+                        if chunk:
+                            next_groups.append(files_with_chunk)
+                        else:
+                            identical_files.append(files_with_chunk)  # All files were read to the end
+                groups = next_groups
+        finally:
+            for file in files.values():
+                file.close()
+        return identical_files, errors
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,155 @@
+import cProfile
+import json
+import logging
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import DefaultDict, Dict, Iterator, List, Optional
+
+
+class Metrics:
+    """
+    Counters and timers of program phases (e.g. move, dedup). Counters are added to the innermost running phase;
+    wall and CPU time of a phase include time of phases nested in it. Phases can be entered many times
+    (e.g. in watch mode), in which case their measurements are summed.
+    One phase can be profiled with cProfile or tracemalloc; profile is written to disk when the phase ends.
+    """
+    entries_scanned: str = 'entries_scanned'
+    stat_calls: str = 'stat_calls'
+    bytes_hashed: str = 'bytes_hashed'
+    hash_cache_hits: str = 'hash_cache_hits'
+    files_moved: str = 'files_moved'
+    files_removed: str = 'files_removed'
+    files_renamed: str = 'files_renamed'
+    permissions_changed: str = 'permissions_changed'
+    errors: str = 'errors'
+
+    profilers: List[str] = ['cprofile', 'tracemalloc']
+    tracemalloc_top_lines: int = 50
+
+    @dataclass
+    class Phase:
+        runs: int = 0
+        wall_time: float = 0.0
+        cpu_time: float = 0.0
+        counters: DefaultDict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    class ErrorCounter(logging.Handler):
+        """
+        Logging handler counting logged errors in the running phase.
+        """
+
+        def __init__(self, metrics: 'Metrics'):
+            super().__init__(logging.ERROR)
+            self.metrics: Metrics = metrics
+
+        def emit(self, record: logging.LogRecord) -> None:
+            self.metrics.increment(Metrics.errors)
+
+    def __init__(self, profile_phase: Optional[str] = None, profile_file_path: Optional[str] = None,
+                 profiler: str = 'cprofile'):
+        self.phases: Dict[str, Metrics.Phase] = {}
+        self.running_phases: List[str] = []
+        self.start_time: float = time.time()
+        self.profile_phase: Optional[str] = profile_phase
+        self.profile_file_path: Optional[str] = profile_file_path
+        self.profiler: str = profiler
+        self.profile: Optional[cProfile.Profile] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        phase: Metrics.Phase = self.phases.setdefault(name, Metrics.Phase())
+        phase.runs += 1
+        self.running_phases.append(name)
+        is_profiled: bool = name == self.profile_phase
+        if is_profiled:
+            self.start_profiling()
+        start_wall_time: float = time.perf_counter()
+        start_cpu_time: float = time.process_time()
+        try:
+            yield
+        finally:
+            phase.wall_time += time.perf_counter() - start_wall_time
+            phase.cpu_time += time.process_time() - start_cpu_time
+            if is_profiled:
+                self.stop_profiling()
+            self.running_phases.pop()
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        phase_name: str = self.running_phases[-1] if self.running_phases else 'other'
+        self.phases.setdefault(phase_name, Metrics.Phase()).counters[counter] += value
+
+    def start_profiling(self) -> None:
+        if self.profiler == 'tracemalloc':
+            tracemalloc.start()
+            return
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop_profiling(self) -> None:
+        """
+        Writes profile of all runs of profiled phase so far.
+        """
+        if self.profiler == 'tracemalloc':
+            snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            current_size, peak_size = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(self.profile_file_path, 'w') as f:
+                f.write(f'Phase: {self.profile_phase}\nCurrent size: {current_size} B\nPeak size: {peak_size} B\n\n')
+                for statistic in snapshot.statistics('lineno')[:Metrics.tracemalloc_top_lines]:
+                    f.write(f'{statistic}\n')
+            return
+        self.profile.disable()
+        self.profile.dump_stats(self.profile_file_path)
+
+    def to_dict(self) -> dict:
+        return {
+            'start_time': self.start_time,
+            'phases': {name: {'runs': phase.runs,
+                              'wall_time': phase.wall_time,
+                              'cpu_time': phase.cpu_time,
+                              'counters': dict(phase.counters)}
+                       for name, phase in self.phases.items()}
+        }
+
+    def write_json(self, file_path: str) -> None:
+        Metrics.write_atomically(file_path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, file_path: str) -> None:
+        """
+        Writes metrics in Prometheus text format, e.g. for node exporter textfile collector.
+        """
+        lines: List[str] = ['# HELP file_manager_phase_runs Number of times phase was run',
+                            '# TYPE file_manager_phase_runs gauge']
+        lines += [f'file_manager_phase_runs{{phase="{name}"}} {phase.runs}' for name, phase in self.phases.items()]
+        lines += ['# HELP file_manager_phase_wall_seconds Wall time of phase',
+                  '# TYPE file_manager_phase_wall_seconds gauge']
+        lines += [f'file_manager_phase_wall_seconds{{phase="{name}"}} {phase.wall_time}'
+                  for name, phase in self.phases.items()]
+        lines += ['# HELP file_manager_phase_cpu_seconds CPU time of phase',
+                  '# TYPE file_manager_phase_cpu_seconds gauge']
+        lines += [f'file_manager_phase_cpu_seconds{{phase="{name}"}} {phase.cpu_time}'
+                  for name, phase in self.phases.items()]
+        counter_names: List[str] = sorted({counter for phase in self.phases.values() for counter in phase.counters})
+        for counter in counter_names:
+            lines += [f'# TYPE file_manager_{counter}_total counter']
+            lines += [f'file_manager_{counter}_total{{phase="{name}"}} {phase.counters[counter]}'
+                      for name, phase in self.phases.items() if counter in phase.counters]
+        lines += ['# HELP file_manager_last_run_timestamp_seconds Start time of the run',
+                  '# TYPE file_manager_last_run_timestamp_seconds gauge',
+                  f'file_manager_last_run_timestamp_seconds {self.start_time}']
+        Metrics.write_atomically(file_path, '\n'.join(lines) + '\n')
+
+    @staticmethod
+    def write_atomically(file_path: str, content: str) -> None:
+        """
+        Writes file through temporary file, so readers (e.g. metrics collectors) never see partial content.
+        """
+        temp_path: str = f'{file_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
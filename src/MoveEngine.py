@@ -0,0 +1,161 @@
+import errno
+import filecmp
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+from Throttle import Throttle
+
+
+class MoveEngine:
+    """
+    Moves files into target directory.
+    Files located on the same device as target directory are renamed. Files located on other devices are copied
+    in the kernel (copy_file_range or sendfile) by a pool of worker threads; copies preserve file metadata
+    and source files are removed only after their copies have been verified.
+    Copied (and verified) bytes can be limited by a throttle of bytes per second, and renames and removals
+    by a throttle of operations per second.
+    """
+    copy_chunk_size: int = 64 * 1024 * 1024
+    verification_methods: List[str] = ['size', 'content']
+    unsupported_copy_errors: Tuple[int, ...] = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                                errno.EPERM)
+
+    def __init__(self, target_dir: str, workers: int, verification: str, read_throttle: Optional[Throttle] = None,
+                 metadata_throttle: Optional[Throttle] = None,
+                 worker_initializer: Optional[Callable[[], None]] = None):
+        self.target_dir: str = target_dir
+        self.target_device: int = os.stat(target_dir).st_dev
+        self.workers: int = workers
+        self.verification: str = verification
+        self.read_throttle: Optional[Throttle] = read_throttle
+        self.metadata_throttle: Optional[Throttle] = metadata_throttle
+        self.worker_initializer: Optional[Callable[[], None]] = worker_initializer
+
+    def move_files(self, moves: Iterable[Tuple[str, int, str]]) -> Iterator[Tuple[str, str, Optional[Exception]]]:
+        """
+        Moves files given as (source path, source device, destination path), replacing existing destination files.
+        Yields (source path, destination path, error) tuples; error is None when file was moved.
+        """
+        pending: Deque[Tuple[str, str, Future]] = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='moving',
+                                initializer=self.worker_initializer) as executor:
+            for source_path, source_device, destination_path in moves:
+                if source_device == self.target_device:
+                    try:
+                        self.throttle_metadata()
+                        os.replace(source_path, destination_path)  # Atomically replaces existing file
+                        yield source_path, destination_path, None
+                        continue
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:  # Source may be a bind mount of the same device
+                            yield source_path, destination_path, e
+                            continue
+                pending.append((source_path, destination_path,
+                                executor.submit(self.move_file_across_devices, source_path, destination_path)))
+                while pending and pending[0][2].done():
+                    yield MoveEngine.get_result(*pending.popleft())
+            while pending:
+                yield MoveEngine.get_result(*pending.popleft())
+
+    @staticmethod
+    def get_result(source_path: str, destination_path: str, future: Future) \
+            -> Tuple[str, str, Optional[Exception]]:
+        try:
+            future.result()
+            return source_path, destination_path, None
+        except Exception as e:
+            return source_path, destination_path, e
+
+    def move_file_across_devices(self, source_path: str, destination_path: str) -> None:
+        """
+        Copies file to a temporary file next to destination, verifies the copy, renames it to destination
+        and removes source file.
+        """
+        destination_dir, destination_name = os.path.split(destination_path)
+        temp_path: str = os.path.join(destination_dir, f'.{destination_name}.{os.getpid()}.part')
+        try:
+            with open(source_path, 'rb') as source_file:
+                source_status: os.stat_result = os.fstat(source_file.fileno())
+                with open(temp_path, 'wb') as temp_file:
+                    copied_bytes: int = MoveEngine.copy_file_data(source_file.fileno(), temp_file.fileno(),
+                                                                  source_status.st_size, self.read_throttle)
+                    os.fsync(temp_file.fileno())
+            shutil.copystat(source_path, temp_path)
+            try:
+                os.chown(temp_path, source_status.st_uid, source_status.st_gid)
+            except PermissionError:
+                pass  # Only privileged user can preserve file owner
+
+            self.throttle_metadata()
+            current_source_status: os.stat_result = os.stat(source_path)
+            if copied_bytes != source_status.st_size or \
+                    current_source_status.st_size != source_status.st_size or \
+                    current_source_status.st_mtime_ns != source_status.st_mtime_ns:
+                raise OSError(f'File {source_path} changed while it was being copied')
+            self.throttle_metadata()
+            if os.path.getsize(temp_path) != source_status.st_size:
+                raise OSError(f'Copy of {source_path} has different size than the file')
+            if self.verification == 'content':
+                if self.read_throttle is not None:
+                    self.read_throttle.acquire(2 * source_status.st_size)  # Both files are read
+                if not filecmp.cmp(source_path, temp_path, shallow=False):
+                    raise OSError(f'Copy of {source_path} has different content than the file')
+
+            self.throttle_metadata()
+            os.replace(temp_path, destination_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.throttle_metadata()
+        os.remove(source_path)
+
+    def throttle_metadata(self) -> None:
+        if self.metadata_throttle is not None:
+            self.metadata_throttle.acquire()
+
+    @staticmethod
+    def copy_file_data(source_fd: int, destination_fd: int, size: int, throttle: Optional[Throttle] = None) -> int:
+        """
+        Copies data between file descriptors in the kernel. Falls back to sendfile when copy_file_range
+        is not supported between given files, and to reading and writing when neither is supported.
+        When throttle is given, data is copied in chunks of at most one second of its rate, each followed by a wait
+        for the throttle.
+        Returns number of copied bytes.
+        """
+        chunk_size: int = MoveEngine.copy_chunk_size if throttle is None \
+            else min(MoveEngine.copy_chunk_size, throttle.rate)
+        use_copy_file_range: bool = hasattr(os, 'copy_file_range')
+        use_sendfile: bool = hasattr(os, 'sendfile')
+        offset: int = 0
+        while offset < size:
+            count: int = min(chunk_size, size - offset)
+            if use_copy_file_range:
+                try:
+                    copied: int = os.copy_file_range(source_fd, destination_fd, count, offset, offset)
+                except OSError as e:
+                    if e.errno not in MoveEngine.unsupported_copy_errors:
+                        raise
+                    use_copy_file_range = False
+                    continue
+            elif use_sendfile:
+                try:
+                    os.lseek(destination_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(destination_fd, source_fd, offset, count)
+                except OSError as e:
+                    if e.errno not in MoveEngine.unsupported_copy_errors:
+                        raise
+                    use_sendfile = False
+                    continue
+            else:
+                copied = os.pwrite(destination_fd, os.pread(source_fd, count, offset), offset)
+            if copied == 0:
+                break  # File was truncated while it was being copied
+            if throttle is not None:
+                throttle.acquire(copied)
+            offset += copied
+        return offset
@@ -0,0 +1,73 @@
+import json
+import os
+from typing import Dict, List, Optional, Set, Tuple
+from DecisionRules import DecisionRules
+
+
+class ReviewQueue:
+    """
+    Questions about single files which were not answered by rules. Instead of being asked one by one,
+    questions are written to review file. Answers edited in the file (true or false instead of null)
+    are applied by the next run with the same review file; questions left unanswered are written again.
+    """
+    questions: Dict[str, str] = {
+        DecisionRules.move: 'Move file to target directory?',
+        DecisionRules.keep_latest: 'File name collides with file in target directory. Keep the latest file? '
+                                   '(false keeps the oldest file)',
+        DecisionRules.remove_empty: 'Remove empty file?',
+        DecisionRules.remove_temp: 'Remove temporary file?',
+        DecisionRules.remove_dupl: 'Remove duplicated file?',
+        DecisionRules.unify_perm: 'Change file permissions to default permissions?',
+        DecisionRules.change_name: 'Change bad characters in file name?',
+        DecisionRules.override_file: 'File with changed name already exists. Override it?'
+    }
+
+    def __init__(self, review_file_path: str):
+        """
+        Loads answers from review file if it exists. Raises ValueError when review file is not valid.
+        """
+        self.review_file_path: str = review_file_path
+        self.answers: Dict[Tuple[str, str], bool] = {}
+        self.pending_questions: List[dict] = []
+        self.pending_keys: Set[Tuple[str, str]] = set()
+        if not os.path.isfile(review_file_path):
+            return
+        with open(review_file_path, 'r') as f:
+            questions = json.load(f)
+        if not isinstance(questions, list):
+            raise ValueError('Review file must contain a list of questions')
+        for question in questions:
+            if not isinstance(question, dict) or 'decision' not in question or 'path' not in question:
+                raise ValueError(f'Invalid question in review file: {question}')
+            answer = question.get('answer')
+            if answer is not None and not isinstance(answer, bool):
+                raise ValueError(f'Answer must be true, false or null. Got {answer} for {question["path"]}')
+            if answer is not None:
+                self.answers[(question['decision'], question['path'])] = answer
+
+    def get_answer(self, decision: str, file_path: str) -> Optional[bool]:
+        """
+        Returns answer given in review file or None if question was not answered yet; such question is queued.
+        """
+        key: Tuple[str, str] = (decision, file_path)
+        answer: Optional[bool] = self.answers.get(key)
+        if answer is None and key not in self.pending_keys:
+            self.pending_keys.add(key)
+            self.pending_questions.append({'decision': decision, 'path': file_path,
+                                           'question': ReviewQueue.questions[decision], 'answer': None})
+        return answer
+
+    def save(self) -> int:
+        """
+        Writes queued questions to review file, or removes review file if there are none.
+        Returns number of queued questions.
+        """
+        if not self.pending_questions:
+            if os.path.isfile(self.review_file_path):
+                os.remove(self.review_file_path)
+            return 0
+        temp_path: str = self.review_file_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.pending_questions, f, indent=2)
+        os.replace(temp_path, self.review_file_path)
+        return len(self.pending_questions)
@@ -0,0 +1,175 @@
+import logging
+import os
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, DefaultDict, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from DirectoryWalker import DirectoryWalker
+
+
+class ShardedScanner:
+    """
+    Scans directory trees in a pool of processes. Every tree is split into shards: files in the top level
+    of the tree are listed by the calling process, and every top-level subdirectory is a shard walked by a worker
+    process. Shards are grouped by device, and at most workers_per_device shards of one device are walked
+    at the same time, so each disk gets its own bounded set of workers.
+    Results (files, their stat information and logged messages) are merged in the calling process in the order
+    in which DirectoryWalker walks the trees, so the result does not depend on which shard finishes first.
+    """
+
+    @dataclass
+    class Shard:
+        path: str
+        device: int
+
+    class MessageCollector(logging.Handler):
+        """
+        Logging handler keeping messages logged by worker process, so they are logged by the calling process.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.messages: List[Tuple[int, str]] = []
+
+        def emit(self, record: logging.LogRecord) -> None:
+            self.messages.append((record.levelno, record.getMessage()))
+
+    # Files of shard grouped by directory (with its device and inode, if directories can be reached more than once)
+    ShardResult = Tuple[List[Tuple[Optional[Tuple[int, int]], List[DirectoryWalker.Entry]]], List[Tuple[int, str]]]
+
+    def __init__(self, logger: logging.Logger, processes: int, workers_per_device: int, follow_symlinks: bool = True,
+                 one_file_system: bool = False, worker_initializer: Optional[Callable[[], None]] = None):
+        self.logger: logging.Logger = logger
+        self.processes: int = processes
+        self.workers_per_device: int = workers_per_device
+        self.follow_symlinks: bool = follow_symlinks
+        self.one_file_system: bool = one_file_system
+        self.worker_initializer: Optional[Callable[[], None]] = worker_initializer
+        self.walker: DirectoryWalker = DirectoryWalker(logger, follow_symlinks=follow_symlinks,
+                                                       one_file_system=one_file_system)
+        self.executor: Optional[ProcessPoolExecutor] = None  # Created on first use and reused by following scans
+
+    def scan(self, directories: Iterable[str]) -> Iterator[Union[os.DirEntry, DirectoryWalker.Entry]]:
+        """
+        Yields files from given directories and their subdirectories in the same order as DirectoryWalker.
+        Shards of all directories are walked at the same time.
+        """
+        trees: List[Tuple[List[os.DirEntry], List[ShardedScanner.Shard]]] = []
+        shards: List[Tuple[ShardedScanner.Shard, int, Set[Tuple[int, int]]]] = []
+        for directory in directories:
+            try:
+                root_status: os.stat_result = os.stat(directory)
+            except OSError as e:
+                self.logger.error(f'Could not access {directory}. {e}')
+                continue
+            visited_dirs: Set[Tuple[int, int]] = {(root_status.st_dev, root_status.st_ino)}
+            files, subdirs = self.walker.list_dir(directory, root_status.st_dev, visited_dirs)
+            tree_shards: List[ShardedScanner.Shard] = []
+            for subdir in subdirs:
+                try:
+                    tree_shards.append(ShardedScanner.Shard(path=subdir, device=os.stat(subdir).st_dev))
+                except OSError as e:
+                    self.logger.error(f'Could not access {subdir}. {e}')
+            trees.append((files, tree_shards))
+            shards.extend((shard, root_status.st_dev, visited_dirs) for shard in tree_shards)
+
+        results: Iterator[ShardedScanner.ShardResult] = self.walk_shards(shards)
+        for files, tree_shards in trees:
+            yield from files
+            seen_dirs: Set[Tuple[int, int]] = set()  # Directories walked by previous shards of the tree
+            for shard in tree_shards:
+                dirs, messages = next(results)
+                for level, message in messages:
+                    self.logger.log(level, message)
+                for dir_key, entries in dirs:
+                    if dir_key in seen_dirs:
+                        self.logger.info(f'Skipping directory {os.path.dirname(entries[0].path)} '
+                                         f'which has already been walked')
+                        continue
+                    yield from entries
+                seen_dirs.update(dir_key for dir_key, _ in dirs if dir_key is not None)
+
+    def walk_shards(self, shards: List[Tuple[Shard, int, Set[Tuple[int, int]]]]) -> Iterator[ShardResult]:
+        """
+        Walks shards given as (shard, device of tree root, directories visited in the top level of the tree)
+        in worker processes. Yields results in the order of shards.
+        """
+        if not shards:
+            return
+        queued_shards: DefaultDict[int, Deque[int]] = defaultdict(deque)
+        for index, (shard, _, _) in enumerate(shards):
+            queued_shards[shard.device].append(index)
+        running_shards: DefaultDict[int, int] = defaultdict(int)
+        futures: Dict[Future, int] = {}
+        results: Dict[int, ShardedScanner.ShardResult] = {}
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=self.worker_initializer)
+
+        def submit_shards() -> None:
+            for device, indexes in queued_shards.items():
+                while indexes and running_shards[device] < self.workers_per_device:
+                    index: int = indexes.popleft()
+                    shard, root_device, visited_dirs = shards[index]
+                    futures[self.executor.submit(ShardedScanner.walk_shard, shard.path, root_device, visited_dirs,
+                                                 self.follow_symlinks, self.one_file_system)] = index
+                    running_shards[device] += 1
+
+        try:
+            submit_shards()
+            for index in range(len(shards)):
+                while index not in results:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        done_index: int = futures.pop(future)
+                        running_shards[shards[done_index][0].device] -= 1
+                        results[done_index] = future.result()
+                    submit_shards()
+                yield results.pop(index)
+        finally:
+            for future in futures:  # Scan was interrupted
+                future.cancel()
+
+    @staticmethod
+    def walk_shard(directory: str, root_device: int, visited_dirs: Set[Tuple[int, int]], follow_symlinks: bool,
+                   one_file_system: bool) -> ShardResult:
+        """
+        Walks shard in worker process. Files are grouped by their directories; when symbolic links are followed,
+        groups are marked with device and inode of the directory, so directories walked by more than one shard
+        can be skipped when results are merged.
+        """
+        logger: logging.Logger = logging.getLogger(f'{__name__}.worker')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        collector: ShardedScanner.MessageCollector = ShardedScanner.MessageCollector()
+        logger.handlers = [collector]
+        walker: DirectoryWalker = DirectoryWalker(logger, follow_symlinks=follow_symlinks,
+                                                  one_file_system=one_file_system)
+
+        dirs: List[Tuple[Optional[Tuple[int, int]], List[DirectoryWalker.Entry]]] = []
+        current_dir: Optional[str] = None
+        for entry in walker.walk(directory, root_device, visited_dirs):
+            entry_dir: str = DirectoryWalker.get_dir_path(entry)
+            if entry_dir != current_dir:
+                current_dir = entry_dir
+                dir_key: Optional[Tuple[int, int]] = None
+                if follow_symlinks:
+                    try:
+                        dir_status: os.stat_result = os.stat(entry_dir)
+                        dir_key = (dir_status.st_dev, dir_status.st_ino)
+                    except OSError:
+                        pass  # Directory is reported only by this shard
+                dirs.append((dir_key, []))
+            try:
+                file_status: Optional[os.stat_result] = entry.stat()
+                error: Optional[OSError] = None
+            except OSError as e:
+                file_status, error = None, e
+            dirs[-1][1].append(DirectoryWalker.Entry(path=entry.path, name=entry.name, status=file_status,
+                                                     error=error, is_link=entry.is_symlink()))
+        return dirs, collector.messages
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,29 @@
+import threading
+import time
+
+
+class Throttle:
+    """
+    Token bucket limiting rate of operations (or bytes) per second, shared by all threads using it.
+    Unused tokens are accumulated for at most one second. Request bigger than available tokens is not split:
+    it is admitted after the caller waits until the tokens it lacks are refilled, and the following callers wait
+    for their turn behind it, so the rate is kept on average.
+    """
+
+    def __init__(self, rate: int):
+        self.rate: int = rate
+        self.tokens: float = rate
+        self.last_time: float = time.monotonic()
+        self.waited_time: float = 0.0  # Time spent by all callers waiting for tokens
+        self.lock: threading.Lock = threading.Lock()
+
+    def acquire(self, amount: int = 1) -> None:
+        with self.lock:
+            now: float = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+            self.tokens -= amount
+            delay: float = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited_time += delay
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,93 @@
+import os
+import random
+import shutil
+from dataclasses import dataclass
+from typing import List, Tuple
+
+
+class TreeGenerator:
+    """
+    Generates reproducible synthetic directory trees for benchmarks.
+    The same parameters and seed always produce the same files with the same content, names and permissions.
+    Generated tree consists of target directory and source directories (named "target" and "source<n>").
+    """
+    bad_chars: str = '$*'
+    temp_extensions: List[str] = ['.tmp', '~']
+    odd_modes: List[int] = [0o777, 0o711, 0o111]
+
+    @dataclass
+    class Parameters:
+        files: int = 10000
+        depth: int = 3
+        fan_out: int = 4
+        min_size: int = 1
+        max_size: int = 1024 * 1024  # Sizes are distributed log-uniformly, so most files are small
+        duplicate_ratio: float = 0.1
+        temp_ratio: float = 0.05
+        empty_ratio: float = 0.05
+        bad_name_ratio: float = 0.05
+        odd_mode_ratio: float = 0.05
+        sources: int = 2
+        source_ratio: float = 0.2  # Share of files placed in source directories instead of target directory
+        seed: int = 1
+
+    def __init__(self, parameters: Parameters):
+        self.parameters: TreeGenerator.Parameters = parameters
+        self.random: random.Random = random.Random(parameters.seed)
+        self.total_bytes: int = 0
+
+    def generate(self, root: str) -> None:
+        """
+        Creates directory tree in given directory.
+        """
+        target_dirs: List[str] = self.create_dirs(os.path.join(root, 'target'))
+        source_dirs: List[List[str]] = [self.create_dirs(os.path.join(root, f'source{index}'))
+                                        for index in range(self.parameters.sources)]
+        unique_files: List[str] = []  # Duplicates are copied from them, so contents are not kept in memory
+        odd_mode_files: List[Tuple[str, int]] = []  # Applied at the end, so unreadable files can still be copied
+        for index in range(self.parameters.files):
+            if source_dirs and self.random.random() < self.parameters.source_ratio:
+                directory: str = self.random.choice(self.random.choice(source_dirs))
+            else:
+                directory = self.random.choice(target_dirs)
+
+            file_name: str = f'file{index}'
+            if self.random.random() < self.parameters.bad_name_ratio:
+                file_name = f'{file_name}{self.random.choice(TreeGenerator.bad_chars)}name'
+            if self.random.random() < self.parameters.temp_ratio:
+                file_name += self.random.choice(TreeGenerator.temp_extensions)
+            file_path: str = os.path.join(directory, file_name)
+            if self.random.random() < self.parameters.odd_mode_ratio:
+                odd_mode_files.append((file_path, self.random.choice(TreeGenerator.odd_modes)))
+
+            if self.random.random() < self.parameters.empty_ratio:
+                open(file_path, 'wb').close()
+            elif unique_files and self.random.random() < self.parameters.duplicate_ratio:
+                shutil.copyfile(self.random.choice(unique_files), file_path)
+            else:
+                with open(file_path, 'wb') as f:
+                    f.write(self.random.randbytes(self.get_file_size()))
+                unique_files.append(file_path)
+            os.chmod(file_path, 0o644)
+            self.total_bytes += os.path.getsize(file_path)
+        for file_path, mode in odd_mode_files:
+            os.chmod(file_path, mode)
+
+    def create_dirs(self, root: str) -> List[str]:
+        """
+        Creates tree of directories with given depth and fan-out. Returns paths of all created directories.
+        """
+        dirs: List[str] = [root]
+        level: List[str] = [root]
+        os.makedirs(root)
+        for _ in range(self.parameters.depth):
+            level = [os.path.join(parent, f'dir{index}') for parent in level for index in range(self.parameters.fan_out)]
+            for directory in level:
+                os.mkdir(directory)
+            dirs.extend(level)
+        return dirs
+
+    def get_file_size(self) -> int:
+        min_size: int = max(self.parameters.min_size, 1)
+        max_size: int = max(self.parameters.max_size, min_size)
+        return int(min_size * (max_size / min_size) ** self.random.random())
@@ -5,14 +5,13 @@ class UserInputHandler:
 
     @staticmethod
     def ask_yes_or_no_question() -> bool:
-        answer: str = input('Type "y" ("yes") or "n" ("no"): ')
-        if answer.lower() == 'y' or answer.lower() == 'yes':
-            return True
-        elif answer.lower() == 'n' or answer.lower() == 'no':
-            return False
-        else:
+        while True:
+            answer: str = input('Type "y" ("yes") or "n" ("no"): ')
+            if answer.lower() == 'y' or answer.lower() == 'yes':
+                return True
+            elif answer.lower() == 'n' or answer.lower() == 'no':
+                return False
             print('Invalid input. Enter answer again.')
-            UserInputHandler.ask_yes_or_no_question()
 
     @staticmethod
     def ask_if_perform_action_globally() -> bool:
@@ -21,25 +20,28 @@ class UserInputHandler:
 
     @staticmethod
     def ask_when_collision_keep_latest() -> bool:
-        answer: str = input('Type "a" or "b": ')
-        if answer.lower() == 'a':
-            return True
-        elif answer.lower() == 'b':
-            return False
-        else:
+        while True:
+            answer: str = input('Type "a" or "b": ')
+            if answer.lower() == 'a':
+                return True
+            elif answer.lower() == 'b':
+                return False
             print('Invalid input. Enter answer again.')
-            UserInputHandler.ask_when_collision_keep_latest()
 
     @staticmethod
     def ask_if_move_files_globally() -> Tuple[bool, bool]:
         keep_latest_file: bool = True
         is_global_move: bool = UserInputHandler.ask_if_perform_action_globally()
         if is_global_move:
-            print('In case of file collision keep: \na) latest file\nb) oldest file')
-            keep_latest_file = UserInputHandler.ask_when_collision_keep_latest()
+            keep_latest_file = UserInputHandler.ask_if_keep_latest_file_globally()
 
         return is_global_move, keep_latest_file
 
+    @staticmethod
+    def ask_if_keep_latest_file_globally() -> bool:
+        print('In case of file collision keep: \na) latest file\nb) oldest file')
+        return UserInputHandler.ask_when_collision_keep_latest()
+
     @staticmethod
     def ask_if_move_file(file_path: str, target_dir: str) -> bool:
         print(f'Move {file_path} to target directory: {target_dir} ?')
@@ -81,6 +83,18 @@ class UserInputHandler:
         print(f'Remove duplicated file: {file_path} ?')
         return UserInputHandler.ask_yes_or_no_question()
 
+    @staticmethod
+    def ask_if_remove_source_files_existing_in_target_globally(target_dir: str) -> bool:
+        print(f'Remove files from source directories whose content already exists in target directory {target_dir} '
+              f'globally? (Otherwise they will be left in source directories)')
+        return UserInputHandler.ask_yes_or_no_question()
+
+    @staticmethod
+    def ask_if_remove_source_file_existing_in_target(file_path: str, target_file_path: str) -> bool:
+        print(f'Content of file: {file_path} already exists in target directory as: {target_file_path}. '
+              f'Remove file: {file_path} ?')
+        return UserInputHandler.ask_yes_or_no_question()
+
     @staticmethod
     def ask_if_sort_dupl_files_by_ctime() -> bool:
         print('Sort duplicated files by creation date? (Otherwise they will be sorted by modification date)')
@@ -0,0 +1,55 @@
+import ctypes
+import os
+import platform
+from typing import Dict, List, Optional
+
+
+class WorkerPriority:
+    """
+    CPU priority (nice value) and I/O priority of worker threads and processes, applied by executors
+    when their workers start. On Linux both priorities belong to threads, so the thread scanning directories
+    and applying operations keeps its priority. I/O priority is set with ioprio_set system call and is respected
+    by I/O schedulers supporting it (e.g. BFQ); on other systems it is not set.
+    Priority can only be lowered, so failures (e.g. missing permissions) are ignored.
+    """
+    no_io_class: str = ''
+    best_effort_io_class: str = 'best-effort'
+    idle_io_class: str = 'idle'
+    io_classes: List[str] = [no_io_class, best_effort_io_class, idle_io_class]
+    io_levels: int = 8  # Levels of best-effort class, 0 is the highest priority
+
+    ioprio_class_values: Dict[str, int] = {best_effort_io_class: 2, idle_io_class: 3}
+    ioprio_class_shift: int = 13
+    ioprio_who_process: int = 1  # With id 0 it is the calling thread
+    ioprio_set_syscalls: Dict[str, int] = {'x86_64': 251, 'aarch64': 30, 'arm64': 30, 'i386': 289, 'i686': 289,
+                                           'armv7l': 314, 'ppc64le': 273, 's390x': 282}
+
+    def __init__(self, nice: int, io_class: str, io_level: int):
+        self.nice: int = nice
+        self.io_class: str = io_class
+        self.io_level: int = io_level
+
+    def is_set(self) -> bool:
+        return self.nice != 0 or self.io_class != WorkerPriority.no_io_class
+
+    @staticmethod
+    def get_ioprio_set_syscall() -> Optional[int]:
+        if platform.system() != 'Linux':
+            return None
+        return WorkerPriority.ioprio_set_syscalls.get(platform.machine())
+
+    def apply(self) -> None:
+        """
+        Lowers priority of the calling thread.
+        """
+        if self.nice != 0:
+            try:
+                os.nice(self.nice)
+            except OSError:
+                pass
+        syscall: Optional[int] = WorkerPriority.get_ioprio_set_syscall()
+        if self.io_class != WorkerPriority.no_io_class and syscall is not None:
+            level: int = self.io_level if self.io_class == WorkerPriority.best_effort_io_class else 0
+            priority: int = WorkerPriority.ioprio_class_values[self.io_class] << WorkerPriority.ioprio_class_shift \
+                | level
+            ctypes.CDLL(None, use_errno=True).syscall(syscall, WorkerPriority.ioprio_who_process, 0, priority)
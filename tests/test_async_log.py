@@ -0,0 +1,79 @@
+import io
+import logging
+import os
+import threading
+import unittest
+from unittest import mock
+
+from test_file_manager import FileManagerTestCase  # Adds src directory to import path
+from AsyncLog import AsyncLog
+
+
+class BlockingStream(io.StringIO):
+    """
+    Terminal whose first write waits until it is released.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.writing: threading.Event = threading.Event()
+        self.released: threading.Event = threading.Event()
+
+    def write(self, text: str) -> int:
+        self.writing.set()
+        self.released.wait()
+        return super().write(text)
+
+
+class TestAsyncLog(FileManagerTestCase):
+
+    def create_logger(self, handler: AsyncLog) -> logging.Logger:
+        logger: logging.Logger = logging.getLogger(f'AsyncLogTest.{self.id()}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.handlers = [handler]
+        return logger
+
+    def read_log_file(self) -> str:
+        with open(os.path.join(self.temp_dir.name, 'file_manager.log')) as f:
+            return f.read()
+
+    def test_log_file_receives_all_messages(self):
+        stream: io.StringIO = io.StringIO()
+        handler: AsyncLog = AsyncLog(os.path.join(self.temp_dir.name, 'file_manager.log'), stream)
+        logger: logging.Logger = self.create_logger(handler)
+        for index in range(30):
+            logger.error(f'Could not access file{index}')
+        handler.close()
+        log_file_lines = self.read_log_file().splitlines()
+        self.assertEqual(log_file_lines[:30], [f'Could not access file{index}' for index in range(30)])
+        self.assertEqual(log_file_lines[30:], ['Log summary: 30 messages (ERROR: 30), 20 not shown in terminal, '
+                                               '0 dropped',
+                                               '  20 not shown, e.g. Could not access file29'])
+        self.assertEqual(stream.getvalue().splitlines(),
+                         [f'Could not access file{index}' for index in range(AsyncLog.repeat_limit)] +
+                         ['20 similar messages were not shown in terminal, the last one: Could not access file29'] +
+                         log_file_lines[30:])
+
+    def test_dropped_messages_are_reported(self):
+        stream: BlockingStream = BlockingStream()
+        with mock.patch.object(AsyncLog, 'queue_size', 5):
+            handler: AsyncLog = AsyncLog(os.path.join(self.temp_dir.name, 'file_manager.log'), stream)
+        logger: logging.Logger = self.create_logger(handler)
+        try:
+            logger.info('first')
+            self.assertTrue(stream.writing.wait(10))  # Writer waits with the first message, so queue is not emptied
+            for index in range(20):
+                logger.info(f'message {index}')
+        finally:
+            stream.released.set()
+            handler.close()
+        log_file: str = self.read_log_file()
+        self.assertIn('15 messages were dropped, because they were logged faster than they could be written',
+                      log_file)
+        self.assertIn('Log summary: 6 messages (INFO: 6), 0 not shown in terminal, 15 dropped', log_file)
+        self.assertEqual(stream.getvalue(), log_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
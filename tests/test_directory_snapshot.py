@@ -0,0 +1,84 @@
+import os
+import unittest
+from typing import Dict, Tuple
+
+from test_file_manager import FileManagerTestCase, read_tree, set_dirs_to_past, tree_files  # Adds src to import path
+from FileManager import FileManager
+
+
+class TestDirectorySnapshot(FileManagerTestCase):
+    """
+    Run reusing listings of snapshot must leave the same tree as running the actions without it, also when files
+    were changed without modifying their directories.
+    """
+
+    def test_snapshot(self):
+        # Directory which is not modified by any action, so its listing is reused
+        files: Dict[str, Tuple[bytes, int, int]] = dict(tree_files, **{
+            'target/stale/empty': (b'', 0o644, 900),
+            'target/stale/unusual': (b'unusual', 0o777, 900),
+            'target/stale/original': (b'duplicate', 0o644, 900),
+            'target/stale/duplicate': (b'duplicate', 0o644, 800),
+        })
+        root: str = self.create_tree('snapshot', files)
+        snapshot_file_path: str = os.path.join(self.temp_dir.name, 'snapshot.db')
+        self.run_action(root, FileManager.action_change_bad_characters_in_file_names, snapshot=snapshot_file_path)
+        changed_files: Dict[str, Tuple[bytes, int, int]] = dict(files)
+        del changed_files['target/open$file.txt']
+        changed_files['target/open_file.txt'] = (b'dollar', 0o777, 500)
+        changed_files['target/sub/deep/b_copy.bin'] = changed_files.pop('target/sub/deep/b*copy.bin')
+        self.assertEqual(read_tree(root), read_tree(self.create_tree('renamed', changed_files)))
+        set_dirs_to_past(root)  # Listings of directories modified within the last second are not saved
+        self.run_action(root, FileManager.action_change_bad_characters_in_file_names, snapshot=snapshot_file_path)
+        dir_times: Dict[str, Tuple[int, int]] = {directory: (os.stat(directory).st_atime_ns,
+                                                             os.stat(directory).st_mtime_ns)
+                                                 for directory, _, _ in os.walk(root)}
+
+        # Writing to files and changing their modes does not change listings of their directories
+        with open(os.path.join(root, 'target', 'empty'), 'ab') as f:
+            f.write(b'appended')
+        changed_files['target/empty'] = (b'appended', 0o644, 800)
+        os.chmod(os.path.join(root, 'target', 'open_file.txt'), 0o600)
+        changed_files['target/open_file.txt'] = (b'dollar', 0o600, 500)
+        with open(os.path.join(root, 'target', 'sub', 'deep', 'c.bin'), 'r+b') as f:
+            f.seek(4999)
+            f.write(b'x' * 1000)
+        changed_files['target/sub/deep/c.bin'] = (b'x' * 5999, 0o777, 250)
+        for relative_path, content in (('target/stale/empty', b'written'), ('target/stale/duplicate', b' no more')):
+            with open(os.path.join(root, relative_path), 'ab') as f:
+                f.write(content)
+            old_content, mode, age = changed_files[relative_path]
+            changed_files[relative_path] = (old_content + content, mode, age)
+        os.chmod(os.path.join(root, 'target', 'stale', 'unusual'), 0o600)
+        changed_files['target/stale/unusual'] = (b'unusual', 0o600, 900)
+        for directory, times in dir_times.items():
+            os.utime(directory, ns=times)
+
+        with self.create_engine(root, snapshot=snapshot_file_path) as engine:
+            list(engine.perform(FileManager.action_run_all))
+            self.assertGreater(engine.snapshot.reused_dirs, 0)
+        self.assertEqual(read_tree(root), self.run_sequentially(changed_files))
+
+    def test_stale_duplicates_are_listed_again(self):
+        root: str = self.create_tree('stale duplicates', {'target/original': (b'duplicate' * 300 + b'1', 0o644, 900),
+                                                          'target/duplicate': (b'duplicate' * 300 + b'2', 0o644, 800)})
+        snapshot_file_path: str = os.path.join(self.temp_dir.name, 'snapshot.db')
+        self.run_action(root, FileManager.action_remove_duplicates_from_target, snapshot=snapshot_file_path)
+
+        # Files become the same, with size different from the listed one, while directory time is kept
+        dir_times: Tuple[int, int] = (os.stat(os.path.join(root, 'target')).st_atime_ns,
+                                      os.stat(os.path.join(root, 'target')).st_mtime_ns)
+        for file_name, modification_time in [('original', 1_700_000_000), ('duplicate', 1_700_000_100)]:
+            os.truncate(os.path.join(root, 'target', file_name), 2700)
+            os.utime(os.path.join(root, 'target', file_name), (modification_time, modification_time))
+        os.utime(os.path.join(root, 'target'), ns=dir_times)
+
+        # Content was not compared in full, so files are left, but listing is not used again
+        self.run_action(root, FileManager.action_remove_duplicates_from_target, snapshot=snapshot_file_path)
+        self.assertEqual(sorted(read_tree(root)), ['target/duplicate', 'target/original'])
+        self.run_action(root, FileManager.action_remove_duplicates_from_target, snapshot=snapshot_file_path)
+        self.assertEqual(read_tree(root), {'target/original': (b'duplicate' * 300, 0o644)})
+
+
+if __name__ == '__main__':
+    unittest.main()
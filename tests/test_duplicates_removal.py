@@ -0,0 +1,77 @@
+import os
+import unittest
+from typing import Any, Dict, List, Tuple
+
+from test_file_manager import FileManagerTestCase, read_tree  # Adds src directory to import path
+from FileManager import FileManager
+from HashingEngine import HashingEngine
+
+
+class TestDuplicatesRemoval(FileManagerTestCase):
+    """
+    Files are removed as duplicates only when their whole content is the same, whichever stages compare them.
+    """
+    size: int = 1024 * 1024
+
+    def create_files(self) -> str:
+        """
+        Creates pairs of files which are the same except for one byte, which is not read by small and sample hashes,
+        and a pair of real duplicates.
+        """
+        engine: HashingEngine = HashingEngine(hash_algorithm='sha1', buffer_size=1024, workers=1, mmap_threshold=0,
+                                              max_in_flight_bytes=1, sample_blocks=4, sample_block_size=4096)
+        sampled_ranges: List[Tuple[int, int]] = [(offset, offset + 4096)
+                                                 for offset in engine.get_sample_offsets(self.size)]
+        differing_byte: int = next(offset for offset in range(HashingEngine.small_hash_size, self.size)
+                                   if not any(start <= offset < end for start, end in sampled_ranges))
+        content: bytes = bytes(range(256)) * (self.size // 256)
+        changed_content: bytes = content[:differing_byte] + bytes([content[differing_byte] ^ 0xff]) + \
+            content[differing_byte + 1:]
+        return self.create_tree('dedup', {
+            'target/first': (content, 0o644, 40),
+            'target/sub/first changed': (changed_content, 0o644, 30),
+            'target/second': (content[:2048], 0o644, 20),
+            'target/second changed': (content[:2047] + b'\xfe', 0o644, 10),
+            'target/original': (b'duplicate' * 1000, 0o644, 5),
+            'target/sub/duplicate': (b'duplicate' * 1000, 0o644, 1),
+        })
+
+    def check_duplicates_removal(self, configurations: Dict[str, Any], **options: Any) -> None:
+        root: str = self.create_files()
+        self.run_action(root, FileManager.action_remove_duplicates_from_target,
+                        dict(self.configurations, **configurations), **options)
+        self.assertEqual(sorted(read_tree(os.path.join(root, 'target'))),
+                         ['first', 'original', 'second', 'second changed', os.path.join('sub', 'first changed')])
+
+    def test_byte_comparison(self):
+        self.check_duplicates_removal({'dedup_sample_block_size': 4096, 'dedup_byte_compare_max_group': 2})
+
+    def test_full_hash(self):
+        self.check_duplicates_removal({'dedup_sample_block_size': 4096, 'dedup_byte_compare_max_group': 0})
+
+    def test_without_sampling(self):
+        self.check_duplicates_removal({'dedup_sample_blocks': 0, 'hash_buffer_size': 1024})
+
+    def test_fused(self):
+        self.check_duplicates_removal({'dedup_sample_block_size': 4096}, fused=True)
+
+    def test_hash_cache(self):
+        self.check_duplicates_removal({'dedup_sample_block_size': 4096},
+                                      hash_cache=os.path.join(self.temp_dir.name, 'hashes.db'))
+
+    def test_spilled_inventory(self):
+        self.check_duplicates_removal({'dedup_sample_block_size': 4096, 'dedup_memory_budget': 1})
+
+    def test_ingest_dedup(self):
+        root: str = self.create_tree('ingest', {
+            'target/existing': (b'existing content', 0o644, 30),
+            'source0/copy of existing': (b'existing content', 0o644, 20),
+            'source0/similar': (b'existing CONTENT', 0o644, 10),
+        })
+        self.run_action(root, FileManager.action_move_files_from_sources_to_target, ingest_dedup=True)
+        self.assertEqual(read_tree(root), {'target/existing': (b'existing content', 0o644),
+                                           'target/similar': (b'existing CONTENT', 0o644)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import unittest
+from typing import Any, Dict, Tuple
+
+from test_file_manager import FileManagerTestCase, read_tree  # Adds src directory to import path
+from FileManager import FileManager
+
+
+class TestExecutionJournal(FileManagerTestCase):
+    """
+    Run with journal, also interrupted and resumed, must leave the same tree as running the actions directly.
+    """
+
+    def test_journal(self):
+        root: str = self.create_tree('journal')
+        self.run_action(root, journal=os.path.join(self.temp_dir.name, 'journal.jsonl'))
+        self.assertEqual(read_tree(root), self.run_sequentially())
+
+    def test_interrupted_journal_is_resumed(self):
+        root: str = self.create_tree('journal')
+        journal_file_path: str = os.path.join(self.temp_dir.name, 'journal.jsonl')
+        configurations: Dict[str, Any] = dict(self.configurations, journal_batch_size=1)
+        with self.create_engine(root, configurations, journal=journal_file_path) as engine:
+            events = engine.perform(FileManager.action_run_all)
+            next(events)
+            next(events)
+            events.close()
+        expected_tree: Dict[str, Tuple[bytes, int]] = self.run_sequentially()
+        self.assertNotEqual(read_tree(root), expected_tree)
+
+        self.run_action(root, configurations=configurations, journal=journal_file_path)
+        self.assertEqual(read_tree(root), expected_tree)
+
+    def test_completed_journal_is_not_executed_again(self):
+        root: str = self.create_tree('journal')
+        journal_file_path: str = os.path.join(self.temp_dir.name, 'journal.jsonl')
+        self.run_action(root, action=FileManager.action_remove_duplicates_from_target, journal=journal_file_path)
+        with open(os.path.join(root, 'target', 'sub', 'a copy.txt'), 'wb') as f:
+            f.write(b'unique')
+        self.run_action(root, action=FileManager.action_remove_duplicates_from_target, journal=journal_file_path)
+        self.assertTrue(os.path.isfile(os.path.join(root, 'target', 'sub', 'a copy.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import resource
+import unittest
+from typing import Dict, List, Tuple
+
+import test_file_manager  # noqa: F401  Adds src directory to import path
+from FileInventory import FileInventory
+
+
+def create_status(size: int, inode: int) -> os.stat_result:
+    return os.stat_result((0o100644, inode, 1, 1, 0, 0, size, 0, 0, 0))
+
+
+class TestFileInventory(unittest.TestCase):
+
+    def test_many_spills(self):
+        """
+        Every file is spilled to its own run, more runs than files which can be open.
+        """
+        files: int = 2000
+        limits: Tuple[int, int] = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(500, limits[0]), limits[1]))
+        inventory: FileInventory = FileInventory(memory_budget=1)
+        try:
+            for index in range(files):
+                inventory.add(os.path.join(f'/dir{index % 7}', f'file{index}'), create_status(index % 100, index))
+            self.assertLessEqual(len(inventory.runs), FileInventory.max_runs)
+            groups: Dict[int, List[str]] = dict(inventory.iterate_size_groups())
+        finally:
+            inventory.close()
+            resource.setrlimit(resource.RLIMIT_NOFILE, limits)
+        self.assertEqual(sorted(groups), list(range(100)))
+        for size, file_paths in groups.items():
+            self.assertEqual(sorted(file_paths), sorted(os.path.join(f'/dir{index % 7}', f'file{index}')
+                                                        for index in range(size, files, 100)))
+
+    def test_links_are_listed_once(self):
+        inventory: FileInventory = FileInventory(memory_budget=1)
+        try:
+            for file_path, inode in [('/a/first', 1), ('/b/link to first', 1), ('/a/second', 2), ('/a/other', 3)]:
+                inventory.add(file_path, create_status(10 if inode < 3 else 20, inode))
+            groups: Dict[int, List[str]] = dict(inventory.iterate_size_groups())
+        finally:
+            inventory.close()
+        self.assertEqual(groups, {10: ['/a/first', '/a/second']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from FileManager import FileManager  # noqa: E402
+from Events import Events  # noqa: E402
+
+config_file_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src', 'config.json')
+
+# Every question is answered with yes, except sorting duplicates by creation time, which cannot be set by tests
+rules: Dict[str, Any] = {'global': {'move': True, 'keep_latest': True, 'remove_empty': True, 'remove_temp': True,
+                                    'remove_dupl': True, 'sort_by_ctime': False, 'unify_perm': True,
+                                    'change_name': True, 'override_file': True}}
+
+# Relative path: (content, mode, age in seconds); the oldest of duplicated files is kept
+tree_files: Dict[str, Tuple[bytes, int, int]] = {
+    'target/a.txt': (b'alpha', 0o644, 900),
+    'target/empty': (b'', 0o644, 800),
+    'target/notes.tmp': (b'draft', 0o644, 700),
+    'target/backup~': (b'old', 0o644, 600),
+    'target/open$file.txt': (b'dollar', 0o777, 500),
+    'target/open_file.txt': (b'underscore', 0o644, 450),
+    'target/sub/a copy.txt': (b'alpha', 0o711, 400),
+    'target/sub/deep/b.bin': (b'x' * 5000, 0o644, 350),
+    'target/sub/deep/b*copy.bin': (b'x' * 5000, 0o644, 300),
+    'target/sub/deep/c.bin': (b'x' * 4999 + b'y', 0o777, 250),
+    'target/sub/empty too': (b'', 0o711, 200),
+    'target/collision.txt': (b'target version', 0o644, 1000),
+    'source0/collision.txt': (b'source version', 0o644, 100),
+    'source0/new.txt': (b'new', 0o644, 150),
+    'source0/nested/alpha.txt': (b'alpha', 0o644, 50),
+    'source1/new.txt': (b'newer', 0o644, 20),
+    'source1/junk.tmp': (b'junk', 0o644, 10),
+}
+
+
+def create_tree(root: str, files: Dict[str, Tuple[bytes, int, int]]) -> None:
+    """
+    Creates files with given contents, modes and modification times. Modification times of directories are set
+    a minute back, so their listings can be kept by snapshot.
+    """
+    now: float = 1_700_000_000
+    for relative_path, (content, mode, age) in files.items():
+        path: str = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        os.chmod(path, mode)
+        os.utime(path, (now - age, now - age))
+    set_dirs_to_past(root)
+
+
+def set_dirs_to_past(root: str) -> None:
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (os.stat(directory).st_atime - 60, os.stat(directory).st_mtime - 60))
+
+
+def read_tree(root: str) -> Dict[str, Tuple[bytes, int]]:
+    """
+    Returns contents and modes of all files in directory tree, by their paths relative to it.
+    """
+    files: Dict[str, Tuple[bytes, int]] = {}
+    for directory, _, file_names in os.walk(root):
+        for file_name in file_names:
+            path: str = os.path.join(directory, file_name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, root)] = (f.read(), os.stat(path).st_mode & 0o777)
+    return files
+
+
+def create_logger() -> logging.Logger:
+    logger: logging.Logger = logging.getLogger('FileManagerTest')
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+def count_errors(engine: FileManager) -> int:
+    return sum(phase['counters'].get('errors', 0) for phase in engine.metrics.to_dict()['phases'].values())
+
+
+class FileManagerTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.rules_file_path: str = os.path.join(self.temp_dir.name, 'rules.json')
+        with open(self.rules_file_path, 'w') as f:
+            json.dump(rules, f)
+        self.configurations: Dict[str, Any] = FileManager.load_configurations(config_file_path)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def create_tree(self, name: str, files: Dict[str, Tuple[bytes, int, int]] = tree_files) -> str:
+        root: str = os.path.join(self.temp_dir.name, name)
+        create_tree(root, files)
+        return root
+
+    def create_engine(self, root: str, configurations: Optional[Dict[str, Any]] = None,
+                      **options: Any) -> FileManager:
+        source_dirs: List[str] = sorted(os.path.join(root, name) for name in os.listdir(root)
+                                        if name.startswith('source'))
+        return FileManager(os.path.join(root, 'target'),
+                           self.configurations if configurations is None else configurations,
+                           source_dirs=source_dirs,
+                           options=FileManager.Options(rules=self.rules_file_path, **options),
+                           logger=create_logger())
+
+    def run_action(self, root: str, action: str = FileManager.action_run_all,
+                   configurations: Optional[Dict[str, Any]] = None, **options: Any) -> List[Any]:
+        with self.create_engine(root, configurations, **options) as engine:
+            return list(engine.perform(action))
+
+    def run_sequentially(self, files: Dict[str, Tuple[bytes, int, int]] = tree_files) -> Dict[str, Tuple[bytes, int]]:
+        """
+        Returns tree left by running all actions one after another on a new tree with given files.
+        """
+        root: str = self.create_tree('sequential', files)
+        self.run_action(root)
+        return read_tree(root)
+
+
+class TestSingleTraversal(FileManagerTestCase):
+    """
+    Fused traversal must leave the same tree as running the actions one after another.
+    """
+
+    def test_sequential_run(self):
+        result: Dict[str, Tuple[bytes, int]] = self.run_sequentially()
+        self.assertEqual(result, {
+            'target/a.txt': (b'alpha', 0o644),
+            'target/open_file.txt': (b'dollar', 0o644),  # Renamed file overrides existing one
+            'target/sub/deep/b.bin': (b'x' * 5000, 0o644),
+            'target/sub/deep/c.bin': (b'x' * 4999 + b'y', 0o644),
+            'target/collision.txt': (b'source version', 0o644),
+            'target/new.txt': (b'newer', 0o644),
+            'source0/new.txt': (b'new', 0o644),  # Older than the moved one, so left in source directory
+        })
+
+    def test_fused(self):
+        root: str = self.create_tree('fused')
+        self.run_action(root, fused=True)
+        self.assertEqual(read_tree(root), self.run_sequentially())
+
+
+class TestEngine(FileManagerTestCase):
+
+    def test_engine_performs_actions_repeatedly(self):
+        root: str = self.create_tree('repeated')
+        with self.create_engine(root, journal=os.path.join(self.temp_dir.name, 'journal.jsonl')) as engine:
+            list(engine.perform(FileManager.action_remove_duplicates_from_target))
+            with open(os.path.join(root, 'target', 'sub', 'a copy.txt'), 'wb') as f:
+                f.write(b'unique')
+            list(engine.perform(FileManager.action_remove_duplicates_from_target))
+        self.assertTrue(os.path.isfile(os.path.join(root, 'target', 'sub', 'a copy.txt')))
+
+    def test_engines_collect_only_their_errors(self):
+        # Source file cannot be moved over directory of the same name
+        root: str = self.create_tree('errors', {'target/name/file': (b'a', 0o644, 1), 'source0/name': (b'b', 0o644, 1)})
+        other_root: str = self.create_tree('no errors', {'target/a': (b'a', 0o644, 1), 'source0/b': (b'b', 0o644, 1)})
+        records: List[logging.LogRecord] = []
+        handler: logging.Handler = logging.Handler(logging.ERROR)
+        handler.emit = records.append
+        create_logger().addHandler(handler)
+        try:
+            with self.create_engine(root) as engine, self.create_engine(other_root) as other_engine:
+                events: List[Any] = list(engine.perform(FileManager.action_move_files_from_sources_to_target))
+                other_events: List[Any] = \
+                    list(other_engine.perform(FileManager.action_move_files_from_sources_to_target))
+        finally:
+            create_logger().removeHandler(handler)
+        self.assertEqual([type(event) for event in events], [Events.Error])
+        self.assertEqual([type(event) for event in other_events], [Events.Moved])
+        self.assertEqual(count_errors(engine), 1)
+        self.assertEqual(count_errors(other_engine), 0)
+        self.assertEqual([record.getMessage() for record in records], [events[0].message])  # Still logged
+
+
+class TestConfiguration(FileManagerTestCase):
+
+    def check_invalid_values(self, values: List[Tuple[str, Any]]) -> None:
+        root: str = self.create_tree('configuration', {'target/a': (b'a', 0o644, 1)})
+        for key, value in values:
+            with self.subTest(key=key, value=value), self.assertRaises(FileManager.Error):
+                self.create_engine(root, dict(self.configurations, **{key: value}))
+
+    def test_invalid_numbers_are_rejected(self):
+        self.check_invalid_values([('hash_buffer_size', 0), ('hash_algorithm', 'shake_128'), ('hash_workers', 0),
+                                   ('hash_max_in_flight_bytes', 0), ('hash_mmap_threshold', -1),
+                                   ('dedup_sample_block_size', 0), ('move_workers', 0), ('journal_batch_size', 0)])
+
+    def test_invalid_rules_are_rejected(self):
+        self.check_invalid_values([('unusual_file_permissions', ['0o999']), ('default_file_permissions', '0o17777'),
+                                   ('file_extensions_considered_as_temporary', [{'size': 1}])])
+
+    def test_special_permission_bits(self):
+        root: str = self.create_tree('permissions', {'target/setuid': (b'a', 0o644, 1),
+                                                     'target/plain': (b'b', 0o755, 1),
+                                                     'target/setuid executable': (b'c', 0o644, 1)})
+        os.chmod(os.path.join(root, 'target', 'setuid'), 0o4777)
+        os.chmod(os.path.join(root, 'target', 'setuid executable'), 0o4755)
+        self.run_action(root, FileManager.action_unify_file_permissions,
+                        dict(self.configurations, unusual_file_permissions=['0o777', '0o4755']))
+        self.assertEqual(read_tree(root), {'target/setuid': (b'a', 0o644), 'target/plain': (b'b', 0o755),
+                                           'target/setuid executable': (b'c', 0o644)})
+
+
+if __name__ == '__main__':
+    unittest.main()
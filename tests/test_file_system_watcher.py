@@ -0,0 +1,96 @@
+import os
+import unittest
+from typing import Callable, List, Set, Tuple
+from unittest import mock
+
+from test_file_manager import FileManagerTestCase, create_logger, read_tree  # Adds src directory to import path
+from FileManager import FileManager
+from FileSystemWatcher import FileSystemWatcher, InotifyWatcher
+
+
+class StopWatching(Exception):
+    pass
+
+
+class LosingWatcher(InotifyWatcher):
+    """
+    Watcher whose queue of events overflows after given changes are made; the second wait for changes stops watching.
+    """
+
+    def __init__(self, directories: List[str], change: Callable[[], None]):
+        super().__init__(directories, create_logger())
+        self.change: Callable[[], None] = change
+        self.waits: int = 0
+
+    def get_changes(self, timeout: float) -> Tuple[Set[str], Set[str], Set[str], bool]:
+        self.waits += 1
+        if self.waits > 1:
+            raise StopWatching()
+        self.change()
+        super().get_changes(0)  # Events of the changes are lost
+        self.handle_event(-1, InotifyWatcher.IN_Q_OVERFLOW, '', set(), set(), set())
+        return super().get_changes(0)
+
+
+def write_file(path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+class TestInotifyWatcher(FileManagerTestCase):
+
+    def test_lost_changes(self):
+        root: str = self.create_tree('watched', {'a': (b'a', 0o644, 1), 'sub/b': (b'b', 0o644, 1)})
+        watcher: InotifyWatcher = InotifyWatcher([root], create_logger())
+        try:
+            write_file(os.path.join(root, 'new', 'c'), b'c')
+            os.remove(os.path.join(root, 'a'))
+            watcher.handle_event(-1, InotifyWatcher.IN_Q_OVERFLOW, '', set(), set(), set())
+            changes: Tuple[Set[str], Set[str], Set[str], bool] = watcher.get_changes(0)
+            self.assertEqual(changes, ({os.path.join(root, 'sub', 'b'), os.path.join(root, 'new', 'c')},
+                                       set(), set(), True))
+            self.assertEqual(sorted(watcher.watched_dirs.values()),
+                             [root, os.path.join(root, 'new'), os.path.join(root, 'sub')])
+
+            write_file(os.path.join(root, 'new', 'd'), b'd')  # Directory created while changes were lost is watched
+            self.assertEqual(watcher.get_changes(1), ({os.path.join(root, 'new', 'd')}, set(), set(), False))
+        finally:
+            watcher.close()
+
+
+class TestWatchMode(FileManagerTestCase):
+
+    def test_files_are_processed_again_when_changes_are_lost(self):
+        root: str = self.create_tree('watch', {
+            'target/a.txt': (b'alpha', 0o644, 100),
+            'target/b.txt': (b'beta', 0o644, 100),
+            'target/sub/c.txt': (b'gamma', 0o644, 100),
+            'source0/old.txt': (b'old', 0o644, 100),
+        })
+
+        def change() -> None:
+            os.remove(os.path.join(root, 'target', 'b.txt'))
+            write_file(os.path.join(root, 'target', 'sub', 'copy.txt'), b'alpha')
+            write_file(os.path.join(root, 'target', 'empty'), b'')
+            write_file(os.path.join(root, 'target', 'new', 'd$.txt'), b'delta')
+            write_file(os.path.join(root, 'source0', 'new.txt'), b'new')
+
+        watchers: List[LosingWatcher] = []
+        with mock.patch.object(FileSystemWatcher, 'create',
+                               lambda directories, logger, poll_interval:
+                               watchers.append(LosingWatcher(directories, change)) or watchers[-1]), \
+                self.create_engine(root, watch=True) as engine:
+            with self.assertRaises(StopWatching):
+                list(engine.perform(FileManager.action_run_all))
+            indexed_files: List[str] = sorted(os.path.relpath(path, root) for path in engine.watched_file_sizes)
+
+        expected_files: List[str] = sorted([os.path.join('target', 'a.txt'), os.path.join('target', 'new', 'd_.txt'),
+                                            os.path.join('target', 'new.txt'), os.path.join('target', 'old.txt'),
+                                            os.path.join('target', 'sub', 'c.txt')])
+        self.assertEqual(sorted(read_tree(root)), expected_files)
+        self.assertEqual(indexed_files, expected_files)
+
+
+if __name__ == '__main__':
+    unittest.main()
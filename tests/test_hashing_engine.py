@@ -0,0 +1,25 @@
+import hashlib
+import os
+import unittest
+
+from test_file_manager import FileManagerTestCase  # Adds src directory to import path
+from HashingEngine import HashingEngine
+
+
+class TestHashingEngine(FileManagerTestCase):
+
+    def test_memory_mapping_of_all_files(self):
+        root: str = self.create_tree('hashing', {'empty': (b'', 0o644, 1), 'full': (b'content', 0o644, 1)})
+        engine: HashingEngine = HashingEngine(hash_algorithm='sha1', buffer_size=1024, workers=2, mmap_threshold=0,
+                                              max_in_flight_bytes=1, sample_blocks=0, sample_block_size=1)
+        try:
+            results = list(engine.hash_files([(os.path.join(root, 'empty'), 0), (os.path.join(root, 'full'), 7)]))
+        finally:
+            engine.close()
+        self.assertEqual([(os.path.basename(path), file_hash, error) for path, file_hash, error in results],
+                         [('empty', hashlib.sha1(b'').digest(), None),
+                          ('full', hashlib.sha1(b'content').digest(), None)])
+
+
+if __name__ == '__main__':
+    unittest.main()